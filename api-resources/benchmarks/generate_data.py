@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gera entradas sintéticas, no formato de texto do Sqoop, para os quatro jobs.
+
+Os arquivos seguem exatamente as colunas das consultas de importação dos
+scripts run_*_pipeline.sh, de modo que podem ser usados pelo run_benchmarks.py
+ou copiados para o diretório de entrada de um pipeline (engine local):
+
+    booking_recommendation.txt   pet_id,booking_date,frequency_days
+    booking_reference.txt        pet_id,species;animal_type;fur_type,booking_date
+    ltv_by_pet_profile.txt       species;animal_type;fur_type,valor_compra
+    vaccine_recommendation.txt   pet_id,species,birth_date,vaccine_reference_id,application_date
+    vaccine_catalog.csv          catálogo exportado por export_csv (com cabeçalho)
+    vaccine_equivalence*.csv     pares equivalentes e o índice de classes do reducer
+    manifest.json                parâmetros da geração e linhas por arquivo
+
+A distribuição de perfis é enviesada (Zipf): poucos perfis concentram a maior
+parte dos pets, como na base real. Tudo é gerado em streaming, então 10M de
+pets custam apenas o disco.
+
+Uso:
+    python3 generate_data.py --pets 100000 --output /tmp/petshop-bench [--seed 42]
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common-python'))
+import vaccine_equivalence
+
+SPECIES_BREEDS = {
+    'Cão': [
+        ('SRD', ('Curto', 'Médio', 'Longo')),
+        ('Golden Retriever', ('Longo',)),
+        ('Shih Tzu', ('Longo',)),
+        ('Poodle', ('Encaracolado',)),
+        ('Labrador', ('Curto',)),
+        ('Yorkshire', ('Longo',)),
+        ('Bulldog Francês', ('Curto',)),
+        ('Border Collie', ('Médio', 'Longo')),
+        ('Pug', ('Curto',)),
+        ('Lhasa Apso', ('Longo',)),
+    ],
+    'Gato': [
+        ('SRD', ('Curto', 'Médio', 'Longo')),
+        ('Siamês', ('Curto',)),
+        ('Persa', ('Longo',)),
+        ('Maine Coon', ('Longo',)),
+        ('Sphynx', ('Sem pelo',)),
+    ],
+}
+
+# (nome, descrição, espécie alvo, idade da primeira dose em meses, reforço, obrigatória)
+VACCINES = [
+    ('Aplicação de Microchip', 'Registro de aplicação de microchip de identificação.', 'Ambos', 2, None, False),
+    ('Complexo Tosse dos Canis (Bordetella, Mucosa)', 'Vacinas vivas (intranasal ou oral), Bordetella e Parainfluenza.', 'Ambos', 2, 12, False),
+    ('Leishmaniose Canina', 'Medida suplementar, não substitui o controle de vetores.', 'Ambos', 1.8, 18, False),
+    ('V10 Canina (1 Dose) - Polivalente Canina Essencial', 'Cinomose, Parvovirose, Hepatite, Adenovírus e Leptospirose.', 'Cão', 1.45, None, True),
+    ('V10 Canina (2 Dose) - Polivalente Canina Essencial', 'Segunda dose da polivalente canina.', 'Cão', 2.2, None, True),
+    ('V10 Canina (Dose Regular) - Polivalente Canina Essencial', 'Reforço anual da polivalente canina.', 'Cão', 3, 12, True),
+    ('Antirrábica Canina', 'Raiva.', 'Cão', 4, 12, True),
+    ('Giardíase', 'Giardia lamblia, recomendada para canis.', 'Cão', 2, 12, False),
+    ('V4 Felina (1 Dose) - Polivalente Essencial', 'Panleucopenia, Rinotraqueíte, Calicivirose e Clamidiose.', 'Gato', 2, None, True),
+    ('V4 Felina (2 Dose) - Polivalente Essencial', 'Segunda dose da polivalente felina.', 'Gato', 3, None, True),
+    ('V4 Felina (Dose Regular) - Polivalente Essencial', 'Reforço anual da polivalente felina.', 'Gato', 4, 12, True),
+    ('Antirrábica Felina', 'Raiva.', 'Gato', 4, 12, True),
+    ('FeLV', 'Leucemia felina, para gatos com acesso à rua.', 'Gato', 2, 12, False),
+    ('V8 Canina (1 Dose) - Polivalente Canina Essencial', 'Cinomose, Parvovirose, Hepatite e 2 sorovares de Leptospirose.', 'Cão', 1.35, None, True),
+    ('V8 Canina (2 Dose) - Polivalente Canina Essencial', 'Segunda dose da V8.', 'Cão', 1.93, None, True),
+    ('V8 Canina (Dose Regular) - Polivalente Canina Essencial', 'Reforço anual da V8.', 'Cão', 2.51, 12, True),
+    ('V5 Felina (1 Dose) - Polivalente Essencial', 'V4 e Leucemia Felina (FeLV).', 'Gato', 2.25, None, True),
+    ('V5 Felina (2 Dose) - Polivalente Essencial', 'Segunda dose da V5.', 'Gato', 3.61, None, True),
+    ('V5 Felina (Dose Regular) - Polivalente Essencial', 'Reforço anual da V5.', 'Gato', 1.8, 12, True),
+]
+
+# Pares de vacinas equivalentes (ids 1-based de VACCINES): V10 <-> V8, V4 <-> V5
+EQUIVALENT_VACCINES = [(4, 14), (5, 15), (6, 16), (9, 17), (10, 18), (11, 19)]
+
+# Intervalos típicos entre banhos/tosas (dias)
+FREQUENCY_CHOICES = (7, 15, 21, 30, 45, 60)
+
+# Probabilidade de cada vacina do catálogo já ter sido aplicada no pet
+APPLIED_PROBABILITY = 0.4
+
+
+def build_profiles():
+    return [(species, breed, fur)
+            for species, breeds in SPECIES_BREEDS.items()
+            for breed, furs in breeds
+            for fur in furs]
+
+
+def zipf_weights(count, exponent):
+    return [1.0 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def format_timestamp(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def write_catalog(path):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['vaccine_reference_id', 'vaccine_name', 'description', 'target_species',
+                         'first_dose_age_months', 'booster_interval_months', 'mandatory'])
+        for vaccine_id, (name, description, target, first_dose, booster, mandatory) in enumerate(VACCINES, 1):
+            writer.writerow([vaccine_id, name, description, target, f"{first_dose:.2f}",
+                             '' if booster is None else f"{booster:.2f}", 't' if mandatory else 'f'])
+
+
+def write_equivalences(output_dir):
+    with open(os.path.join(output_dir, 'vaccine_equivalence_pairs.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['vaccine_id', 'equivalent_vaccine_id'])
+        writer.writerows(EQUIVALENT_VACCINES)
+    vaccine_equivalence.write_index(vaccine_equivalence.build_index(EQUIVALENT_VACCINES),
+                                    os.path.join(output_dir, 'vaccine_equivalence.csv'))
+
+
+def generate(options):
+    rng = random.Random(options.seed)
+    profiles = build_profiles()
+    rng.shuffle(profiles)
+    weights = zipf_weights(len(profiles), options.skew)
+    today = options.today
+    history_start = datetime.combine(today - timedelta(days=options.history_days), datetime.min.time())
+
+    os.makedirs(options.output, exist_ok=True)
+    paths = {name: os.path.join(options.output, f"{name}.txt")
+             for name in ('booking_recommendation', 'booking_reference', 'ltv_by_pet_profile', 'vaccine_recommendation')}
+    files = {name: open(path, 'w', encoding='utf-8', buffering=1024 * 1024) for name, path in paths.items()}
+    rows = dict.fromkeys(paths, 0)
+
+    try:
+        for pet_id in range(1, options.pets + 1):
+            profile = rng.choices(profiles, weights)[0]
+            species = profile[0]
+            profile_key = ';'.join(profile)
+
+            # Histórico de agendamentos realizados: intervalo base do pet com ruído
+            frequency = rng.choice(FREQUENCY_CHOICES)
+            bookings = min(int(rng.expovariate(1.0 / options.mean_bookings)), options.max_bookings)
+            moment = history_start + timedelta(days=rng.randint(0, options.history_days // 2), hours=rng.randint(8, 18))
+            for _ in range(bookings):
+                moment += timedelta(days=max(1, int(rng.gauss(frequency, frequency / 4.0))), hours=rng.randint(-3, 3))
+                if moment.date() >= today:
+                    # Só agendamentos já realizados
+                    break
+                timestamp = format_timestamp(moment)
+                files['booking_recommendation'].write(f"{pet_id},{timestamp},{frequency}\n")
+                files['booking_reference'].write(f"{pet_id},{profile_key},{timestamp}\n")
+                rows['booking_recommendation'] += 1
+                rows['booking_reference'] += 1
+
+            # Compras do tutor, repetidas por pet no JOIN da importação
+            purchases = rng.randint(0, options.max_purchases)
+            for _ in range(purchases):
+                files['ltv_by_pet_profile'].write(f"{profile_key},{rng.randint(1, 5) * rng.randint(990, 49990) / 100:.2f}\n")
+            rows['ltv_by_pet_profile'] += purchases
+
+            # Vacinas aplicadas; pets sem nenhuma vêm com 'null' (LEFT JOIN)
+            birth_date = (today - timedelta(days=rng.randint(0, 15 * 365))).isoformat()
+            applied = 0
+            for vaccine_id, vaccine in enumerate(VACCINES, 1):
+                if vaccine[2] in (species, 'Ambos') and rng.random() < APPLIED_PROBABILITY:
+                    files['vaccine_recommendation'].write(f"{pet_id},{species},{birth_date},{vaccine_id},{birth_date}\n")
+                    applied += 1
+            if not applied:
+                files['vaccine_recommendation'].write(f"{pet_id},{species},{birth_date},null,null\n")
+                applied = 1
+            rows['vaccine_recommendation'] += applied
+    finally:
+        for f in files.values():
+            f.close()
+
+    write_catalog(os.path.join(options.output, 'vaccine_catalog.csv'))
+    write_equivalences(options.output)
+
+    manifest = {
+        'pets': options.pets,
+        'seed': options.seed,
+        'skew': options.skew,
+        'today': today.isoformat(),
+        'rows': rows,
+    }
+    with open(os.path.join(options.output, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+    return manifest
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Gera entradas sintéticas (formato Sqoop) para os jobs.')
+    parser.add_argument('--pets', type=int, default=10000, help='Número de pets (ex: 10000 a 10000000)')
+    parser.add_argument('--output', required=True, help='Diretório de saída')
+    parser.add_argument('--seed', type=int, default=42, help='Semente do gerador (mesma semente, mesmos dados)')
+    parser.add_argument('--skew', type=float, default=1.1, help='Expoente Zipf da distribuição de perfis')
+    parser.add_argument('--mean-bookings', type=float, default=8.0, help='Média de agendamentos por pet')
+    parser.add_argument('--max-bookings', type=int, default=200, help='Máximo de agendamentos por pet')
+    parser.add_argument('--max-purchases', type=int, default=6, help='Máximo de compras por pet')
+    parser.add_argument('--history-days', type=int, default=3 * 365, help='Janela do histórico de agendamentos')
+    parser.add_argument('--today', type=date.fromisoformat, default=date.today(), help='Data de referência (AAAA-MM-DD)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    manifest = generate(options)
+    for name, count in sorted(manifest['rows'].items()):
+        print(f"{name}: {count} rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark dos jobs: executa map -> sort -> [combine] -> reduce de cada job
+(seguido de map2 -> sort2 -> reduce2 nos jobs em dois passos) localmente sobre
+os dados do generate_data.py e mede, por estágio, o tempo de parede, as linhas
+por segundo e o pico de memória (RSS) do processo (Linux).
+
+Cada estágio é um processo separado lendo e escrevendo arquivos, para que as
+medidas não se misturem; o sort reproduz a ordenação do shuffle do Hadoop
+(bytes da chave, estável). O combiner roda sobre a saída ordenada do map, como
+em um único spill.
+
+Os resultados são comparados com benchmarks/baselines.json (chaveado pelo
+número de pets da massa de dados): estágios mais lentos ou com mais memória do
+que a tolerância são marcados como regressão e o comando sai com código 1.
+
+Uso:
+    python3 generate_data.py --pets 100000 --output /tmp/petshop-bench
+    python3 run_benchmarks.py --data /tmp/petshop-bench [--jobs ltv_by_pet_profile] \\
+        [--repeat 3] [--tolerance 0.25] [--save-baseline]
+
+As baselines dependem da máquina: grave-as (--save-baseline) na mesma
+máquina em que as comparações serão feitas.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+BENCHMARKS_DIR = os.path.dirname(os.path.realpath(__file__))
+RESOURCES_DIR = os.path.dirname(BENCHMARKS_DIR)
+BASELINES_FILE = os.path.join(BENCHMARKS_DIR, 'baselines.json')
+
+# merge: o job tem um segundo passo (merge_mapper.py -> sort -> merge_reducer.py) sobre a saída do reducer
+# sort_keys: campos do sort do primeiro passo (os do KeyFieldBasedComparator, na ordenação secundária)
+Job = namedtuple('Job', 'script_dir input_file combiner merge sort_keys')
+
+# Ordenação do shuffle: chave até o primeiro TAB, bytes sem locale, estável
+SORT_KEYS = ('-k1,1',)
+SORT_COMMAND = ['sort', '-s', '-t', '\t', *SORT_KEYS]
+
+JOBS = {
+    'booking_recommendation': Job('booking-recommendation-python', 'booking_recommendation.txt', False, False,
+                                  ('-k1,1', '-k2,2n')),
+    'booking_reference': Job('booking-recommendation-generate-reference-python', 'booking_reference.txt', False, True,
+                             ('-k1,1', '-k2,2n', '-k3,3n')),
+    'ltv_by_pet_profile': Job('ltv-by-pet-profile-python', 'ltv_by_pet_profile.txt', True, False, SORT_KEYS),
+    'vaccine_recommendation': Job('vaccine-recommendation-python', 'vaccine_recommendation.txt', False, False, SORT_KEYS),
+}
+
+# Intervalo de amostragem do pico de memória em /proc
+RSS_POLL_SECONDS = 0.005
+
+# Estágios mais rápidos que isso são dominados por ruído: o tempo não é comparado
+MIN_COMPARABLE_SECONDS = 0.05
+
+StageResult = namedtuple('StageResult', 'rows_in wall_seconds peak_rss_kb')
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def count_lines(path):
+    lines = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            lines += chunk.count(b'\n')
+    return lines
+
+
+def watch_peak_rss(pid, command, stop, peak):
+    """
+    Amostra o VmHWM do processo em /proc enquanto ele roda. Só conta depois do
+    exec (cmdline igual ao comando): antes disso a memória ainda é a do pai.
+    """
+    expected = '\0'.join(command) + '\0'
+    while True:
+        try:
+            with open(f"/proc/{pid}/cmdline", encoding='utf-8', errors='replace') as f:
+                started = f.read() == expected
+            if started:
+                with open(f"/proc/{pid}/status", encoding='utf-8') as f:
+                    for line in f:
+                        if line.startswith('VmHWM:'):
+                            peak[0] = max(peak[0], int(line.split()[1]))
+                            break
+        except OSError:
+            pass
+        if stop.wait(RSS_POLL_SECONDS):
+            return
+
+
+def run_stage(command, input_path, output_path, cwd, env):
+    """
+    Executa um estágio e devolve (tempo de parede, pico de RSS em KB); o pico
+    é None se o processo terminou antes de qualquer amostra confiável.
+    """
+    stderr_path = output_path + '.stderr'
+    # No Linux o ru_maxrss do filho parte do pico do pai (herdado no fork/exec):
+    # só é exato quando o filho o ultrapassa; abaixo disso vale a amostragem
+    inherited_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = [0]
+    stop = threading.Event()
+    with open(input_path, 'rb') as stdin, open(output_path, 'wb') as stdout, open(stderr_path, 'wb') as stderr:
+        started = time.perf_counter()
+        process = subprocess.Popen(command, stdin=stdin, stdout=stdout, stderr=stderr, cwd=cwd, env=env)
+        watcher = threading.Thread(target=watch_peak_rss, args=(process.pid, command, stop, peak), daemon=True)
+        watcher.start()
+        _, status, usage = os.wait4(process.pid, 0)
+        wall_seconds = time.perf_counter() - started
+    stop.set()
+    watcher.join()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        with open(stderr_path, encoding='utf-8', errors='replace') as f:
+            tail = f.read()[-2000:]
+        raise BenchmarkError(f"{' '.join(command)} failed with exit code {process.returncode}:\n{tail}")
+    if usage.ru_maxrss > inherited_rss_kb:
+        return wall_seconds, usage.ru_maxrss
+    return wall_seconds, peak[0] or None
+
+
+def job_stages(name):
+    job = JOBS[name]
+    script_dir = os.path.join(RESOURCES_DIR, job.script_dir)
+    stages = [('map', [sys.executable, os.path.join(script_dir, 'mapper.py')]),
+              ('sort', ['sort', '-s', '-t', '\t', *job.sort_keys])]
+    if job.combiner:
+        stages.append(('combine', [sys.executable, os.path.join(script_dir, 'combiner.py')]))
+    stages.append(('reduce', [sys.executable, os.path.join(script_dir, 'reducer.py')]))
+    if job.merge:
+        stages += [('map2', [sys.executable, os.path.join(script_dir, 'merge_mapper.py')]),
+                   ('sort2', SORT_COMMAND),
+                   ('reduce2', [sys.executable, os.path.join(script_dir, 'merge_reducer.py')])]
+    return stages
+
+
+def run_job(name, data_dir, work_dir, repeat, as_of):
+    """Executa o job 'repeat' vezes e guarda o melhor tempo e o maior RSS de cada estágio."""
+    # Mesma data de referência da geração: a saída não depende do dia da execução
+    env = dict(os.environ, LC_ALL='C', PETSHOP_LOG_SAMPLE_RATE='0', VACCINE_AS_OF=as_of)
+    results = {}
+    for _ in range(repeat):
+        input_path = os.path.join(data_dir, JOBS[name].input_file)
+        for stage, command in job_stages(name):
+            output_path = os.path.join(work_dir, f"{name}.{stage}.out")
+            rows_in = count_lines(input_path)
+            # cwd nos dados: arquivos auxiliares (ex: vaccine_catalog.csv) como no -file
+            wall_seconds, peak_rss_kb = run_stage(command, input_path, output_path, data_dir, env)
+            best = results.get(stage)
+            if best is not None:
+                peak_rss_kb = max(filter(None, (peak_rss_kb, best.peak_rss_kb)), default=None)
+            if best is None or wall_seconds < best.wall_seconds:
+                best = StageResult(rows_in, wall_seconds, peak_rss_kb)
+            else:
+                best = best._replace(peak_rss_kb=peak_rss_kb)
+            results[stage] = best
+            input_path = output_path
+    return results
+
+
+def to_metrics(result):
+    return {
+        'rows_in': result.rows_in,
+        'wall_seconds': round(result.wall_seconds, 4),
+        'rows_per_second': round(result.rows_in / max(result.wall_seconds, 1e-6), 1),
+        'peak_rss_kb': result.peak_rss_kb,
+    }
+
+
+def compare(metrics, baseline, tolerance):
+    """Lista de regressões do estágio em relação à baseline."""
+    regressions = []
+    if baseline is None:
+        return regressions
+    if (baseline['wall_seconds'] >= MIN_COMPARABLE_SECONDS
+            and metrics['rows_per_second'] < baseline['rows_per_second'] * (1 - tolerance)):
+        regressions.append(f"rows/s {metrics['rows_per_second']:.0f} < baseline {baseline['rows_per_second']:.0f}")
+    if (metrics['peak_rss_kb'] and baseline['peak_rss_kb']
+            and metrics['peak_rss_kb'] > baseline['peak_rss_kb'] * (1 + tolerance)):
+        regressions.append(f"peak RSS {metrics['peak_rss_kb']} KB > baseline {baseline['peak_rss_kb']} KB")
+    return regressions
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baselines(path, baselines):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def run(options):
+    with open(os.path.join(options.data, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    scale = str(manifest['pets'])
+    baselines = load_baselines(options.baseline)
+    scale_baselines = baselines.get(scale, {})
+
+    work_dir = tempfile.mkdtemp(prefix='petshop-bench-')
+    report = {}
+    regressions = []
+    try:
+        print(f"{'job':<24} {'stage':<8} {'rows in':>10} {'wall (s)':>9} {'rows/s':>11} {'peak RSS (MB)':>14}  vs baseline")
+        for name in options.jobs:
+            report[name] = {}
+            job_wall = 0.0
+            for stage, result in run_job(name, options.data, work_dir, options.repeat, manifest['today']).items():
+                metrics = to_metrics(result)
+                report[name][stage] = metrics
+                job_wall += result.wall_seconds
+                baseline = scale_baselines.get(name, {}).get(stage)
+                stage_regressions = compare(metrics, baseline, options.tolerance)
+                regressions += [f"{name}/{stage}: {message}" for message in stage_regressions]
+                if baseline is None:
+                    status = 'no baseline'
+                else:
+                    change = metrics['rows_per_second'] / baseline['rows_per_second'] - 1
+                    status = f"{change:+.1%} rows/s" + (' REGRESSION' if stage_regressions else '')
+                peak_rss = '-' if metrics['peak_rss_kb'] is None else f"{metrics['peak_rss_kb'] / 1024:.1f}"
+                print(f"{name:<24} {stage:<8} {metrics['rows_in']:>10} {metrics['wall_seconds']:>9.3f} "
+                      f"{metrics['rows_per_second']:>11.0f} {peak_rss:>14}  {status}")
+            print(f"{name:<24} {'total':<8} {'':>10} {job_wall:>9.3f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if options.save_baseline:
+        baselines.setdefault(scale, {}).update(report)
+        save_baselines(options.baseline, baselines)
+        print(f"Baseline for {scale} pets saved to {options.baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {options.tolerance:.0%}:")
+        for message in regressions:
+            print(f"  {message}")
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Mede map/sort/reduce de cada job e compara com as baselines.')
+    parser.add_argument('--data', required=True, help='Diretório gerado pelo generate_data.py')
+    parser.add_argument('--jobs', default=','.join(JOBS),
+                        type=lambda value: [job for job in value.split(',') if job],
+                        help='Jobs separados por vírgula (padrão: todos)')
+    parser.add_argument('--repeat', type=int, default=3, help='Execuções por job; vale o melhor tempo')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Variação aceita antes de marcar regressão')
+    parser.add_argument('--baseline', default=BASELINES_FILE, help='Arquivo de baselines')
+    parser.add_argument('--save-baseline', action='store_true', help='Grava os resultados como baseline desta escala')
+    options = parser.parse_args(argv)
+    unknown = [job for job in options.jobs if job not in JOBS]
+    if unknown:
+        parser.error(f"unknown job(s): {', '.join(unknown)} (expected: {', '.join(JOBS)})")
+    return options
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    try:
+        regressions = run(options)
+    except (BenchmarkError, OSError) as e:
+        sys.stderr.write(f"ERROR: {e}\n")
+        return 2
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
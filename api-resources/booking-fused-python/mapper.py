@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+# Módulos compartilhados: enviados com -file (Hadoop) ou lidos de ../common-python
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common-python'))
+import date_codec
+import salt_plan
+import stream_format
+from job_metrics import JobMetrics, RECORDS_OUT, MALFORMED_ROWS
+
+# Plano de sal dos perfis quentes (salt_plan.py), enviado com -file
+SALTS_FILE = os.environ.get('BOOKING_SALTS_FILE', 'booking_salts.csv')
+
+# Contadores do mapper (reporter:counter no stderr)
+metrics = JobMetrics('BookingMapper')
+# Sempre texto: a ordenação secundária (KeyFieldBasedComparator) só existe em texto
+stream = stream_format.open_stream(stream_format.TEXT)
+salts = salt_plan.load(SALTS_FILE)
+
+def main():
+    for line in stream_format.read_lines(metrics=metrics):
+        fields = line.split(',')
+
+        # Formato esperado: pet_id,pet_profile,booking_date,ignore_recommendation
+        # Ex: 1,Cão;Golden Retriever;Longo,2025-04-10 14:00:00,0
+        if len(fields) != 4:
+            metrics.incr(MALFORMED_ROWS)
+            continue
+        try:
+            pet_id = int(fields[0])
+            ignore_recommendation = int(fields[3])
+        except ValueError:
+            metrics.incr(MALFORMED_ROWS)
+            continue
+        booking_second = date_codec.to_epoch_second(fields[2])
+        if booking_second is None:
+            metrics.incr(MALFORMED_ROWS)
+            continue
+
+        # Chave composta (perfil com o sal, ID do pet, horário), como no job de
+        # referência: o reducer recebe os pets de um sal do perfil um a um, com
+        # os horários já em ordem, e calcula na mesma passada o histograma
+        # parcial do perfil e a recomendação de cada pet. O sal vem do pet_id,
+        # então todos os agendamentos de um pet ficam no mesmo sal.
+        # Saída (texto): "Cão;Golden Retriever;Longo#0\t1\t1744293600\t0"
+        pet_profile = fields[1]
+        salt = pet_id % salts[pet_profile] if pet_profile in salts else 0
+        stream.emit_key((salt_plan.salted_key(pet_profile, salt), pet_id, booking_second, ignore_recommendation))
+        metrics.incr(RECORDS_OUT)
+
+    stream.flush()
+    metrics.flush()
+
+if __name__ == "__main__":
+    main()
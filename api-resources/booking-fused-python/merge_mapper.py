@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+# Módulos compartilhados: enviados com -file (Hadoop) ou lidos de ../common-python
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common-python'))
+import stream_format
+from job_metrics import JobMetrics, RECORDS_OUT, MALFORMED_ROWS
+
+# Contadores do mapper (reporter:counter no stderr)
+metrics = JobMetrics('BookingMergeMapper')
+stream = stream_format.open_stream()
+
+def main():
+    # Entrada: saída do reducer.py, um histograma parcial por sal de cada
+    # perfil e as recomendações já finais de cada pet
+    # Ex: reference:Cão;Golden Retriever;Longo\t7:120 14:35 30:2
+    #     recommendation:1\t2026-11-14,27
+    for line in stream_format.read_lines(metrics=metrics):
+        key, sep, value = line.partition('\t')
+        if not sep or not value:
+            metrics.incr(MALFORMED_ROWS)
+            continue
+
+        # A chave já é a da saída final (perfil sem sal ou pet_id): o
+        # merge_reducer.py recebe todos os sais de um perfil juntos
+        stream.emit(key, (value,))
+        metrics.incr(RECORDS_OUT)
+
+    stream.flush()
+    metrics.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Segundo job do booking combinado: mescla os histogramas parciais de cada
+perfil na referência final e repassa as recomendações de cada pet.
+
+Saída, lida pelo bulk_loader.py e pelo recommendation_snapshot.py com
+--named-output reference / recommendation:
+    reference:Cão;Golden Retriever;Longo\\t27,24,59,82
+    recommendation:1\\t2026-11-14,27
+"""
+
+import os
+import sys
+
+# Módulos compartilhados: enviados com -file (Hadoop) ou lidos de ../common-python
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common-python'))
+import stream_format
+from gap_histogram import GapHistogram
+from job_metrics import JobMetrics, clock, RECORDS_OUT, MALFORMED_ROWS, KEYS_PROCESSED
+
+# Nomes das saídas (os mesmos do reducer.py)
+REFERENCE = 'reference'
+RECOMMENDATION = 'recommendation'
+
+# Quantis dos intervalos emitidos junto com a frequência
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Contadores do job (reporter:counter no stderr)
+metrics = JobMetrics('BookingMerge')
+stream = stream_format.open_stream()
+
+def main():
+    # Cada grupo traz os histogramas parciais de todos os sais de um perfil,
+    # ou a recomendação de um pet
+    for key, records in stream.groups(metrics):
+        name = key.partition(':')[0]
+        if name == RECOMMENDATION:
+            for values in records:
+                # No modo texto a vírgula de 'data,frequência' separa os valores
+                stream.output(key, ','.join(map(str, values)))
+                metrics.incr(RECORDS_OUT)
+            continue
+        if name != REFERENCE:
+            for _ in records:
+                metrics.incr(MALFORMED_ROWS)
+            continue
+
+        histogram = GapHistogram()
+        for values in records:
+            started = clock()
+            try:
+                [partial] = values
+                partial = GapHistogram.from_text(partial)
+            except ValueError:
+                metrics.incr(MALFORMED_ROWS)
+                continue
+            # O histograma é exato: a soma dos parciais é o histograma do perfil inteiro
+            histogram.merge(partial)
+            metrics.lap('merge', started)
+
+        process_profile(key, histogram)
+
+    stream.flush()
+    metrics.flush()
+
+def process_profile(key, histogram):
+    """
+    Frequência média do perfil sem outliers (intervalo de confiança de 95%) e
+    quantis de todos os intervalos, antes do filtro.
+    """
+    started = clock()
+    metrics.incr(KEYS_PROCESSED)
+    final_average = histogram.frequency_days()
+    started = metrics.lap('compute', started)
+    if final_average is None:
+        return
+
+    p50, p90, p99 = histogram.quantiles(QUANTILES)
+    stream.output(key, '%d,%d,%d,%d' % (int(round(final_average)), p50, p90, p99))
+    metrics.lap('emit', started)
+    metrics.incr(RECORDS_OUT)
+    metrics.maybe_flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Job combinado de booking: a partir de uma única leitura dos agendamentos
+realizados, calcula a frequência de referência de cada perfil (como o job
+booking-recommendation-generate-reference-python) e a data sugerida de cada
+pet (como o job booking-recommendation-python).
+
+Este é o primeiro dos dois jobs, com as duas saídas nos mesmos part-* e o
+nome da saída na chave:
+    reference:Cão;Golden Retriever;Longo\\t7:120 14:35 30:2
+    recommendation:1\\t2026-11-14,27
+As recomendações já são finais; os histogramas são parciais (um por sal do
+perfil) e o merge_reducer.py os mescla em 'frequência,p50,p90,p99'.
+"""
+
+import os
+import sys
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+
+# Módulos compartilhados: enviados com -file (Hadoop) ou lidos de ../common-python
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common-python'))
+import date_codec
+import salt_plan
+import stream_format
+from booking_frequency import recommend
+from gap_histogram import GapHistogram
+from job_metrics import JobMetrics, clock, RECORDS_OUT, MALFORMED_ROWS, SKIPPED_PETS, KEYS_PROCESSED
+
+# Nomes das saídas
+REFERENCE = 'reference'
+RECOMMENDATION = 'recommendation'
+
+# Contadores do job (reporter:counter no stderr)
+metrics = JobMetrics('Booking')
+# Sempre texto: a chave composta do mapper só é ordenada campo a campo em texto
+stream = stream_format.open_stream(stream_format.TEXT)
+
+def main():
+    now = datetime.now()
+
+    # Ordenação secundária: os registros chegam ordenados por (perfil#sal,
+    # pet_id, horário), então cada grupo traz todos os agendamentos de um sal
+    # de um perfil, pet a pet e com os horários já em ordem. Os intervalos vão
+    # direto para o histograma, e de cada pet só ficam a contagem, a soma dos
+    # intervalos e o último horário: nada é guardado nem ordenado.
+    for salted_profile, records in groupby(stream.key_records(metrics), itemgetter(0)):
+        histogram = GapHistogram()
+        pet_id = last_second = None
+        visits = total_gap_days = 0
+        ignored = False
+        valid_records = False
+
+        for fields in records:
+            started = clock()
+
+            # O registro deve ter exatamente perfil#sal, pet_id, horário e ignore_recommendation
+            try:
+                _, record_pet_id, second_str, ignore_str = fields
+                ignore_recommendation = int(ignore_str)
+            except ValueError:
+                metrics.incr(MALFORMED_ROWS)
+                continue
+
+            booking_second = date_codec.decode_epoch_second(second_str)
+            started = metrics.lap('parse', started)
+            if booking_second is None:
+                metrics.incr(MALFORMED_ROWS)
+                continue
+            valid_records = True
+
+            if record_pet_id == pet_id:
+                # Mesmo pet: o intervalo (dias completos) desde o agendamento anterior
+                gap = date_codec.gap_days(last_second, booking_second)
+                histogram.add(gap)
+                total_gap_days += gap
+                visits += 1
+            else:
+                emit_recommendation(pet_id, visits, total_gap_days, last_second, ignored, now)
+                pet_id = record_pet_id
+                visits = 1
+                total_gap_days = 0
+                ignored = False
+            last_second = booking_second
+            ignored = ignored or bool(ignore_recommendation)
+            metrics.lap('compute', started)
+
+        emit_recommendation(pet_id, visits, total_gap_days, last_second, ignored, now)
+        if valid_records:
+            emit_partition(salt_plan.unsalted_key(salted_profile), histogram)
+
+    stream.flush()
+    metrics.flush()
+
+def emit_recommendation(pet_id, visits, total_gap_days, last_second, ignored, now):
+    """
+    Emite a recomendação de um pet com duas ou mais visitas que não esteja
+    marcado com ignore_recommendation (os intervalos dele entram na referência
+    de qualquer forma).
+    """
+    if pet_id is None:
+        return
+    if visits < 2:
+        metrics.incr(SKIPPED_PETS)
+        return
+    if ignored:
+        return
+    started = clock()
+    suggested_date, avg_freq_days = recommend(visits, total_gap_days, last_second, now)
+    stream.output(f"{RECOMMENDATION}:{pet_id}", f"{suggested_date},{avg_freq_days}")
+    metrics.lap('emit', started)
+    metrics.incr(RECORDS_OUT)
+
+def emit_partition(profile, histogram):
+    """
+    Emite o histograma parcial dos intervalos de um sal do perfil; o
+    merge_reducer.py soma os histogramas de todos os sais e calcula a
+    frequência e os quantis do perfil.
+    """
+    started = clock()
+    metrics.incr(KEYS_PROCESSED)
+    if not histogram.count:
+        return
+
+    # Saída (texto): "reference:Cão;Golden Retriever;Longo\t7:120 14:35 30:2"
+    stream.output(f"{REFERENCE}:{profile}", histogram.to_text())
+    metrics.lap('emit', started)
+    metrics.incr(RECORDS_OUT)
+    metrics.maybe_flush()
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,62 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
 import sys
 
+# Módulos compartilhados: enviados com -file (Hadoop) ou lidos de ../common-python
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common-python'))
+import date_codec
+import salt_plan
+import stream_format
+from job_metrics import JobMetrics, RECORDS_OUT, MALFORMED_ROWS
+
+# Plano de sal dos perfis quentes (salt_plan.py), enviado com -file
+SALTS_FILE = os.environ.get('BOOKING_REFERENCE_SALTS_FILE', 'booking_reference_salts.csv')
+
+# Contadores do mapper (reporter:counter no stderr)
+metrics = JobMetrics('BookingReferenceMapper')
+# Sempre texto: a ordenação secundária (KeyFieldBasedComparator) só existe em texto
+stream = stream_format.open_stream(stream_format.TEXT)
+salts = salt_plan.load(SALTS_FILE)
+
 def main():
-    # A entrada vem do STDIN (padrão do Hadoop Streaming)
-    for line in sys.stdin:
-        # Remove espaços em branco no início e no fim
-        line = line.strip()
+    # A entrada vem do STDIN (padrão do Hadoop Streaming), lida em blocos,
+    # com as linhas já sem espaços nas pontas e RECORDS_IN contado por bloco
+    for line in stream_format.read_lines(metrics=metrics):
         # Divide a linha em campos com base na vírgula
         fields = line.split(',')
         
         # Formato esperado: pet_id,pet_profile,booking_date
         # Ex: 1,Cão;Golden Retriever;Longo,2025-04-10 14:00:00.0
         if len(fields) >= 3:
-            pet_id = fields[0]
+            try:
+                pet_id = int(fields[0])
+            except ValueError:
+                metrics.incr(MALFORMED_ROWS)
+                continue
             pet_profile = fields[1]
-            booking_date = fields[2]
+            # O horário é convertido uma única vez em segundos desde 1970-01-01
+            booking_second = date_codec.to_epoch_second(fields[2])
+            if booking_second is None:
+                # Ignora linhas com data mal formatada
+                metrics.incr(MALFORMED_ROWS)
+                continue
             
-            # A chave é o perfil do pet
-            # O valor é o ID do pet e a data do agendamento, separados por vírgula
-            # Saída: "Cão;Golden Retriever;Longo\t1,2025-04-10 14:00:00.0"
-            print('%s\t%s,%s' % (pet_profile, pet_id, booking_date))
+            # Chave composta (perfil com o sal, ID do pet, horário do agendamento):
+            # o job particiona só pelo primeiro campo e ordena pet_id e horário
+            # numericamente, então o reducer recebe os horários de cada pet em
+            # ordem. O sal vem do pet_id, de modo que todos os agendamentos de
+            # um pet ficam no mesmo sal. Perfis fora do plano têm um único sal (0).
+            # Saída: "Cão;Golden Retriever;Longo#0\t1\t1744293600"
+            salt = pet_id % salts[pet_profile] if pet_profile in salts else 0
+            stream.emit_key((salt_plan.salted_key(pet_profile, salt), pet_id, booking_second))
+            metrics.incr(RECORDS_OUT)
+        else:
+            metrics.incr(MALFORMED_ROWS)
+
+    stream.flush()
+    metrics.flush()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+# Módulos compartilhados: enviados com -file (Hadoop) ou lidos de ../common-python
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common-python'))
+import stream_format
+from job_metrics import JobMetrics, RECORDS_OUT, MALFORMED_ROWS
+
+# Contadores do mapper (reporter:counter no stderr)
+metrics = JobMetrics('BookingReferenceMergeMapper')
+stream = stream_format.open_stream()
+
+def main():
+    # Entrada: saída do reducer.py, um histograma parcial por sal de cada perfil
+    # Ex: Cão;Golden Retriever;Longo\t7:120 14:35 30:2
+    for line in stream_format.read_lines(metrics=metrics):
+        profile, sep, histogram = line.partition('\t')
+        if not sep or not histogram:
+            metrics.incr(MALFORMED_ROWS)
+            continue
+
+        # A chave é o perfil (sem sal): o merge_reducer.py recebe todos os sais juntos
+        stream.emit(profile, (histogram,))
+        metrics.incr(RECORDS_OUT)
+
+    stream.flush()
+    metrics.flush()
+
+if __name__ == "__main__":
+    main()
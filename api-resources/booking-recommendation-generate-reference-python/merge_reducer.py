@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+# Módulos compartilhados: enviados com -file (Hadoop) ou lidos de ../common-python
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common-python'))
+import stream_format
+from gap_histogram import GapHistogram
+from job_metrics import JobMetrics, clock, RECORDS_OUT, MALFORMED_ROWS, KEYS_PROCESSED
+
+# Contadores do job (reporter:counter no stderr)
+metrics = JobMetrics('BookingReferenceMerge')
+stream = stream_format.open_stream()
+
+# Quantis dos intervalos emitidos junto com a frequência
+QUANTILES = (0.5, 0.9, 0.99)
+
+def main():
+    # Cada grupo traz os histogramas parciais de todos os sais de um perfil
+    for profile, records in stream.groups(metrics):
+        histogram = GapHistogram()
+
+        for values in records:
+            started = clock()
+            try:
+                [partial] = values
+                partial = GapHistogram.from_text(partial)
+            except ValueError:
+                metrics.incr(MALFORMED_ROWS)
+                continue
+            # O histograma é exato: a soma dos parciais é o histograma do perfil inteiro
+            histogram.merge(partial)
+            metrics.lap('merge', started)
+
+        process_profile(profile, histogram)
+
+    stream.flush()
+    metrics.flush()
+
+def process_profile(profile, histogram):
+    """
+    Frequência média do perfil sem outliers (intervalo de confiança de 95%) e
+    quantis de todos os intervalos, antes do filtro.
+    """
+    started = clock()
+    metrics.incr(KEYS_PROCESSED)
+    final_average = histogram.frequency_days()
+    started = metrics.lap('compute', started)
+    if final_average is None:
+        return
+
+    p50, p90, p99 = histogram.quantiles(QUANTILES)
+    stream.output(profile, '%d,%d,%d,%d' % (int(round(final_average)), p50, p90, p99))
+    metrics.lap('emit', started)
+    metrics.incr(RECORDS_OUT)
+    metrics.maybe_flush()
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,91 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
 import sys
-import math
-from datetime import datetime
-from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+
+# Módulos compartilhados: enviados com -file (Hadoop) ou lidos de ../common-python
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common-python'))
+import date_codec
+import salt_plan
+import stream_format
+from gap_histogram import GapHistogram
+from job_metrics import JobMetrics, clock, RECORDS_OUT, MALFORMED_ROWS, SKIPPED_PETS, KEYS_PROCESSED
+
+# Contadores do job (reporter:counter no stderr)
+metrics = JobMetrics('BookingReference')
+# Sempre texto: a chave composta do mapper só é ordenada campo a campo em texto
+stream = stream_format.open_stream(stream_format.TEXT)
 
 def main():
-    # Dicionário para agrupar as datas por pet_id dentro de cada perfil
-    # A chave será o pet_profile (ex: "Cão;Golden Retriever;Longo")
-    # O valor será outro dicionário: {pet_id: [datas]}
-    pet_dates_by_profile = defaultdict(lambda: defaultdict(list))
-    current_profile = None
-    
-    # Processa a entrada linha por linha
-    for line in sys.stdin:
-        line = line.strip()
-        
-        # Tenta dividir a linha em chave (profile) e valor (pet_id,date)
-        try:
-            profile, value = line.split('\t', 1)
-            pet_id, date_str = value.split(',', 1)
-        except ValueError:
-            # Ignora linhas mal formatadas
-            continue
+    # Ordenação secundária: os registros chegam ordenados por (perfil#sal,
+    # pet_id, horário), então cada grupo traz todos os agendamentos de um sal
+    # de um perfil (ex: "Cão;Golden Retriever;Longo#0"), pet a pet e com os
+    # horários já em ordem. Os intervalos são calculados em fluxo, sem guardar
+    # nem ordenar as datas de cada pet.
+    for salted_profile, records in groupby(stream.key_records(metrics), itemgetter(0)):
+        histogram = GapHistogram()
+        pet_id = previous_second = None
+        visits = 0
+        valid_records = False
+
+        for fields in records:
+            started = clock()
 
-        # Converte a string de data para um objeto datetime
-        try:
-            # O formato pode ter milissegundos (.0)
-            date_obj = datetime.strptime(date_str.split('.')[0], '%Y-%m-%d %H:%M:%S')
-        except ValueError:
-            continue
+            # O registro deve ter exatamente perfil#sal, pet_id e horário
+            try:
+                _, record_pet_id, second_str = fields
+            except ValueError:
+                # Ignora linhas mal formatadas
+                metrics.incr(MALFORMED_ROWS)
+                continue
 
-        # Se o perfil mudou, processa o perfil anterior
-        if current_profile and current_profile != profile:
-            process_profile(current_profile, pet_dates_by_profile[current_profile])
+            # O mapper emite o horário como segundos desde a época (inteiro)
+            booking_second = date_codec.decode_epoch_second(second_str)
+            started = metrics.lap('parse', started)
+            if booking_second is None:
+                metrics.incr(MALFORMED_ROWS)
+                continue
+            valid_records = True
 
-            # Limpa o dicionário para o próximo perfil
-            pet_dates_by_profile.pop(current_profile)
+            if record_pet_id == pet_id:
+                # Mesmo pet: o intervalo (dias completos) desde o agendamento anterior vai direto para o histograma
+                histogram.add(date_codec.gap_days(previous_second, booking_second))
+                visits += 1
+            else:
+                if visits == 1:
+                    metrics.incr(SKIPPED_PETS)
+                pet_id = record_pet_id
+                visits = 1
+            previous_second = booking_second
+            metrics.lap('compute', started)
 
-        current_profile = profile
-        pet_dates_by_profile[current_profile][pet_id].append(date_obj)
+        if visits == 1:
+            metrics.incr(SKIPPED_PETS)
+        if valid_records:
+            emit_partition(salt_plan.unsalted_key(salted_profile), histogram)
 
-    # Processa o último perfil
-    if current_profile:
-        process_profile(current_profile, pet_dates_by_profile[current_profile])
+    stream.flush()
+    metrics.flush()
 
-def process_profile(profile, pet_dates):
+def emit_partition(profile, histogram):
     """
-    Calcula a frequência média para um perfil de pet, removendo outliers.
+    Emite o histograma parcial dos intervalos de um sal do perfil; o
+    merge_reducer.py soma os histogramas de todos os sais e calcula a
+    frequência e os quantis do perfil.
     """
-    all_diffs = []
-    
-    # 1. Coleta todas as diferenças de dias para o perfil
-    for pet_id, dates in pet_dates.items():
-        if len(dates) < 2:
-            continue
-        
-        dates.sort()
-        
-        for i in range(len(dates) - 1):
-            time_diff = dates[i+1] - dates[i]
-            all_diffs.append(time_diff.days)
-            
-    if not all_diffs:
+    started = clock()
+    metrics.incr(KEYS_PROCESSED)
+    if not histogram.count:
         return
 
-    # 2. Calcula média e desvio padrão
-    n = len(all_diffs)
-    if n == 0:
-        return
-        
-    mean = sum(all_diffs) / float(n)
-    
-    variance = sum([(x - mean) ** 2 for x in all_diffs]) / float(n)
-    std_dev = math.sqrt(variance)
-
-    # 3. Filtra outliers (intervalo de confiança de 95%)
-    lower_bound = mean - 1.96 * std_dev
-    upper_bound = mean + 1.96 * std_dev
-    
-    filtered_diffs = [d for d in all_diffs if lower_bound <= d <= upper_bound]
-    
-    if not filtered_diffs:
-        # Fallback para a média original se todos os dados forem outliers
-        final_average = mean
-    else:
-        # 4. Calcula a média final com dados filtrados
-        final_average = sum(filtered_diffs) / float(len(filtered_diffs))
-
-    print('%s\t%d' % (profile, int(round(final_average))))
+    # Saída (texto): "Cão;Golden Retriever;Longo\t7:120 14:35 30:2"
+    stream.output(profile, histogram.to_text())
+    metrics.lap('emit', started)
+    metrics.incr(RECORDS_OUT)
+    metrics.maybe_flush()
 
 if __name__ == "__main__":
     main()
@@ -1,12 +1,40 @@
 #!/usr/bin/env python3
 
+import os
 import sys
 
-for line in sys.stdin:
-    line = line.strip()
+# Shared modules: shipped with -file (Hadoop) or read from ../common-python
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common-python'))
+import date_codec
+import stream_format
+from job_metrics import JobMetrics, RECORDS_OUT, MALFORMED_ROWS
+
+metrics = JobMetrics('BookingRecommendationMapper')
+# Always text: the secondary sort (KeyFieldBasedComparator) only exists for text keys
+stream = stream_format.open_stream(stream_format.TEXT)
+
+# Lines arrive stripped, read in blocks; RECORDS_IN is counted per block
+for line in stream_format.read_lines(metrics=metrics):
     fields = line.split(',')
     if len(fields) >= 3:
-        pet_id = fields[0]
-        appointment_date = fields[1].strip()
-        frequency = fields[2].strip()
-        print(f"{pet_id}\t{appointment_date},{frequency}")
+        try:
+            # Both ids are validated here so the reducer only sees well-formed keys
+            pet_id = int(fields[0])
+            frequency = int(fields[2])
+        except ValueError:
+            metrics.incr(MALFORMED_ROWS)
+            continue
+        # Emit the appointment as integer epoch seconds so the reducer never parses dates
+        appointment_second = date_codec.to_epoch_second(fields[1].strip())
+        if appointment_second is None:
+            metrics.incr(MALFORMED_ROWS)
+            continue
+        # Composite key (pet_id, second): the job partitions by pet_id only and
+        # sorts the seconds numerically, so each pet's visits reach the reducer in order
+        stream.emit_key((pet_id, appointment_second, frequency))
+        metrics.incr(RECORDS_OUT)
+    else:
+        metrics.incr(MALFORMED_ROWS)
+
+stream.flush()
+metrics.flush()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+# Shared modules from ../common-python and the local runner (partitioning)
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common-python'))
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+import date_codec
+import local_runner
+import vectorized
+from booking_frequency import recommend
+
+NOW = datetime(2025, 6, 1, 15, 30, 12, 345678)
+
+
+def random_rows(count, seed=7):
+    """Rows in the import layout, with a few hours of jitter so gaps are not whole days."""
+    rng = random.Random(seed)
+    start = date_codec.to_epoch_second('2024-01-01 08:00:00')
+    rows = []
+    for _ in range(count):
+        second = start + rng.randrange(0, 600) * date_codec.SECONDS_PER_DAY + rng.randrange(0, 12 * 3600)
+        stamp = date_codec.to_datetime(second).strftime('%Y-%m-%d %H:%M:%S')
+        rows.append(f"{rng.randrange(1, 300)},{stamp},{rng.randrange(1, 90)}")
+    return rows
+
+
+def streaming_recommendations(rows):
+    """{pet_id: 'date,frequency'} as mapper.py + secondary sort + reducer.py compute them."""
+    visits = {}
+    for line in rows:
+        row = vectorized.parse_line(line)
+        if row is not None:
+            visits.setdefault(row[0], []).append(row[1])
+    results = {}
+    for pet_id, seconds in visits.items():
+        if len(seconds) < 2:
+            continue
+        seconds.sort()
+        total_gap_days = sum(date_codec.gap_days(a, b) for a, b in zip(seconds, seconds[1:]))
+        suggested_date, avg_freq_days = recommend(len(seconds), total_gap_days, seconds[-1], NOW)
+        results[pet_id] = f"{suggested_date},{avg_freq_days}"
+    return results
+
+
+def vectorized_recommendations(rows):
+    pet_ids, seconds, _ = vectorized.read_rows(('\n'.join(rows) + '\n').encode('utf-8'))
+    recommended, suggested_days, avg_freq_days, _ = vectorized.recommend_all(pet_ids, seconds, NOW)
+    return {pet_id: f"{date_codec.from_epoch_day(day)},{freq}"
+            for pet_id, day, freq in zip(recommended.tolist(), suggested_days.tolist(), avg_freq_days.tolist())}
+
+
+def test_read_rows_matches_parse_line():
+    rows = random_rows(200) + [
+        'pet_id,booking_date,frequency_days',
+        '',
+        '1,2025-02-29 10:00:00,30',
+        '2,2025-01-01 24:00:00,30',
+        '3, 2025-01-01 10:00:00 ,30',
+        '4,2025-01-01 10:00:00.0,30',
+        '5,2025-01-01,30',
+        'x,2025-01-01 10:00:00,30',
+        '6,2025-01-01 10:00:00,',
+    ]
+    pet_ids, seconds, lines = vectorized.read_rows(('\n'.join(rows)).encode('utf-8'))
+    expected = [row for row in map(vectorized.parse_line, rows) if row is not None]
+    assert lines == len(rows)
+    assert sorted(zip(pet_ids.tolist(), seconds.tolist())) == sorted(expected)
+
+
+def test_recommend_all_matches_the_streaming_reducer():
+    rows = random_rows(3000)
+    expected = streaming_recommendations(rows)
+    assert expected
+    assert vectorized_recommendations(rows) == expected
+
+
+def test_recommend_all_now_after_the_last_visit():
+    rows = ['1,2025-01-01 23:00:00,30', '1,2025-01-03 22:00:00,30', '1,2025-01-05 21:00:00,30']
+    # Gaps of 1 day each (23h count as 0): average 1, counted from NOW
+    assert vectorized_recommendations(rows) == streaming_recommendations(rows) == {1: '2025-06-02,1'}
+
+
+def test_timedelta_microseconds_matches_timedelta():
+    rng = random.Random(3)
+    days = [rng.randrange(0, 5000) / rng.randrange(1, 400) for _ in range(5000)] + [0.5 / 86400e6, 1 + 1.5 / 86400e6]
+    expected = [timedelta(days=value) // timedelta(microseconds=1) for value in days]
+    assert vectorized.timedelta_microseconds(np.array(days)).tolist() == expected
+
+
+def test_key_partitions_match_the_key_field_partitioner():
+    keys = np.array([str(pet_id) for pet_id in range(1, 500)])
+    specs = local_runner.parse_key_specs('-k1,1')
+    expected = [local_runner.key_field_partition(key.encode('ascii') + b'\t0', specs, 7) for key in keys.tolist()]
+    assert vectorized.key_partitions(keys, 7).tolist() == expected
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Single-node NumPy engine for the booking recommendation job.
+
+Reads the exported rows (pet_id,booking_date,frequency_days) straight into
+int64 arrays, sorts them once by (pet_id, epoch second) and computes the
+suggested date and average frequency of every pet with grouped array
+operations, instead of streaming each row through mapper.py, the shuffle and
+reducer.py. The part-* files are the ones the local runner writes for the
+streaming job with the same number of reducers: same partitioning, same key
+order, same lines.
+
+Rows in the Sqoop/psql layout ('12,2025-02-07 14:00:00,27') are parsed with
+array operations; any other row goes through the same parsing rules as
+mapper.py, so malformed rows are dropped exactly as the streaming job does.
+
+NumPy is optional for the rest of the pipeline and only required here.
+
+Usage:
+    python3 vectorized.py --output /tmp/petshop/output_booking_recommendation \\
+        --reducers 2 /tmp/petshop/input_booking_recommendation
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Shared modules from ../common-python (dates, counter names, input listing and counter report)
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common-python'))
+import date_codec
+from job_metrics import RECORDS_IN, RECORDS_OUT, MALFORMED_ROWS, SKIPPED_PETS, KEYS_PROCESSED
+from local_job import list_input_files, report_counters
+
+# Counter groups of mapper.py and reducer.py, so both engines report the same counters
+MAPPER_GROUP = 'BookingRecommendationMapper'
+REDUCER_GROUP = 'BookingRecommendation'
+
+# Longest integer field parsed with array operations (always fits in an int64)
+MAX_DIGITS = 18
+
+NEWLINE = ord('\n')
+COMMA = ord(',')
+DASH = ord('-')
+SPACE = ord(' ')
+COLON = ord(':')
+DOT = ord('.')
+ZERO = ord('0')
+
+MICROSECONDS_PER_SECOND = 10 ** 6
+MICROSECONDS_PER_DAY = date_codec.SECONDS_PER_DAY * MICROSECONDS_PER_SECOND
+
+
+def parse_digits(buf, starts, ends):
+    """
+    (values, ok) for the unsigned decimal fields buf[starts:ends]; ok is False
+    for empty, too long or non-digit fields (their values are meaningless).
+    """
+    widths = ends - starts
+    ok = (widths >= 1) & (widths <= MAX_DIGITS)
+    values = np.zeros(len(starts), dtype=np.int64)
+    last = len(buf) - 1
+    for offset in range(int(widths[ok].max()) if ok.any() else 0):
+        inside = offset < widths
+        digits = buf[np.minimum(starts + offset, last)].astype(np.int64) - ZERO
+        ok &= ~inside | ((digits >= 0) & (digits <= 9))
+        values = np.where(inside, values * 10 + digits, values)
+    return values, ok
+
+
+def parse_timestamps(buf, starts, ends):
+    """
+    (epoch seconds, ok) for 'YYYY-MM-DD HH:MM:SS[.f]' fields, the fixed layout
+    of date_codec.to_epoch_second (the fraction is dropped).
+    """
+    widths = ends - starts
+    last = len(buf) - 1
+
+    def char(offset):
+        return buf[np.minimum(starts + offset, last)]
+
+    ok = (widths == 19) | ((widths > 19) & (char(19) == DOT))
+    ok &= (char(4) == DASH) & (char(7) == DASH) & (char(10) == SPACE) & (char(13) == COLON) & (char(16) == COLON)
+    fields = []
+    for offset, width in ((0, 4), (5, 2), (8, 2), (11, 2), (14, 2), (17, 2)):
+        values, field_ok = parse_digits(buf, starts + offset, starts + offset + width)
+        fields.append(values)
+        ok &= field_ok
+    year, month, day, hour, minute, second = fields
+    ok &= (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1)
+    ok &= (hour <= 23) & (minute <= 59) & (second <= 59)
+
+    # First day of the month and of the next one, as days since the epoch
+    months = np.where(ok, (year - 1970) * 12 + month - 1, 0)
+    month_start = months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    next_month_start = (months + 1).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    ok &= day <= next_month_start - month_start
+    epoch_days = month_start + day - 1
+    return epoch_days * date_codec.SECONDS_PER_DAY + hour * 3600 + minute * 60 + second, ok
+
+
+def parse_line(line):
+    """(pet_id, epoch second) as mapper.py reads a row, or None for a malformed row."""
+    fields = line.strip().split(',')
+    if len(fields) < 3:
+        return None
+    try:
+        pet_id = int(fields[0])
+        int(fields[2])
+    except ValueError:
+        return None
+    appointment_second = date_codec.to_epoch_second(fields[1].strip())
+    if appointment_second is None:
+        return None
+    return pet_id, appointment_second
+
+
+def read_rows(data):
+    """(pet_ids, seconds, lines) of one input file; malformed rows are left out."""
+    if not data:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), 0
+    buf = np.frombuffer(data, dtype=np.uint8)
+
+    # Lines as [starts, ends) byte ranges, the last one possibly without '\n'
+    ends = np.flatnonzero(buf == NEWLINE)
+    if buf[-1] != NEWLINE:
+        ends = np.append(ends, len(buf))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+
+    # Fast path: lines with exactly two commas and fields in the fixed layout
+    commas = np.flatnonzero(buf == COMMA)
+    fast = np.bincount(np.searchsorted(ends, commas), minlength=len(ends)) == 2
+    first_comma = np.searchsorted(commas, starts)
+    first = commas[np.minimum(first_comma, len(commas) - 1)] if len(commas) else starts
+    second = commas[np.minimum(first_comma + 1, len(commas) - 1)] if len(commas) else starts
+
+    pet_ids, pet_ok = parse_digits(buf, starts, first)
+    seconds, second_ok = parse_timestamps(buf, first + 1, second)
+    _, frequency_ok = parse_digits(buf, second + 1, ends)
+    fast &= pet_ok & second_ok & frequency_ok
+
+    # Every other line (header, padding, other date formats, malformed rows)
+    # follows the mapper's rules line by line
+    slow_rows = []
+    for start, end in zip(starts[~fast].tolist(), ends[~fast].tolist()):
+        row = parse_line(data[start:end].decode('utf-8'))
+        if row is not None:
+            slow_rows.append(row)
+    if slow_rows:
+        try:
+            slow = np.array(slow_rows, dtype=np.int64).reshape(-1, 2)
+        except OverflowError:
+            raise ValueError("pet_id out of the int64 range: use the streaming job") from None
+        return np.concatenate((pet_ids[fast], slow[:, 0])), np.concatenate((seconds[fast], slow[:, 1])), len(ends)
+    return pet_ids[fast], seconds[fast], len(ends)
+
+
+def key_partitions(keys, num_partitions):
+    """
+    local_runner.key_field_partition (Hadoop's KeyFieldBasedPartitioner with
+    -k1,1, the hash starting at 0) for an array of ASCII pet_id keys.
+    """
+    if num_partitions == 1 or not len(keys):
+        return np.zeros(len(keys), dtype=np.int64)
+    codes = keys.view(np.uint32).reshape(len(keys), -1).astype(np.int64)
+    lengths = np.char.str_len(keys)
+    hashes = np.zeros(len(keys), dtype=np.int64)
+    for offset in range(codes.shape[1]):
+        hashes = np.where(offset < lengths, (31 * hashes + codes[:, offset]) & 0xFFFFFFFF, hashes)
+    return (hashes & 0x7FFFFFFF) % num_partitions
+
+
+def timedelta_microseconds(days):
+    """
+    Microseconds of timedelta(days=d) for an array of non-negative floats,
+    rounded exactly as CPython does: whole days, then the truncated
+    microseconds of the fraction, then the leftover rounded half to even.
+    """
+    whole_days = np.trunc(days)
+    fraction = (days - whole_days) * MICROSECONDS_PER_DAY
+    whole_fraction = np.trunc(fraction)
+    leftover = fraction - whole_fraction
+    microseconds = whole_days.astype(np.int64) * MICROSECONDS_PER_DAY + whole_fraction.astype(np.int64)
+    round_up = (leftover > 0.5) | ((leftover == 0.5) & (microseconds % 2 == 1))
+    return microseconds + round_up
+
+
+def recommend_all(pet_ids, seconds, now):
+    """
+    (pet_ids, suggested epoch days, average frequencies, pets) for the pets
+    with two or more visits, as booking_frequency.recommend computes them per
+    pet: the whole-day gaps between consecutive visits are summed in time order.
+    """
+    if not len(pet_ids):
+        return pet_ids, seconds, seconds, 0
+    order = np.lexsort((seconds, pet_ids))
+    pet_ids = pet_ids[order]
+    seconds = seconds[order]
+
+    # One group per pet_id: group boundaries are where the sorted ids change
+    group_starts = np.concatenate(([0], np.flatnonzero(np.diff(pet_ids)) + 1))
+    group_ends = np.append(group_starts[1:], len(pet_ids))
+    counts = group_ends - group_starts
+    # Whole-day gaps between consecutive visits (date_codec.gap_days), zeroed
+    # at each pet's last visit so no gap crosses into the next pet
+    gaps = np.append(np.diff(seconds) // date_codec.SECONDS_PER_DAY, 0)
+    gaps[group_ends - 1] = 0
+    total_gap_days = np.add.reduceat(gaps, group_starts)
+    last_seconds = seconds[group_ends - 1]
+
+    eligible = counts >= 2
+    counts = counts[eligible]
+    total_gap_days = total_gap_days[eligible]
+    last_seconds = last_seconds[eligible]
+
+    # Same float64 division and truncation as average_frequency / int()
+    avg_freq_days = total_gap_days / (counts - 1)
+    now_microseconds = (now - date_codec.EPOCH) // timedelta(microseconds=1)
+    base = np.maximum(last_seconds * MICROSECONDS_PER_SECOND, now_microseconds)
+    suggested_days = (base + timedelta_microseconds(avg_freq_days)) // MICROSECONDS_PER_DAY
+    return pet_ids[group_starts][eligible], suggested_days, avg_freq_days.astype(np.int64), len(group_starts)
+
+
+def write_output(output_dir, pet_ids, suggested_days, avg_freq_days, num_partitions):
+    """part-NNNNN files with the lines of each partition sorted by key bytes, plus _SUCCESS."""
+    keys = pet_ids.astype(str)
+    partitions = key_partitions(keys, num_partitions)
+    key_list = keys.tolist()
+    suggested_days = suggested_days.tolist()
+    avg_freq_days = avg_freq_days.tolist()
+    os.makedirs(output_dir)
+    for partition in range(num_partitions):
+        selected = np.flatnonzero(partitions == partition)
+        selected = selected[np.argsort(keys[selected], kind='stable')]
+        with open(os.path.join(output_dir, f"part-{partition:05d}"), 'w', encoding='utf-8') as out:
+            out.writelines(f"{key_list[i]}\t{date_codec.from_epoch_day(suggested_days[i])},{avg_freq_days[i]}\n"
+                           for i in selected.tolist())
+    open(os.path.join(output_dir, '_SUCCESS'), 'wb').close()
+
+
+def run(options):
+    if os.path.exists(options.output):
+        raise FileExistsError(f"Output directory already exists: {options.output}")
+
+    input_files = list_input_files(options.input)
+    pet_ids, seconds = [], []
+    lines = 0
+    for path in input_files:
+        with open(path, 'rb') as f:
+            file_pet_ids, file_seconds, file_lines = read_rows(f.read())
+        pet_ids.append(file_pet_ids)
+        seconds.append(file_seconds)
+        lines += file_lines
+    pet_ids = np.concatenate(pet_ids) if pet_ids else np.zeros(0, dtype=np.int64)
+    seconds = np.concatenate(seconds) if seconds else np.zeros(0, dtype=np.int64)
+
+    recommended, suggested_days, avg_freq_days, pets = recommend_all(pet_ids, seconds, datetime.now())
+    write_output(options.output, recommended, suggested_days, avg_freq_days, options.reducers)
+
+    sys.stderr.write(f"Vectorized job finished: {len(input_files)} input file(s), {options.reducers} partition(s).\n")
+    counters = {
+        (MAPPER_GROUP, RECORDS_IN): lines,
+        (MAPPER_GROUP, RECORDS_OUT): len(pet_ids),
+        (MAPPER_GROUP, MALFORMED_ROWS): lines - len(pet_ids),
+        (REDUCER_GROUP, RECORDS_IN): len(pet_ids),
+        (REDUCER_GROUP, KEYS_PROCESSED): pets,
+        (REDUCER_GROUP, SKIPPED_PETS): pets - len(recommended),
+        (REDUCER_GROUP, RECORDS_OUT): len(recommended),
+    }
+    # Like the streaming tasks, counters that were never incremented are not reported
+    report_counters([{key: amount for key, amount in counters.items() if amount}])
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Computes the booking recommendations with NumPy on a single node.')
+    parser.add_argument('input', nargs='+', help='Input file or directory (part-m-* from the import)')
+    parser.add_argument('--output', required=True, help='Output directory (must not exist)')
+    parser.add_argument('--reducers', type=int, default=1, help='Number of part-* files, as -numReduceTasks')
+    options = parser.parse_args(argv)
+    if options.reducers < 1:
+        parser.error('--reducers must be >= 1')
+    return options
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    if np is None:
+        sys.stderr.write("ERROR: NumPy is required by the vectorized engine (pip install numpy)\n")
+        return 1
+    try:
+        run(options)
+    except (ValueError, OSError) as e:
+        sys.stderr.write(f"ERROR: {e}\n")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
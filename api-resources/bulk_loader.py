@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Carga em lote da saída dos reducers no PostgreSQL com COPY FROM STDIN.
+
+Substitui os laços 'while read ...; psql -c "INSERT ..."' dos pipelines: lê a
+saída do job (arquivos ou stdin), converte cada linha para os tipos da tabela
+de destino e envia tudo por uma única conexão psql, em um único COPY e em uma
+única transação (TRUNCATE opcional incluído).
+
+Com --jobs N e vários arquivos (um por reducer), cada arquivo é enviado por
+sua própria conexão a uma tabela UNLOGGED de staging, e a troca na tabela de
+destino acontece em uma única transação no final.
+
+Com --upsert as linhas vão para uma tabela temporária e são mescladas na
+tabela de destino com INSERT ... ON CONFLICT sobre a chave única; --scope
+(subconsulta que devolve chaves) remove as linhas dessas chaves que não
+vieram na carga, para execuções incrementais.
+
+Uso:
+    hdfs dfs -cat /petshop/output_x/part-* | \\
+        python3 bulk_loader.py --table booking_recommendation --truncate \\
+            -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME
+
+    python3 bulk_loader.py --table booking_recommendation --truncate --jobs 4 \\
+        --reader 'hdfs dfs -cat' -h $DB_HOST ... /petshop/output_x/part-r-0000{0,1,2,3}
+
+Com --named-output NOME, só as linhas da saída nomeada 'NOME:chave\tvalor' de
+um job com várias saídas (ex: booking-fused-python) são carregadas.
+
+A senha vem de PGPASSWORD, como nos demais comandos psql dos pipelines.
+"""
+
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+# Parsers e leitura da saída dos jobs, compartilhados com o recommendation_snapshot.py
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'common-python'))
+from job_output import TABLES, ReadError, named_output_parser, parse_rows, read_inputs, read_lines
+
+# Quantidade de linhas acumuladas antes de cada escrita no psql
+BATCH_ROWS = 10000
+
+
+class LoadError(Exception):
+    pass
+
+
+def table_parser(options):
+    """Colunas e parser da tabela de destino, restrito à saída nomeada, se houver."""
+    columns, parser = TABLES[options.table]
+    return columns, named_output_parser(parser, options.named_output)
+
+
+# Tabela -> colunas da restrição UNIQUE usada pelo modo --upsert
+UPSERT_KEYS = {
+    'booking_recommendation': ('pet_id',),
+    'ltv_rollup': ('level', 'species', 'animal_type', 'fur_type'),
+}
+
+# Chaves únicas que são índices de expressões: as expressões do índice, alvo do
+# ON CONFLICT (idx_ltv_rollup_cell no ddl.js: os NULL dos níveis agregados viram um valor fixo)
+CONFLICT_TARGETS = {
+    'ltv_rollup': ('level', "COALESCE(species, 'Cão')", "COALESCE(animal_type, '')", "COALESCE(fur_type, '')"),
+}
+
+
+def copy_escape(value):
+    """Escapa um campo para o formato texto do COPY (None vira NULL)."""
+    if value is None:
+        return '\\N'
+    return (value.replace('\\', '\\\\')
+                 .replace('\t', '\\t')
+                 .replace('\n', '\\n')
+                 .replace('\r', '\\r'))
+
+
+def copy_rows(lines, parser, stats):
+    """Linhas do reducer -> linhas do COPY (as inválidas e as de outra tabela ficam de fora)."""
+    for row in parse_rows(lines, parser, stats):
+        yield '\t'.join(copy_escape(field) for field in row) + '\n'
+
+
+def psql_command(options):
+    command = ['psql', '-X', '-q', '-v', 'ON_ERROR_STOP=1', '--single-transaction']
+    for flag, value in (('-h', options.host), ('-p', options.port), ('-U', options.user), ('-d', options.dbname)):
+        if value:
+            command += [flag, value]
+    return command
+
+
+def run_psql(options, write):
+    """Executa em uma transação os comandos escritos por write(stdin)."""
+    process = subprocess.Popen(psql_command(options), stdin=subprocess.PIPE, encoding='utf-8')
+    try:
+        write(process.stdin)
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+    except BaseException:
+        # Sem o fim do COPY o psql efetivaria a carga parcial: aborta a transação
+        process.kill()
+        process.wait()
+        raise
+
+    if process.wait() != 0:
+        raise LoadError(f"psql failed with exit code {process.returncode}; nothing was loaded into {options.table}")
+
+
+def write_copy(stdin, target, columns, lines, parser, stats):
+    stdin.write(f"COPY {target} ({', '.join(columns)}) FROM STDIN;\n")
+    batch = []
+    for row in copy_rows(lines, parser, stats):
+        batch.append(row)
+        if len(batch) >= BATCH_ROWS:
+            stdin.write(''.join(batch))
+            batch = []
+    stdin.write(''.join(batch))
+    stdin.write('\\.\n')
+
+
+def upsert_statements(table, columns, staging, scope):
+    """Comandos que mesclam a tabela de staging na tabela de destino."""
+    keys = UPSERT_KEYS[table]
+    key_list = ', '.join(CONFLICT_TARGETS.get(table, keys))
+    statements = []
+    if scope:
+        # Chaves do escopo que não vieram na carga deixaram de ter resultado
+        statements.append(
+            f"DELETE FROM {table} WHERE ({key_list}) IN ({scope}) "
+            f"AND ({key_list}) NOT IN (SELECT {key_list} FROM {staging});\n")
+    updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in columns if column not in keys)
+    statements.append(
+        f"INSERT INTO {table} ({', '.join(columns)}) SELECT {', '.join(columns)} FROM {staging} "
+        f"ON CONFLICT ({key_list}) DO UPDATE SET {updates};\n")
+    return statements
+
+
+def merge_statements(options, columns, staging):
+    """Comandos que levam as linhas da staging para a tabela de destino."""
+    if options.upsert:
+        return upsert_statements(options.table, columns, staging, options.scope)
+    statements = []
+    if options.truncate:
+        statements.append(f"TRUNCATE TABLE {options.table};\n")
+    statements.append(f"INSERT INTO {options.table} ({', '.join(columns)}) SELECT {', '.join(columns)} FROM {staging};\n")
+    return statements
+
+
+def load_serial(options, columns, parser, stats):
+    """Uma conexão e um único COPY (direto na tabela, ou via staging temporária no --upsert)."""
+    def write(stdin):
+        target = options.table
+        if options.truncate:
+            stdin.write(f"TRUNCATE TABLE {options.table};\n")
+        if options.upsert:
+            target = f"staging_{options.table}"
+            stdin.write(f"CREATE TEMP TABLE {target} ON COMMIT DROP AS "
+                        f"SELECT {', '.join(columns)} FROM {options.table} WITH NO DATA;\n")
+        write_copy(stdin, target, columns, read_inputs(options.files, options.reader), parser, stats)
+        if options.upsert:
+            stdin.write(''.join(upsert_statements(options.table, columns, target, options.scope)))
+
+    run_psql(options, write)
+
+
+def load_part(task):
+    """Worker: envia um arquivo part-* para a tabela de staging com seu próprio COPY."""
+    options, staging, path = task
+    columns, parser = table_parser(options)
+    stats = {'rows': 0, 'rejected': 0}
+    run_psql(options, lambda stdin: write_copy(stdin, staging, columns, read_lines(path, options.reader), parser, stats))
+    return stats
+
+
+def load_parallel(options, columns, stats):
+    """
+    Um COPY por arquivo, em paralelo, para uma tabela UNLOGGED de staging;
+    depois uma única transação troca/mescla o conteúdo na tabela de destino.
+    """
+    staging = f"load_{options.table}_{os.getpid()}"
+    run_psql(options, lambda stdin: stdin.write(
+        f"CREATE UNLOGGED TABLE {staging} AS SELECT {', '.join(columns)} FROM {options.table} WITH NO DATA;\n"))
+    try:
+        with multiprocessing.Pool(min(options.jobs, len(options.files))) as pool:
+            for part_stats in pool.imap_unordered(load_part, [(options, staging, path) for path in options.files]):
+                stats['rows'] += part_stats['rows']
+                stats['rejected'] += part_stats['rejected']
+        run_psql(options, lambda stdin: stdin.write(
+            ''.join(merge_statements(options, columns, staging)) + f"DROP TABLE {staging};\n"))
+    except BaseException:
+        try:
+            run_psql(options, lambda stdin: stdin.write(f"DROP TABLE IF EXISTS {staging};\n"))
+        except LoadError as e:
+            sys.stderr.write(f"WARNING: could not drop staging table {staging}: {e}\n")
+        raise
+
+
+def load(options):
+    columns, parser = table_parser(options)
+    stats = {'rows': 0, 'rejected': 0}
+    started = time.time()
+
+    if options.jobs > 1 and len(options.files) > 1:
+        load_parallel(options, columns, stats)
+    else:
+        load_serial(options, columns, parser, stats)
+
+    elapsed = max(time.time() - started, 1e-6)
+    print(f"Loaded {stats['rows']} rows into {options.table} in {elapsed:.2f}s "
+          f"({stats['rows'] / elapsed:.0f} rows/s, {stats['rejected']} rejected)")
+    return stats
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Carrega a saída de um job no PostgreSQL via COPY.', add_help=False)
+    parser.add_argument('--help', action='help', help='Mostra esta ajuda')
+    parser.add_argument('--table', required=True, choices=sorted(TABLES), help='Tabela de destino')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--truncate', action='store_true', help='Esvazia a tabela na mesma transação da carga')
+    mode.add_argument('--upsert', action='store_true', help='Mescla as linhas pela chave única da tabela')
+    parser.add_argument('--scope', help='Subconsulta com as chaves recalculadas; as ausentes da carga são removidas (requer --upsert)')
+    parser.add_argument('--named-output', help="Carrega só as linhas 'NOME:chave' da saída nomeada NOME")
+    parser.add_argument('--jobs', type=int, default=1, help='Arquivos carregados em paralelo, cada um em sua conexão')
+    parser.add_argument('--reader', help="Comando que lê cada arquivo (ex: 'hdfs dfs -cat'); padrão: arquivo local")
+    parser.add_argument('-h', '--host', help='Host do PostgreSQL')
+    parser.add_argument('-p', '--port', help='Porta do PostgreSQL')
+    parser.add_argument('-U', '--user', help='Usuário do PostgreSQL')
+    parser.add_argument('-d', '--dbname', help='Banco de dados')
+    parser.add_argument('files', nargs='*', help='Arquivos de saída do job (padrão: stdin)')
+    options = parser.parse_args(argv)
+    if options.upsert and options.table not in UPSERT_KEYS:
+        parser.error(f"--upsert is not supported for table {options.table}")
+    if options.scope and not options.upsert:
+        parser.error("--scope requires --upsert")
+    return options
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    try:
+        load(options)
+    except (LoadError, ReadError, OSError) as e:
+        sys.stderr.write(f"ERROR: {e}\n")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
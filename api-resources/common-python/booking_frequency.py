@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Frequência de visitas de um pet e data sugerida do próximo agendamento.
+
+Compartilhado pelo job de recomendação (chave pet_id) e pelo job combinado de
+booking (chave perfil#sal), para que os dois gerem exatamente a mesma sugestão.
+Os agendamentos de cada pet chegam em ordem de horário (ordenação secundária),
+então cada pet é resumido por (visitas, soma dos intervalos, último horário):
+memória constante por pet, qualquer que seja o histórico.
+
+Os intervalos são dias completos entre horários consecutivos (date_codec.gap_days,
+o timedelta.days de antes): a soma deles não é último - primeiro, por isso as
+visitas precisam ser percorridas em ordem.
+"""
+
+from datetime import timedelta
+
+import date_codec
+
+
+def average_frequency(count, total_gap_days):
+    """
+    Frequência média em dias entre visitas consecutivas (float): a soma dos
+    intervalos dividida pelo número de intervalos. 0 com menos de duas visitas.
+    """
+    if count < 2:
+        return 0
+    return total_gap_days / (count - 1)
+
+
+def recommend(count, total_gap_days, last_second, now):
+    """
+    (data sugerida 'YYYY-MM-DD', frequência em dias inteiros) para um pet com
+    duas ou mais visitas. A data soma a frequência média, com a parte
+    fracionária, ao último horário (segundos desde a época) ou a now
+    (datetime), o que for maior; a frequência emitida é a média truncada.
+    """
+    avg_freq_days = average_frequency(count, total_gap_days)
+    last_appointment = date_codec.to_datetime(last_second)
+    base_date = last_appointment if last_appointment > now else now
+    suggested_date = base_date + timedelta(days=avg_freq_days)
+    return suggested_date.strftime('%Y-%m-%d'), int(avg_freq_days)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Codificação das datas dos jobs como inteiros desde 1970-01-01.
+
+Os mappers convertem a data do Sqoop ('YYYY-MM-DD HH:MM:SS[.f]') uma única vez
+com um parser de layout fixo; os reducers recebem apenas inteiros e fazem
+aritmética sem datetime.strptime.
+
+Os agendamentos são codificados em segundos (to_epoch_second): os intervalos
+entre visitas são períodos de 24h completos (gap_days), como o timedelta.days
+das datas com horário que os reducers calculavam, e não dias de calendário.
+Datas sem horário (nascimento, no job de vacinas) são codificadas em dias
+(to_epoch_day).
+"""
+
+from datetime import date, datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+SECONDS_PER_DAY = 24 * 3600
+
+# Formatos de agendamento aceitos pelos reducers de booking quando o horário não
+# segue o layout fixo do Sqoop; a fração de segundo é descartada
+TIMESTAMP_FORMATS = (
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M:%S.%f',
+)
+
+# Formatos aceitos quando a data não segue o layout fixo do Sqoop
+FALLBACK_FORMATS = (
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d',
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y',
+)
+
+
+def to_epoch_day(value):
+    """
+    Converte 'YYYY-MM-DD[ HH:MM:SS[.f]]' em dias desde a época.
+    Retorna None se a data for inválida.
+    """
+    if len(value) >= 10 and value[4] == '-' and value[7] == '-':
+        try:
+            return date(int(value[0:4]), int(value[5:7]), int(value[8:10])).toordinal() - EPOCH_ORDINAL
+        except ValueError:
+            pass
+    return _parse_fallback(value)
+
+
+def _parse_fallback(value):
+    value = value.strip()
+    for fmt in FALLBACK_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).toordinal() - EPOCH_ORDINAL
+        except ValueError:
+            continue
+    return None
+
+
+def decode_epoch_day(value):
+    """
+    Lê o campo de data recebido pelo reducer: inteiro emitido pelo mapper ou,
+    para entradas antigas, a data em texto. Retorna None se inválida.
+    """
+    try:
+        return int(value)
+    except ValueError:
+        return to_epoch_day(value)
+
+
+def from_epoch_day(day):
+    """Dias desde a época -> 'YYYY-MM-DD'."""
+    return date.fromordinal(day + EPOCH_ORDINAL).isoformat()
+
+
+def today_epoch_day():
+    return date.today().toordinal() - EPOCH_ORDINAL
+
+
+def _day_of(text):
+    """'YYYY-MM-DD' -> dias desde a época, ou None."""
+    if text[4] != '-' or text[7] != '-' or not (text[0:4] + text[5:7] + text[8:10]).isdigit():
+        return None
+    try:
+        return date(int(text[0:4]), int(text[5:7]), int(text[8:10])).toordinal() - EPOCH_ORDINAL
+    except ValueError:
+        return None
+
+
+def _second_of_day(text):
+    """'HH:MM:SS' -> segundos desde a meia-noite, ou None."""
+    if text[2] != ':' or text[5] != ':' or not (text[0:2] + text[3:5] + text[6:8]).isdigit():
+        return None
+    hour, minute, second = int(text[0:2]), int(text[3:5]), int(text[6:8])
+    if hour > 23 or minute > 59 or second > 59:
+        return None
+    return hour * 3600 + minute * 60 + second
+
+
+# Datas e horários já convertidos pelo layout fixo: os agendamentos se repetem
+# nos mesmos dias e horários, e cada parte tem poucos valores distintos
+_days = {}
+_seconds_of_day = {}
+
+
+def to_epoch_second(value):
+    """
+    Converte 'YYYY-MM-DD HH:MM:SS[.f]' em segundos desde a época (sem a fração).
+    Retorna None se o horário for inválido ou faltar.
+    """
+    if len(value) >= 19 and value[10] == ' ' and (len(value) == 19 or value[19] == '.'):
+        day_text = value[0:10]
+        day = _days.get(day_text, -1)
+        if day == -1:
+            day = _days[day_text] = _day_of(day_text)
+        time_text = value[11:19]
+        second = _seconds_of_day.get(time_text, -1)
+        if second == -1:
+            second = _seconds_of_day[time_text] = _second_of_day(time_text)
+        if day is not None and second is not None:
+            return day * SECONDS_PER_DAY + second
+    value = value.strip()
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return (datetime.strptime(value, fmt) - EPOCH) // timedelta(seconds=1)
+        except ValueError:
+            continue
+    return None
+
+
+def decode_epoch_second(value):
+    """
+    Lê o horário recebido pelo reducer: inteiro emitido pelo mapper ou, para
+    entradas antigas, o horário em texto. Retorna None se inválido.
+    """
+    try:
+        return int(value)
+    except ValueError:
+        return to_epoch_second(value)
+
+
+def to_datetime(epoch_second):
+    """Segundos desde a época -> datetime sem fuso, como o datetime.strptime do horário."""
+    return EPOCH + timedelta(seconds=epoch_second)
+
+
+def gap_days(earlier, later):
+    """Dias completos entre dois horários (em segundos), como timedelta.days: 23h contam 0."""
+    return (later - earlier) // SECONDS_PER_DAY
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Histograma de intervalos (em dias inteiros) entre agendamentos.
+
+Guarda apenas a contagem de cada intervalo em um array indexado pelo número
+de dias, de modo que média, desvio padrão e o filtro de outliers (1.96σ) de um
+perfil custam O(intervalos distintos) de memória, qualquer que seja o número
+de agendamentos. O histograma já é um resumo mesclável e exato, então os
+quantis (p50/p90/p99) saem dele sem sketch aproximado.
+"""
+
+import math
+from array import array
+
+# Intervalo de confiança de 95% usado para descartar outliers
+OUTLIER_Z = 1.96
+
+
+class GapHistogram:
+
+    def __init__(self):
+        self.counts = array('q')
+        self.count = 0
+        self.total = 0
+        self.total_squares = 0
+
+    def add(self, gap, times=1):
+        if gap < 0:
+            raise ValueError(f"Gap must be non-negative: {gap}")
+        if gap >= len(self.counts):
+            self.counts.extend([0] * (gap + 1 - len(self.counts)))
+        self.counts[gap] += times
+        self.count += times
+        self.total += gap * times
+        self.total_squares += gap * gap * times
+
+    def merge(self, other):
+        for gap, times in other.items():
+            self.add(gap, times)
+
+    def items(self):
+        """Pares (intervalo, contagem) com contagem diferente de zero."""
+        return ((gap, times) for gap, times in enumerate(self.counts) if times)
+
+    def to_text(self):
+        """'intervalo:contagem' separados por espaço (um único campo, sem vírgulas nem TABs)."""
+        return ' '.join(f"{gap}:{times}" for gap, times in self.items())
+
+    @classmethod
+    def from_text(cls, text):
+        histogram = cls()
+        for item in text.split():
+            gap, sep, times = item.partition(':')
+            if not sep:
+                raise ValueError(f"Invalid histogram item: {item!r}")
+            histogram.add(int(gap), int(times))
+        return histogram
+
+    def mean(self):
+        return self.total / float(self.count)
+
+    def std_dev(self):
+        # Variância populacional calculada em inteiros: (n·Σx² − (Σx)²) / n²
+        n = self.count
+        return math.sqrt((n * self.total_squares - self.total * self.total) / float(n * n))
+
+    def quantiles(self, fractions):
+        """
+        Intervalos cujo rank acumulado atinge cada fração (0 a 1) do total;
+        lista de None se estiver vazio.
+        """
+        if not self.count:
+            return [None] * len(fractions)
+        results = []
+        for fraction in fractions:
+            target = fraction * self.count
+            cumulative = 0
+            for gap, times in self.items():
+                cumulative += times
+                if cumulative >= target:
+                    break
+            results.append(gap)
+        return results
+
+    def frequency_days(self):
+        """
+        Média dos intervalos após remover os outliers fora de média ± 1.96σ;
+        usa a média original se todos forem outliers. None se estiver vazio.
+        """
+        if not self.count:
+            return None
+
+        mean = self.mean()
+        std_dev = self.std_dev()
+        lower_bound = mean - OUTLIER_Z * std_dev
+        upper_bound = mean + OUTLIER_Z * std_dev
+
+        first = max(0, int(math.ceil(lower_bound)))
+        last = min(len(self.counts) - 1, int(math.floor(upper_bound)))
+        filtered_count = 0
+        filtered_total = 0
+        for gap in range(first, last + 1):
+            times = self.counts[gap]
+            filtered_count += times
+            filtered_total += gap * times
+
+        if not filtered_count:
+            return mean
+        return filtered_total / float(filtered_count)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Contadores, tempos por fase e log amostrado para mappers e reducers.
+
+Os contadores são acumulados em memória e enviados ao Hadoop pelo protocolo
+do streaming ('reporter:counter:<grupo>,<contador>,<incremento>' no stderr),
+aparecendo no histórico do job. O log por registro só é escrito quando
+PETSHOP_LOG_SAMPLE_RATE (0 a 1) é maior que zero, e apenas para a fração
+amostrada dos registros. Com PETSHOP_PROFILE, a task também é medida com
+cProfile/tracemalloc (task_profiler).
+"""
+
+import logging
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+import task_profiler
+
+
+def parse_sample_rate(value):
+    """
+    Taxa de amostragem do log limitada a [0, 1]; valor inválido desliga o log
+    (com um aviso no stderr) em vez de derrubar a task antes de ler a entrada.
+    """
+    try:
+        rate = float(value or 0)
+    except ValueError:
+        sys.stderr.write(f"WARNING: Invalid PETSHOP_LOG_SAMPLE_RATE {value!r}, record logging disabled\n")
+        return 0.0
+    if math.isnan(rate):
+        return 0.0
+    return min(max(rate, 0.0), 1.0)
+
+
+SAMPLE_RATE = parse_sample_rate(os.environ.get('PETSHOP_LOG_SAMPLE_RATE', '0'))
+
+# Intervalo mínimo entre envios de contadores (também sinaliza progresso da task)
+FLUSH_INTERVAL_SECONDS = 30
+
+# Contadores padronizados
+RECORDS_IN = 'records_in'
+RECORDS_OUT = 'records_out'
+MALFORMED_ROWS = 'malformed_rows'
+SKIPPED_PETS = 'skipped_pets'
+KEYS_PROCESSED = 'keys_processed'
+
+clock = time.perf_counter
+
+
+class JobMetrics:
+
+    def __init__(self, group, stream=None):
+        self.group = group
+        self.stream = stream or sys.stderr
+        self.counters = defaultdict(int)
+        self.timings = defaultdict(float)
+        self.reported = defaultdict(int)
+        self.last_flush = clock()
+        self.logger = None
+        self.profiler = task_profiler.start(group)
+
+    def incr(self, name, amount=1):
+        self.counters[name] += amount
+
+    def lap(self, phase, started):
+        """Soma o tempo desde 'started' na fase e devolve o instante atual."""
+        now = clock()
+        self.timings[phase] += now - started
+        return now
+
+    def sampled(self):
+        return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+    def log_sample(self, message, *args):
+        """Log de registro, formatado apenas se o registro for amostrado."""
+        if self.logger is not None and self.sampled():
+            self.logger.debug(message, *args)
+
+    def setup_sampled_logger(self, log_file, name=None):
+        """
+        Configura o arquivo de log amostrado; sem amostragem nenhum handler é
+        criado e log_sample não custa nada além de uma comparação.
+        """
+        if SAMPLE_RATE <= 0:
+            return None
+        try:
+            log_dir = os.path.dirname(log_file)
+            if log_dir:
+                os.makedirs(log_dir, exist_ok=True)
+            handler = logging.FileHandler(log_file)
+        except OSError as e:
+            self.stream.write(f"ERROR: Falha ao criar o arquivo de log ({log_file}): {e}\n")
+            handler = logging.StreamHandler(self.stream)
+        handler.setFormatter(logging.Formatter(
+            '%(asctime)s - ' + self.group + ' - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'))
+        self.logger = logging.getLogger(name or self.group)
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.addHandler(handler)
+        return self.logger
+
+    def maybe_flush(self):
+        if clock() - self.last_flush >= FLUSH_INTERVAL_SECONDS:
+            self.flush()
+
+    def flush(self):
+        """Envia ao Hadoop o incremento de cada contador desde o último envio."""
+        values = dict(self.counters)
+        for phase, seconds in self.timings.items():
+            values[f"{phase}_ms"] = int(seconds * 1000)
+        for name, value in values.items():
+            delta = value - self.reported[name]
+            if delta:
+                self.stream.write(f"reporter:counter:{self.group},{name},{delta}\n")
+                self.reported[name] = value
+        self.stream.flush()
+        if self.profiler is not None:
+            self.profiler.checkpoint()
+        self.last_flush = clock()
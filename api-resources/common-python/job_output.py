@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Leitura da saída dos jobs ('chave\tvalor' por linha) como linhas das tabelas.
+
+Compartilhado pela carga no PostgreSQL (bulk_loader.py) e pelos snapshots de
+recomendações (recommendation_snapshot.py): os mesmos parsers validam e
+convertem cada linha do reducer nas colunas da tabela de destino, e a saída é
+lida de arquivos locais, do stdin ou de um comando (ex: 'hdfs dfs -cat').
+"""
+
+import csv
+import shlex
+import subprocess
+import sys
+from datetime import date
+
+
+class ReadError(Exception):
+    pass
+
+
+def parse_int(value):
+    return str(int(value))
+
+
+def parse_numeric(value):
+    # float() valida o número; o texto original é mantido para o NUMERIC
+    float(value)
+    return value.strip()
+
+
+def parse_date(value):
+    return date.fromisoformat(value.strip()).isoformat()
+
+
+def parse_bool(value):
+    normalized = value.strip().lower()
+    if normalized in ('true', 't', '1'):
+        return 't'
+    if normalized in ('false', 'f', '0'):
+        return 'f'
+    raise ValueError(f"Invalid boolean: {value}")
+
+
+def split_profile(pet_profile):
+    fields = pet_profile.split(';')
+    if len(fields) != 3:
+        raise ValueError(f"Invalid pet profile: {pet_profile}")
+    return fields
+
+
+def parse_booking_recommendation(key, value):
+    # pet_id \t suggested_date,average_frequency_days
+    suggested_date, avg_freq_days = value.split(',')
+    return [parse_int(key), parse_date(suggested_date), parse_int(avg_freq_days)]
+
+
+def parse_booking_reference(key, value):
+    # species;animal_type;fur_type \t frequency_days,p50_gap_days,p90_gap_days,p99_gap_days
+    fields = value.split(',')
+    if len(fields) != 4:
+        raise ValueError(f"expected 4 values, got {len(fields)}")
+    return split_profile(key) + [parse_int(field) for field in fields]
+
+
+def parse_vaccine_recommendation(key, value):
+    # pet_id \t vaccine_name,description,mandatory,suggested_date,vaccine_reference_id
+    # O valor é uma linha CSV: nome e descrição com vírgulas vêm entre aspas
+    fields = next(csv.reader([value]), [])
+    if len(fields) != 5:
+        raise ValueError(f"expected 5 values, got {len(fields)}")
+    vaccine_name, description, mandatory, suggested_date, vaccine_reference_id = fields
+    return [parse_int(key), vaccine_name, description, parse_bool(mandatory),
+            parse_date(suggested_date), parse_int(vaccine_reference_id)]
+
+
+# Níveis do rollup do LTV -> quantidade de campos do perfil na chave
+LTV_ROLLUP_LEVELS = {'profile': 3, 'animal_type': 2, 'species': 1, 'total': 0}
+
+
+def split_rollup_cell(key):
+    """'nível:species;animal_type;fur_type' -> (nível, campos), com None nos níveis agregados."""
+    level, separator, path = key.partition(':')
+    depth = LTV_ROLLUP_LEVELS.get(level)
+    if not separator or depth is None:
+        raise ValueError(f"Invalid rollup cell: {key}")
+    fields = path.split(';') if depth else []
+    if len(fields) != depth:
+        raise ValueError(f"Invalid rollup cell: {key}")
+    return level, fields + [None] * (3 - depth)
+
+
+def parse_ltv_rollup(key, value):
+    # nível:species;animal_type;fur_type \t total_value,purchase_count,average_value,p50_value,p90_value,p99_value
+    level, profile = split_rollup_cell(key)
+    total, count, *values = value.split(',')
+    if len(values) != 4:
+        raise ValueError(f"expected 6 values, got {len(values) + 2}")
+    return [level] + profile + [parse_numeric(total), parse_int(count)] + [parse_numeric(field) for field in values]
+
+
+def parse_ltv_by_pet_profile(key, value):
+    # Mesma saída do rollup: só as células do perfil completo vão para esta tabela
+    row = parse_ltv_rollup(key, value)
+    if row[0] != 'profile':
+        return None
+    return row[1:5]
+
+
+# Tabela -> (colunas na ordem do COPY, parser de 'chave\tvalor')
+TABLES = {
+    'booking_recommendation': (
+        ('pet_id', 'suggested_date', 'average_frequency_days'),
+        parse_booking_recommendation),
+    'booking_reference': (
+        ('species', 'animal_type', 'fur_type', 'frequency_days', 'p50_gap_days', 'p90_gap_days', 'p99_gap_days'),
+        parse_booking_reference),
+    'vaccine_recommendation': (
+        ('pet_id', 'vaccine_name', 'description', 'mandatory', 'suggested_date', 'vaccine_reference_id'),
+        parse_vaccine_recommendation),
+    'ltv_by_pet_profile': (
+        ('species', 'animal_type', 'fur_type', 'total_value'),
+        parse_ltv_by_pet_profile),
+    'ltv_rollup': (
+        ('level', 'species', 'animal_type', 'fur_type', 'total_value', 'purchase_count', 'average_value',
+         'p50_value', 'p90_value', 'p99_value'),
+        parse_ltv_rollup),
+}
+
+
+def named_output_parser(parser, name):
+    """
+    Parser das linhas 'nome:chave\tvalor' de um job com várias saídas: as da
+    saída pedida perdem o prefixo, as das outras são descartadas (None).
+    """
+    if not name:
+        return parser
+    prefix = name + ':'
+
+    def parse(key, value):
+        if not key.startswith(prefix):
+            return None
+        return parser(key[len(prefix):], value)
+
+    return parse
+
+
+def parse_rows(lines, parser, stats):
+    """
+    Linhas 'chave\tvalor' do reducer -> linhas da tabela, ignorando as inválidas
+    (contadas em stats['rejected']) e as que o parser descarta (None) por
+    pertencerem a outra tabela.
+    """
+    for line in lines:
+        line = line.rstrip('\n')
+        if not line:
+            continue
+        try:
+            key, value = line.split('\t', 1)
+            row = parser(key, value)
+        except ValueError as e:
+            stats['rejected'] += 1
+            sys.stderr.write(f"Skipping invalid row ({e}): {line}\n")
+            continue
+        if row is None:
+            continue
+        stats['rows'] += 1
+        yield row
+
+
+def read_lines(path, reader=None):
+    """Linhas de um arquivo local ou da saída de 'reader path' (ex: hdfs dfs -cat)."""
+    if not reader:
+        with open(path, encoding='utf-8') as f:
+            yield from f
+        return
+    process = subprocess.Popen(shlex.split(reader) + [path], stdout=subprocess.PIPE, encoding='utf-8')
+    yield from process.stdout
+    process.stdout.close()
+    if process.wait() != 0:
+        raise ReadError(f"'{reader} {path}' failed with exit code {process.returncode}")
+
+
+def read_inputs(paths, reader=None):
+    if not paths:
+        yield from sys.stdin
+        return
+    for path in paths:
+        yield from read_lines(path, reader)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sketch KLL de quantis (Karnin, Lang e Liberty), mesclável entre mappers,
+combiners e reducers.
+
+Os valores ficam em níveis (compactadores): um item no nível h representa
+2^h valores. Quando um nível passa da sua capacidade, ele é ordenado e metade
+dos itens (os de posição par ou ímpar, alternadamente) sobe para o nível
+seguinte. A memória fica em O(k) itens por sketch, qualquer que seja o número
+de valores, e o erro de rank é de ~1.7% com k=200.
+
+A alternância das posições promovidas é determinística (e não aleatória) para
+que a mesma entrada, na mesma ordem, gere sempre a mesma saída do job.
+
+Serialização em texto (um único campo, sem vírgulas nem TABs):
+    'k|itens do nível 0|itens do nível 1|...', itens separados por espaço
+"""
+
+import math
+
+DEFAULT_K = 200
+
+# Capacidade mínima de um nível e fator de decaimento da capacidade dos níveis inferiores
+MIN_CAPACITY = 8
+CAPACITY_DECAY = 2.0 / 3.0
+
+
+class KllSketch:
+
+    def __init__(self, k=DEFAULT_K):
+        if k < MIN_CAPACITY:
+            raise ValueError(f"k must be at least {MIN_CAPACITY}: {k}")
+        self.k = k
+        self.levels = [[]]
+        self.count = 0
+        self._capacities = None
+        self._offset = 0
+
+    def capacity(self, level):
+        """Capacidade do nível: k no topo, decaindo 2/3 a cada nível abaixo."""
+        if self._capacities is None or len(self._capacities) != len(self.levels):
+            height = len(self.levels)
+            self._capacities = [
+                max(MIN_CAPACITY, int(math.ceil(self.k * CAPACITY_DECAY ** (height - h - 1))))
+                for h in range(height)]
+        return self._capacities[level]
+
+    def add(self, value):
+        level = self.levels[0]
+        level.append(value)
+        self.count += 1
+        if len(level) >= self.capacity(0):
+            self._compress()
+
+    def merge(self, other):
+        """Acrescenta os valores de outro sketch (que não é alterado)."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in zip(self.levels, other.levels):
+            level.extend(items)
+        self.count += other.count
+        self._compress()
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) >= self.capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append([])
+                items.sort()
+                # Com quantidade ímpar, o último item fica no nível
+                leftover = [items.pop()] if len(items) % 2 else []
+                self.levels[h + 1].extend(items[self._offset::2])
+                self.levels[h] = leftover
+                self._offset ^= 1
+            h += 1
+
+    def weighted_items(self):
+        """Pares (valor, peso) ordenados por valor."""
+        items = []
+        for h, level in enumerate(self.levels):
+            weight = 1 << h
+            items.extend((value, weight) for value in level)
+        items.sort()
+        return items
+
+    def quantiles(self, fractions):
+        """
+        Valores cujo rank acumulado atinge cada fração (0 a 1) do total;
+        lista de None se o sketch estiver vazio.
+        """
+        items = self.weighted_items()
+        if not items:
+            return [None] * len(fractions)
+        total = sum(weight for _, weight in items)
+        results = []
+        for fraction in fractions:
+            target = fraction * total
+            cumulative = 0
+            for value, weight in items:
+                cumulative += weight
+                if cumulative >= target:
+                    break
+            results.append(value)
+        return results
+
+    def quantile(self, fraction):
+        return self.quantiles([fraction])[0]
+
+    def to_text(self):
+        return '|'.join([str(self.k)] + [' '.join(map(repr, level)) for level in self.levels])
+
+    @classmethod
+    def from_text(cls, text):
+        fields = text.split('|')
+        if len(fields) < 2:
+            raise ValueError(f"Invalid sketch: {text!r}")
+        sketch = cls(int(fields[0]))
+        sketch.levels = [[float(value) for value in level.split()] for level in fields[1:]]
+        sketch.count = sum(len(level) << h for h, level in enumerate(sketch.levels))
+        return sketch
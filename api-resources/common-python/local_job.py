@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Partes comuns dos executores locais dos jobs: o local_runner.py (streaming)
+e o booking-recommendation-python/vectorized.py (NumPy) leem a mesma entrada
+e informam os contadores no mesmo formato do histórico do Hadoop.
+"""
+
+import os
+import sys
+
+
+def list_input_files(paths):
+    """Arquivos de entrada dos caminhos (arquivos ou diretórios, como os part-m-* do import)."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                # Ignora marcadores como _SUCCESS e arquivos ocultos
+                if name.startswith(('_', '.')):
+                    continue
+                full_path = os.path.join(path, name)
+                if os.path.isfile(full_path):
+                    files.append(full_path)
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            raise FileNotFoundError(f"Input path does not exist: {path}")
+    return files
+
+
+def report_counters(task_counters):
+    """Soma os contadores de todas as tasks e imprime como no histórico do Hadoop."""
+    totals = {}
+    for counters in task_counters:
+        for key, amount in counters.items():
+            totals[key] = totals.get(key, 0) + amount
+    if not totals:
+        return
+    sys.stderr.write("Counters:\n")
+    for group in sorted({group for group, _ in totals}):
+        sys.stderr.write(f"\t{group}\n")
+        for (counter_group, name), amount in sorted(totals.items()):
+            if counter_group == group:
+                sys.stderr.write(f"\t\t{name}={amount}\n")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Plano de sal para chaves quentes.
+
+Um perfil dominante leva todos os seus registros para uma única chamada de
+reducer, e essa chamada define a duração do job, quantos reducers houver. Com
+o plano, a chave vira 'chave#sal' e os registros de uma chave quente se
+dividem em vários sais (e portanto vários reducers); um segundo job mescla os
+resultados parciais de cada chave.
+
+O número de sais vem de uma amostra da entrada: uma chave com fração f da
+amostra recebe ceil(f * reducers * SALTS_PER_SHARE) sais (no máximo
+--max-salts), ou seja, nenhum sal fica muito maior que a parte de um reducer.
+Chaves com um só sal ficam fora do plano.
+
+Arquivo do plano: CSV 'chave,sais' (enviado às tasks com -file).
+
+Uso:
+    head -n 100000 part-m-* | python3 salt_plan.py --field 1 --reducers 4 --output salts.csv
+"""
+
+import argparse
+import csv
+import math
+import os
+import sys
+from collections import Counter
+
+# Separador entre a chave e o sal ('Cão;Poodle;Encaracolado#3')
+SALT_SEPARATOR = '#'
+
+# Sais por parte de reducer ocupada pela chave: mais de um para equilibrar melhor os reducers
+SALTS_PER_SHARE = 2
+
+DEFAULT_MAX_SALTS = 64
+
+# Amostras menores que isso não dizem nada sobre a distribuição: plano vazio
+MIN_SAMPLE_SIZE = 1000
+
+
+def salted_key(key, salt):
+    return f"{key}{SALT_SEPARATOR}{salt}"
+
+
+def unsalted_key(salted):
+    """Chave original de 'chave#sal' (o sal é sempre o último campo)."""
+    return salted.rpartition(SALT_SEPARATOR)[0]
+
+
+def plan(counts, reducers, max_salts=DEFAULT_MAX_SALTS, min_sample_size=MIN_SAMPLE_SIZE):
+    """{chave: sais} para as chaves da amostra (Counter) que precisam de mais de um sal."""
+    total = sum(counts.values())
+    if reducers < 2 or total < min_sample_size:
+        return {}
+    salts = {}
+    for key, count in counts.items():
+        key_salts = min(max_salts, int(math.ceil(count * reducers * SALTS_PER_SHARE / float(total))))
+        if key_salts > 1:
+            salts[key] = key_salts
+    return salts
+
+
+def load(path):
+    """Plano gravado por write(); vazio se o arquivo não existir (job sem sal)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline='', encoding='utf-8') as f:
+        return {key: int(salts) for key, salts in csv.reader(f)}
+
+
+def write(salts, path):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        for key in sorted(salts):
+            writer.writerow((key, salts[key]))
+
+
+def count_keys(lines, field):
+    counts = Counter()
+    for line in lines:
+        fields = line.rstrip('\n').split(',')
+        if len(fields) > field:
+            counts[fields[field]] += 1
+    return counts
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Calcula o plano de sal das chaves quentes a partir de uma amostra (stdin).')
+    parser.add_argument('--field', type=int, required=True, help='Posição (a partir de 0) da chave nas linhas CSV da amostra')
+    parser.add_argument('--reducers', type=int, required=True, help='Número de reducers do job')
+    parser.add_argument('--max-salts', type=int, default=DEFAULT_MAX_SALTS, help='Máximo de sais por chave')
+    parser.add_argument('--output', required=True, help='Arquivo CSV do plano')
+    options = parser.parse_args(argv)
+    if options.reducers < 1:
+        parser.error('--reducers must be >= 1')
+    if options.max_salts < 1:
+        parser.error('--max-salts must be >= 1')
+    return options
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    counts = count_keys(sys.stdin, options.field)
+    salts = plan(counts, options.reducers, options.max_salts)
+    write(salts, options.output)
+    sys.stderr.write(f"Salt plan: {len(salts)} hot key(s) out of {len(counts)} in a sample of "
+                     f"{sum(counts.values())} line(s)\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Formato do fluxo intermediário dos jobs (mapper -> combiner -> reducer).
+
+    text        'chave\\tv1,v2,...\\n', o padrão do streaming; os valores chegam
+                ao reducer como texto e são convertidos por ele.
+    typedbytes  formato binário do Hadoop Streaming (-D stream.map.output=
+                typedbytes, stream.reduce.input/output=typedbytes): chave e
+                valores tipados (int, float, str), sem reparse e sem
+                delimitadores, então vírgulas e TABs nos valores não quebram
+                os campos. Cada campo leva 5 bytes de cabeçalho: para ids e
+                dias curtos o texto ainda é menor.
+
+O modo vem de PETSHOP_STREAM_FORMAT, repassado às tasks com -cmdenv pelo
+pipeline_lib.sh. A entrada dos mappers continua sendo o texto do Sqoop, e a
+saída final dos reducers continua sendo 'chave\\tvalor': no modo typedbytes
+ela é escrita como strings tipadas, que o TextOutputFormat grava com
+toString(), gerando os mesmos part-* de texto para a carga.
+
+Também é o caminho por registro comum a todos os jobs: a entrada é lida do
+stdin binário em blocos (um decode e um split por bloco, RECORDS_IN somado por
+bloco), as chaves consecutivas iguais são agrupadas por um gerador e a saída
+é acumulada e escrita em lotes de OUTPUT_BATCH registros.
+
+Uso nos scripts:
+    stream = stream_format.open_stream()
+    for line in stream_format.read_lines(metrics=metrics): ...   # entrada do mapper (texto do Sqoop)
+    stream.emit(pet_id, (day, frequency))                         # mapper / combiner
+    for key, values in stream.records(metrics): ...               # combiner / reducer, registro a registro
+    for key, records in stream.groups(metrics): ...               # combiner / reducer, por chave
+    stream.output(pet_id, 'AAAA-MM-DD,30')                        # saída final do reducer
+    stream.emit_key((profile, pet_id, day))                       # chave composta (só texto)
+    for fields in stream.key_records(metrics): ...                # reducer com ordenação secundária
+    stream.flush()                                                # no fim (também feito no exit)
+"""
+
+import atexit
+import os
+import struct
+import sys
+from itertools import groupby
+from operator import itemgetter
+
+from job_metrics import RECORDS_IN
+
+TEXT = 'text'
+TYPEDBYTES = 'typedbytes'
+FORMATS = (TEXT, TYPEDBYTES)
+
+FORMAT = os.environ.get('PETSHOP_STREAM_FORMAT', TEXT)
+
+# Códigos de tipo (org.apache.hadoop.typedbytes.Type)
+BYTES = 0
+BYTE = 1
+BOOL = 2
+INT = 3
+LONG = 4
+FLOAT = 5
+DOUBLE = 6
+STRING = 7
+VECTOR = 8
+LIST = 9
+MAP = 10
+MARKER = 255
+
+_INT = struct.Struct('>i')
+_LONG = struct.Struct('>q')
+_FLOAT = struct.Struct('>f')
+_DOUBLE = struct.Struct('>d')
+_BYTE = struct.Struct('>b')
+
+# Tamanho fixo do conteúdo dos tipos escalares
+_FIXED_SIZES = {BYTE: 1, BOOL: 1, INT: 4, FLOAT: 4, LONG: 8, DOUBLE: 8}
+
+# Bloco lido de cada vez da entrada
+CHUNK_SIZE = 256 * 1024
+
+# Registros acumulados antes de cada escrita no stdout
+OUTPUT_BATCH = 4096
+
+_INT_CODE = bytes((INT,))
+_LONG_CODE = bytes((LONG,))
+_DOUBLE_CODE = bytes((DOUBLE,))
+_STRING_CODE = bytes((STRING,))
+_BYTES_CODE = bytes((BYTES,))
+_VECTOR_CODE = bytes((VECTOR,))
+
+
+def _encode_int(value):
+    if -0x80000000 <= value <= 0x7FFFFFFF:
+        return _INT_CODE + _INT.pack(value)
+    return _LONG_CODE + _LONG.pack(value)
+
+
+def _encode_str(value):
+    data = value.encode('utf-8')
+    return _STRING_CODE + _INT.pack(len(data)) + data
+
+
+def _encode_bytes(value):
+    return _BYTES_CODE + _INT.pack(len(value)) + bytes(value)
+
+
+def _encode_sequence(value):
+    return b''.join([_VECTOR_CODE, _INT.pack(len(value))] + [encode(item) for item in value])
+
+
+_ENCODERS = {
+    bool: lambda value: bytes((BOOL, 1 if value else 0)),
+    int: _encode_int,
+    float: lambda value: _DOUBLE_CODE + _DOUBLE.pack(value),
+    str: _encode_str,
+    bytes: _encode_bytes,
+    bytearray: _encode_bytes,
+    tuple: _encode_sequence,
+    list: _encode_sequence,
+}
+
+
+def encode(value):
+    """Serializa um valor Python (bool, int, float, str, bytes, tupla/lista) em typedbytes."""
+    encoder = _ENCODERS.get(type(value))
+    if encoder is None:
+        # Subclasses (ex: namedtuple) usam o encoder do tipo base
+        for base, base_encoder in _ENCODERS.items():
+            if isinstance(value, base):
+                return base_encoder(value)
+        raise TypeError(f"Cannot encode {type(value).__name__} as typedbytes")
+    return encoder(value)
+
+
+class _Incomplete(Exception):
+    """O objeto continua no próximo bloco lido do fluxo."""
+
+
+# Decoders por código de tipo: recebem (buf, pos do código) e devolvem
+# (valor, posição seguinte). Bytes faltando no fim do buffer levantam
+# IndexError/struct.error, tratados por _decode.
+
+def _decode_int(buf, pos):
+    return _INT.unpack_from(buf, pos + 1)[0], pos + 5
+
+
+def _decode_long(buf, pos):
+    return _LONG.unpack_from(buf, pos + 1)[0], pos + 9
+
+
+def _decode_float(buf, pos):
+    return _FLOAT.unpack_from(buf, pos + 1)[0], pos + 5
+
+
+def _decode_double(buf, pos):
+    return _DOUBLE.unpack_from(buf, pos + 1)[0], pos + 9
+
+
+def _decode_bool(buf, pos):
+    return buf[pos + 1] != 0, pos + 2
+
+
+def _decode_byte(buf, pos):
+    return _BYTE.unpack_from(buf, pos + 1)[0], pos + 2
+
+
+def _decode_bytes(buf, pos):
+    end = pos + 5 + _INT.unpack_from(buf, pos + 1)[0]
+    if end > len(buf):
+        raise IndexError(end)
+    return buf[pos + 5:end], end
+
+
+def _decode_string(buf, pos):
+    end = pos + 5 + _INT.unpack_from(buf, pos + 1)[0]
+    if end > len(buf):
+        raise IndexError(end)
+    return buf[pos + 5:end].decode('utf-8'), end
+
+
+def _decode_vector(buf, pos):
+    count = _INT.unpack_from(buf, pos + 1)[0]
+    pos += 5
+    items = []
+    for _ in range(count):
+        item, pos = _DECODERS[buf[pos]](buf, pos)
+        items.append(item)
+    return items, pos
+
+
+def _decode_list(buf, pos):
+    pos += 1
+    items = []
+    while buf[pos] != MARKER:
+        item, pos = _DECODERS[buf[pos]](buf, pos)
+        items.append(item)
+    return items, pos + 1
+
+
+def _decode_map(buf, pos):
+    count = _INT.unpack_from(buf, pos + 1)[0]
+    pos += 5
+    items = {}
+    for _ in range(count):
+        key, pos = _DECODERS[buf[pos]](buf, pos)
+        items[key], pos = _DECODERS[buf[pos]](buf, pos)
+    return items, pos
+
+
+_DECODERS = {
+    BYTES: _decode_bytes,
+    BYTE: _decode_byte,
+    BOOL: _decode_bool,
+    INT: _decode_int,
+    LONG: _decode_long,
+    FLOAT: _decode_float,
+    DOUBLE: _decode_double,
+    STRING: _decode_string,
+    VECTOR: _decode_vector,
+    LIST: _decode_list,
+    MAP: _decode_map,
+}
+
+
+def _decode(buf, pos):
+    """Decodifica o objeto que começa em buf[pos]; devolve (valor, posição seguinte)."""
+    try:
+        return _DECODERS[buf[pos]](buf, pos)
+    except (IndexError, struct.error):
+        raise _Incomplete from None
+    except KeyError as e:
+        raise ValueError(f"Unknown typedbytes type code: {e.args[0]}") from None
+
+
+def _skip(buf, pos):
+    """Posição seguinte ao objeto que começa em buf[pos], sem decodificá-lo."""
+    try:
+        code = buf[pos]
+        size = _FIXED_SIZES.get(code)
+        if size is not None:
+            end = pos + 1 + size
+        elif code == STRING or code == BYTES:
+            end = pos + 5 + _INT.unpack_from(buf, pos + 1)[0]
+        elif code == VECTOR or code == MAP:
+            count = _INT.unpack_from(buf, pos + 1)[0] * (2 if code == MAP else 1)
+            end = pos + 5
+            for _ in range(count):
+                end = _skip(buf, end)
+        elif code == LIST:
+            end = pos + 1
+            while buf[end] != MARKER:
+                end = _skip(buf, end)
+            end += 1
+        else:
+            raise ValueError(f"Unknown typedbytes type code: {code}")
+    except (IndexError, struct.error):
+        raise _Incomplete from None
+    if end > len(buf):
+        raise _Incomplete
+    return end
+
+
+def _pair_blocks(stream, parse):
+    """
+    Lê o fluxo em blocos e aplica parse(buf, pos) -> (par, posição seguinte)
+    a cada par chave/valor completo; devolve a lista de pares de cada bloco e
+    o resto do bloco espera o próximo.
+    """
+    buf = b''
+    pos = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            if pos < len(buf):
+                raise EOFError('Truncated typedbytes stream')
+            return
+        buf = buf[pos:] + chunk
+        pos = 0
+        pairs = []
+        try:
+            while pos < len(buf):
+                pair, pos = parse(buf, pos)
+                pairs.append(pair)
+        except _Incomplete:
+            pass
+        yield pairs
+
+
+def _pairs(stream, parse):
+    for pairs in _pair_blocks(stream, parse):
+        yield from pairs
+
+
+def _parse_pair(buf, pos):
+    key, next_pos = _decode(buf, pos)
+    value, next_pos = _decode(buf, next_pos)
+    return (key, value), next_pos
+
+
+def _parse_raw_pair(buf, pos):
+    key_end = _skip(buf, pos)
+    end = _skip(buf, key_end)
+    return (buf[pos:key_end], buf[pos:end]), end
+
+
+def read_pairs(stream):
+    """Pares (chave, valor) decodificados de um fluxo binário."""
+    return _pairs(stream, _parse_pair)
+
+
+def read_raw_pairs(stream):
+    """Pares (chave serializada, chave + valor serializados), sem decodificar."""
+    return _pairs(stream, _parse_raw_pair)
+
+
+def read_lines(stream=None, metrics=None):
+    """
+    Linhas sem espaços nas pontas de um fluxo binário de texto UTF-8 (padrão:
+    sys.stdin.buffer), lido em blocos de CHUNK_SIZE. Com metrics, soma
+    RECORDS_IN uma vez por bloco, com a quantidade de linhas do bloco.
+    """
+    stream = stream or sys.stdin.buffer
+    rest = b''
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        data = rest + chunk
+        end = data.rfind(b'\n')
+        if end < 0:
+            rest = data
+            continue
+        rest = data[end + 1:]
+        # O corte é sempre em um '\n': nenhum caractere UTF-8 fica dividido
+        lines = data[:end].decode('utf-8').split('\n')
+        if metrics is not None:
+            metrics.incr(RECORDS_IN, len(lines))
+        for line in lines:
+            yield line.strip()
+    if rest:
+        # Última linha sem '\n' no fim
+        if metrics is not None:
+            metrics.incr(RECORDS_IN)
+        yield rest.decode('utf-8').strip()
+
+
+def decode(data):
+    """Decodifica um único objeto serializado."""
+    try:
+        value, end = _decode(data, 0)
+    except _Incomplete:
+        raise EOFError('Truncated typedbytes object') from None
+    if end != len(data):
+        raise ValueError('Trailing bytes after typedbytes object')
+    return value
+
+
+class _Stream:
+    """
+    Base dos fluxos: stdin/stdout binários, agrupamento por chave e saída em
+    lotes. As subclasses definem records(), _pending_bytes() e o formato de
+    emit()/output().
+    """
+
+    name = None
+
+    def __init__(self, stdin=None, stdout=None):
+        self.stdin = stdin or sys.stdin.buffer
+        self.stdout = stdout or sys.stdout.buffer
+        self.pending = []
+
+    def _write(self, item):
+        pending = self.pending
+        pending.append(item)
+        if len(pending) >= OUTPUT_BATCH:
+            self.stdout.write(self._pending_bytes())
+            pending.clear()
+
+    def flush(self):
+        if self.pending:
+            self.stdout.write(self._pending_bytes())
+            self.pending.clear()
+        self.stdout.flush()
+
+    def groups(self, metrics=None):
+        """
+        Pares (chave, iterador das listas de valores) de cada sequência de
+        registros com a mesma chave, na ordem do shuffle.
+        """
+        for key, records in groupby(self.records(metrics), itemgetter(0)):
+            yield key, map(itemgetter(1), records)
+
+
+class TextStream(_Stream):
+    """Fluxo 'chave\\tv1,v2,...' em texto."""
+
+    name = TEXT
+
+    def _pending_bytes(self):
+        return ''.join(self.pending).encode('utf-8')
+
+    def emit(self, key, values):
+        self._write(f"{key}\t{','.join(map(str, values))}\n")
+
+    def records(self, metrics=None):
+        """Pares (chave, lista de valores em texto); linhas vazias são ignoradas."""
+        for line in read_lines(self.stdin, metrics):
+            if not line:
+                continue
+            key, _, value = line.partition('\t')
+            yield key, value.split(',')
+
+    def output(self, key, value):
+        self._write(f"{key}\t{value}\n")
+
+    def emit_key(self, fields):
+        """
+        Registro só de chave composta, 'campo1\\tcampo2\\t...', para jobs com
+        ordenação secundária (stream.num.map.output.key.fields e
+        KeyFieldBasedComparator, que só existem em texto).
+        """
+        self._write('\t'.join(map(str, fields)) + '\n')
+
+    def key_records(self, metrics=None):
+        """Listas de campos (texto) dos registros emitidos com emit_key()."""
+        for line in read_lines(self.stdin, metrics):
+            if line:
+                yield line.split('\t')
+
+
+class TypedBytesStream(_Stream):
+    """Fluxo typedbytes: chave seguida de um vetor com os valores."""
+
+    name = TYPEDBYTES
+
+    def _pending_bytes(self):
+        return b''.join(self.pending)
+
+    def emit(self, key, values):
+        self._write(encode(key) + encode(tuple(values)))
+
+    def records(self, metrics=None):
+        """Pares (chave, lista de valores tipados)."""
+        for pairs in _pair_blocks(self.stdin, _parse_pair):
+            if metrics is not None:
+                metrics.incr(RECORDS_IN, len(pairs))
+            for key, values in pairs:
+                # Valores fora de um vetor (ex: emitidos por outra ferramenta) viram lista de um item
+                yield key, values if isinstance(values, list) else [values]
+
+    def output(self, key, value):
+        self._write(encode(str(key)) + encode(str(value)))
+
+
+def open_stream(stream_format=None, stdin=None, stdout=None):
+    """Fluxo do formato pedido (padrão: PETSHOP_STREAM_FORMAT); a saída pendente é escrita no exit."""
+    stream_format = stream_format or FORMAT
+    if stream_format == TYPEDBYTES:
+        stream = TypedBytesStream(stdin, stdout)
+    elif stream_format == TEXT:
+        stream = TextStream(stdin, stdout)
+    else:
+        raise ValueError(f"Unknown stream format: {stream_format} (expected one of {', '.join(FORMATS)})")
+    atexit.register(stream.flush)
+    return stream
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Profiling opcional (cProfile e tracemalloc) das tasks de streaming.
+
+Ligado por PETSHOP_PROFILE nas tasks (-cmdenv; o pipeline_lib.sh repassa
+PIPELINE_PROFILE): 'cpu', 'memory' ou 'cpu,memory'. Sem a variável nada é
+medido. O JobMetrics de cada mapper/reducer inicia o profiling ao ser criado
+(antes do loop principal) e, no exit, cada task grava em
+PETSHOP_PROFILE_DIR (padrão: /tmp/logs/profiles, junto dos logs amostrados):
+    <grupo>-<task>.cprofile      estatísticas do cProfile (formato pstats)
+    <grupo>-<task>.tracemalloc   maior snapshot do tracemalloc entre os envios
+                                 de contadores, com o pico de memória da task
+
+O snapshot é tirado a cada flush do JobMetrics (no máximo a cada
+FLUSH_INTERVAL_SECONDS, e no flush final, ainda dentro do loop) e só o de
+maior memória rastreada é guardado: as estruturas do reducer ainda estão vivas.
+
+Relatório agregado de todas as tasks (funções mais caras e maiores alocações,
+com os caminhos reduzidos ao nome do arquivo para somar tasks de diretórios
+diferentes):
+    python3 task_profiler.py report [--dir /tmp/logs/profiles] [--group BookingRecommendation] \\
+        [--top 25] [--sort cumulative]
+"""
+
+import argparse
+import atexit
+import cProfile
+import glob
+import os
+import pickle
+import pstats
+import socket
+import sys
+import time
+import tracemalloc
+
+PROFILE = os.environ.get('PETSHOP_PROFILE', '')
+PROFILE_DIR = os.environ.get('PETSHOP_PROFILE_DIR', '/tmp/logs/profiles')
+
+CPU = 'cpu'
+MEMORY = 'memory'
+MODES = (CPU, MEMORY)
+
+CPU_SUFFIX = '.cprofile'
+MEMORY_SUFFIX = '.tracemalloc'
+
+# Quadros guardados por alocação: o relatório agrupa por arquivo:linha
+TRACEMALLOC_FRAMES = 1
+
+DEFAULT_TOP = 25
+
+# Ordenações do pstats oferecidas no relatório de CPU
+SORT_KEYS = ('cumulative', 'tottime', 'calls')
+
+_active = None
+
+
+def parse_modes(value):
+    """Modos de PETSHOP_PROFILE; um valor inválido só desliga o profiling, sem derrubar a task."""
+    modes = {mode.strip() for mode in value.split(',') if mode.strip()}
+    invalid = modes - set(MODES)
+    if invalid:
+        sys.stderr.write(f"WARNING: Invalid PETSHOP_PROFILE mode(s) {', '.join(sorted(invalid))} "
+                         f"(expected {' and/or '.join(MODES)}), profiling disabled\n")
+        return set()
+    return modes
+
+
+def task_name():
+    """Id da tentativa da task no Hadoop (exportado pelo streaming); fora dele, host e pid."""
+    return (os.environ.get('mapreduce_task_attempt_id') or os.environ.get('mapred_task_id')
+            or f"{socket.gethostname()}-{os.getpid()}-{int(time.time())}")
+
+
+class TaskProfiler:
+
+    def __init__(self, group, modes, directory=PROFILE_DIR):
+        self.path = os.path.join(directory, f"{group}-{task_name()}")
+        self.directory = directory
+        self.profiler = None
+        self.tracing = MEMORY in modes
+        self.snapshot = None
+        self.snapshot_size = -1
+        if CPU in modes:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        if self.tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    def checkpoint(self):
+        """Guarda um snapshot das alocações se a memória rastreada for a maior até agora."""
+        if not self.tracing:
+            return
+        current, _ = tracemalloc.get_traced_memory()
+        if current > self.snapshot_size:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.snapshot_size = current
+
+    def stop(self):
+        """Encerra a medição e grava os arquivos da task (chamado no exit)."""
+        if self.profiler is not None:
+            self.profiler.disable()
+        # O tracemalloc para antes de gravar: as alocações dos próprios dumps não entram
+        if self.tracing:
+            self.checkpoint()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        os.makedirs(self.directory, exist_ok=True)
+        if self.profiler is not None:
+            self.profiler.dump_stats(self.path + CPU_SUFFIX)
+        if self.tracing:
+            with open(self.path + MEMORY_SUFFIX, 'wb') as f:
+                pickle.dump({'peak': peak, 'snapshot': self.snapshot}, f)
+
+
+def start(group):
+    """
+    Inicia o profiling da task se PETSHOP_PROFILE estiver definido; devolve o
+    TaskProfiler (um por processo) ou None.
+    """
+    global _active
+    if _active is None and PROFILE:
+        modes = parse_modes(PROFILE)
+        if modes:
+            _active = TaskProfiler(group, modes)
+            atexit.register(_active.stop)
+    return _active
+
+
+def report_cpu(paths, top, sort, out):
+    stats = pstats.Stats(*paths, stream=out)
+    out.write(f"CPU: {len(paths)} task(s), {stats.total_calls} calls, {stats.total_tt:.3f}s\n")
+    # Sem a lista de um arquivo por task no cabeçalho do print_stats
+    stats.files = []
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+
+
+def report_memory(paths, top, out):
+    ignored = [tracemalloc.Filter(False, tracemalloc.__file__),
+               tracemalloc.Filter(False, '*/' + os.path.basename(__file__)),
+               tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+               tracemalloc.Filter(False, '<unknown>')]
+    totals = {}
+    peaks = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            dump = pickle.load(f)
+        peaks.append(dump['peak'])
+        if dump['snapshot'] is None:
+            continue
+        for stat in dump['snapshot'].filter_traces(ignored).statistics('lineno'):
+            frame = stat.traceback[0]
+            location = (os.path.basename(frame.filename), frame.lineno)
+            size, count = totals.get(location, (0, 0))
+            totals[location] = (size + stat.size, count + stat.count)
+
+    out.write(f"Memory: {len(paths)} task(s), peak per task: max {max(peaks) / 1024:.1f} KiB, "
+              f"mean {sum(peaks) / len(peaks) / 1024:.1f} KiB\n")
+    out.write(f"{'KiB':>12} {'blocks':>10}  location\n")
+    ranked = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)
+    for (filename, lineno), (size, count) in ranked[:top]:
+        out.write(f"{size / 1024:12.1f} {count:10d}  {filename}:{lineno}\n")
+
+
+def find_dumps(directory, group, suffix):
+    return sorted(glob.glob(os.path.join(directory, f"{group or '*'}-*{suffix}")))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Agrega os dumps de profiling das tasks em um relatório.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    report = commands.add_parser('report', help='Funções mais caras e maiores alocações de todas as tasks')
+    report.add_argument('--dir', default=PROFILE_DIR, help='Diretório com os dumps das tasks')
+    report.add_argument('--group', help='Grupo do JobMetrics (ex: BookingRecommendation); padrão: todos')
+    report.add_argument('--top', type=int, default=DEFAULT_TOP, help='Linhas de cada relatório')
+    report.add_argument('--sort', default='cumulative', choices=SORT_KEYS, help='Ordenação das funções')
+    options = parser.parse_args(argv)
+    if options.top < 1:
+        parser.error('--top must be >= 1')
+    return options
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    cpu_paths = find_dumps(options.dir, options.group, CPU_SUFFIX)
+    memory_paths = find_dumps(options.dir, options.group, MEMORY_SUFFIX)
+    if not cpu_paths and not memory_paths:
+        sys.stderr.write(f"ERROR: No profiling dumps found in {options.dir}\n")
+        return 1
+    if cpu_paths:
+        report_cpu(cpu_paths, options.top, options.sort, sys.stdout)
+    if memory_paths:
+        if cpu_paths:
+            sys.stdout.write('\n')
+        report_memory(memory_paths, options.top, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+
+import date_codec
+from booking_frequency import average_frequency, recommend
+
+
+def second(value):
+    return date_codec.to_epoch_second(value)
+
+
+def total_gap_days(*values):
+    seconds = [second(value) for value in values]
+    return sum(date_codec.gap_days(earlier, later) for earlier, later in zip(seconds, seconds[1:]))
+
+
+def test_average_frequency_needs_two_visits():
+    assert average_frequency(0, 0) == 0
+    assert average_frequency(1, 0) == 0
+
+
+def test_average_frequency_keeps_the_fraction():
+    assert average_frequency(3, 7) == 3.5
+
+
+def test_gaps_are_whole_24h_spans_in_visit_order():
+    # 23h contam 0 dias: a soma dos intervalos (0 + 1) não é último - primeiro (2 dias)
+    assert total_gap_days('2025-01-01 10:00:00', '2025-01-02 09:00:00', '2025-01-03 10:00:00') == 1
+
+
+def test_recommend_carries_the_fraction_into_the_next_day():
+    # Média de 3,5 dias: 14h + 3,5 dias passa da meia-noite do dia 4
+    now = datetime(2024, 1, 1)
+    last = second('2025-01-01 14:00:00')
+    assert recommend(3, 7, last, now) == ('2025-01-05', 3)
+
+
+def test_recommend_keeps_the_day_when_the_fraction_fits():
+    now = datetime(2024, 1, 1)
+    last = second('2025-01-01 10:00:00')
+    assert recommend(3, 7, last, now) == ('2025-01-04', 3)
+
+
+def test_recommend_starts_from_now_after_the_last_visit():
+    now = datetime(2025, 3, 1, 20, 0, 0)
+    last = second('2025-01-01 10:00:00')
+    assert recommend(2, 30, last, now) == ('2025-03-31', 30)
+    # 20h + 0,25 dia vira o dia seguinte
+    assert recommend(5, 1, last, now) == ('2025-03-02', 0)
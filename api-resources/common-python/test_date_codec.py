@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from datetime import date, datetime
+
+import pytest
+
+import date_codec
+
+
+@pytest.mark.parametrize('value', [
+    '1970-01-01 00:00:00',
+    '2024-02-29 23:59:59',
+    '2025-04-10 14:00:00',
+    '2025-04-10 14:00:00.0',
+    '2025-04-10 14:00:00.999999',
+])
+def test_to_epoch_second_matches_strptime(value):
+    expected = datetime.strptime(value.split('.')[0], '%Y-%m-%d %H:%M:%S') - date_codec.EPOCH
+    assert date_codec.to_epoch_second(value) == expected.days * date_codec.SECONDS_PER_DAY + expected.seconds
+
+
+def test_to_epoch_second_falls_back_to_strptime():
+    assert date_codec.to_epoch_second(' 2025-1-5 1:2:3 ') == date_codec.to_epoch_second('2025-01-05 01:02:03')
+
+
+@pytest.mark.parametrize('value', [
+    '',
+    'abc',
+    '2025-04-10',
+    '2025-02-29 10:00:00',
+    '2025-13-01 00:00:00',
+    '2025-01-01 24:00:00',
+    '2025-01-01 10:0a:00',
+    '2025-01-01 10:00:60',
+])
+def test_to_epoch_second_rejects_invalid_timestamps(value):
+    assert date_codec.to_epoch_second(value) is None
+
+
+def test_decode_epoch_second_reads_integers_and_text():
+    assert date_codec.decode_epoch_second('86400') == 86400
+    assert date_codec.decode_epoch_second('1970-01-02 00:00:00') == 86400
+    assert date_codec.decode_epoch_second('x') is None
+
+
+def test_to_datetime_round_trips():
+    value = '2025-04-10 14:30:15'
+    assert date_codec.to_datetime(date_codec.to_epoch_second(value)) == datetime(2025, 4, 10, 14, 30, 15)
+
+
+def test_gap_days_counts_complete_days():
+    earlier = date_codec.to_epoch_second('2025-01-01 10:00:00')
+    assert date_codec.gap_days(earlier, date_codec.to_epoch_second('2025-01-02 09:59:59')) == 0
+    assert date_codec.gap_days(earlier, date_codec.to_epoch_second('2025-01-02 10:00:00')) == 1
+    assert date_codec.gap_days(earlier, date_codec.to_epoch_second('2025-01-31 09:00:00')) == 29
+
+
+def test_epoch_day_round_trips():
+    day = date_codec.to_epoch_day('2024-02-29 10:00:00')
+    assert day == date(2024, 2, 29).toordinal() - date_codec.EPOCH_ORDINAL
+    assert date_codec.from_epoch_day(day) == '2024-02-29'
+    assert date_codec.decode_epoch_day(str(day)) == day
+
+
+def test_to_epoch_day_fallback_formats():
+    assert date_codec.to_epoch_day('29/02/2024') == date_codec.to_epoch_day('2024-02-29')
+    assert date_codec.to_epoch_day('2025-02-29') is None
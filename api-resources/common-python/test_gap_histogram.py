@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+import random
+
+import pytest
+
+from gap_histogram import GapHistogram
+
+
+def histogram_of(gaps):
+    histogram = GapHistogram()
+    for gap in gaps:
+        histogram.add(gap)
+    return histogram
+
+
+def list_frequency(gaps):
+    """O cálculo original do reducer de referência, sobre a lista de intervalos."""
+    n = len(gaps)
+    mean = sum(gaps) / float(n)
+    std_dev = math.sqrt(sum((x - mean) ** 2 for x in gaps) / float(n))
+    lower_bound = mean - 1.96 * std_dev
+    upper_bound = mean + 1.96 * std_dev
+    filtered = [d for d in gaps if lower_bound <= d <= upper_bound]
+    if not filtered:
+        return mean
+    return sum(filtered) / float(len(filtered))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_frequency_matches_the_list_computation(seed):
+    rng = random.Random(seed)
+    gaps = [int(rng.expovariate(1 / 30.0)) for _ in range(rng.randrange(1, 500))]
+    assert int(round(histogram_of(gaps).frequency_days())) == int(round(list_frequency(gaps)))
+    assert histogram_of(gaps).frequency_days() == pytest.approx(list_frequency(gaps))
+
+
+def test_frequency_drops_outliers():
+    assert histogram_of([30] * 20 + [400]).frequency_days() == 30
+
+
+def test_empty_histogram():
+    histogram = GapHistogram()
+    assert histogram.frequency_days() is None
+    assert histogram.quantiles((0.5, 0.9)) == [None, None]
+
+
+def test_negative_gap_is_rejected():
+    with pytest.raises(ValueError):
+        GapHistogram().add(-1)
+
+
+def test_quantiles():
+    histogram = histogram_of(range(1, 101))
+    assert histogram.quantiles((0.5, 0.9, 0.99)) == [50, 90, 99]
+
+
+def test_merge_of_partials_equals_the_whole():
+    rng = random.Random(1)
+    gaps = [rng.randrange(0, 120) for _ in range(1000)]
+    merged = GapHistogram()
+    for start in range(0, len(gaps), 300):
+        merged.merge(histogram_of(gaps[start:start + 300]))
+    whole = histogram_of(gaps)
+    assert list(merged.items()) == list(whole.items())
+    assert merged.frequency_days() == whole.frequency_days()
+
+
+def test_text_round_trip():
+    histogram = histogram_of([0, 7, 7, 14, 30])
+    text = histogram.to_text()
+    assert text == '0:1 7:2 14:1 30:1'
+    assert list(GapHistogram.from_text(text).items()) == list(histogram.items())
+
+
+def test_from_text_rejects_invalid_items():
+    with pytest.raises(ValueError):
+        GapHistogram.from_text('7:2 14')
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from job_output import parse_rows, parse_vaccine_recommendation
+
+# Vacina do seed (api/src/config/database/dml.js) com vírgula no nome
+NAME = 'Complexo Tosse dos Canis (Bordetella, Mucosa)'
+DESCRIPTION = 'Vacinas vivas (intranasal ou oral) para proteção contra Bordetella bronchiseptica e/ou Parainfluenza.'
+
+
+def test_vaccine_name_with_commas():
+    value = f'"{NAME}","Bordetella, Parainfluenza",false,2026-12-01,2'
+    assert parse_vaccine_recommendation('7', value) == ['7', NAME, 'Bordetella, Parainfluenza', 'f', '2026-12-01', '2']
+
+
+def test_vaccine_without_quotes():
+    assert parse_vaccine_recommendation('3', f'Antirrábica,{DESCRIPTION},t,2027-02-01,9') == [
+        '3', 'Antirrábica', DESCRIPTION, 't', '2027-02-01', '9']
+
+
+def test_vaccine_unquoted_commas_are_rejected():
+    # Sem aspas a divisão seria ambígua: a linha é rejeitada em vez de carregada errada
+    with pytest.raises(ValueError):
+        parse_vaccine_recommendation('7', f'{NAME},Bordetella,false,2026-12-01,2')
+    with pytest.raises(ValueError):
+        parse_vaccine_recommendation('7', 'V10,Cinomose,t,2026-12-01')
+
+
+def test_parse_rows_counts_rejected_lines():
+    lines = [f'7\t"{NAME}",Bordetella,f,2026-12-01,2\n', f'8\t{NAME},Bordetella,f,2026-12-01,2\n', '\n']
+    stats = {'rows': 0, 'rejected': 0}
+    rows = list(parse_rows(lines, parse_vaccine_recommendation, stats))
+    assert rows == [['7', NAME, 'Bordetella', 'f', '2026-12-01', '2']]
+    assert stats['rejected'] == 1
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import random
+from bisect import bisect_right
+
+import pytest
+
+from kll_sketch import KllSketch
+
+FRACTIONS = (0.5, 0.9, 0.99)
+
+# Erro de rank aceito: folga sobre os ~1.7% esperados com k=200
+MAX_RANK_ERROR = 0.03
+
+
+def sketch_of(values, k=200):
+    sketch = KllSketch(k)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def rank_errors(sketch, values):
+    ordered = sorted(values)
+    return [abs(bisect_right(ordered, estimate) / len(ordered) - fraction)
+            for fraction, estimate in zip(FRACTIONS, sketch.quantiles(FRACTIONS))]
+
+
+def random_values(count, seed):
+    rng = random.Random(seed)
+    return [round(rng.lognormvariate(4, 1), 2) for _ in range(count)]
+
+
+def test_small_inputs_are_exact():
+    sketch = sketch_of(float(value) for value in range(1, 101))
+    assert sketch.quantiles(FRACTIONS) == [50.0, 90.0, 99.0]
+
+
+def test_empty_sketch():
+    assert KllSketch().quantiles(FRACTIONS) == [None, None, None]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_rank_error_is_bounded(seed):
+    values = random_values(50000, seed)
+    sketch = sketch_of(values)
+    assert max(rank_errors(sketch, values)) <= MAX_RANK_ERROR
+    # Memória: O(k) itens, qualquer que seja o número de valores
+    assert sum(len(level) for level in sketch.levels) < 1000
+
+
+def test_weight_is_preserved():
+    sketch = sketch_of(random_values(20000, 1))
+    assert sum(weight for _, weight in sketch.weighted_items()) == sketch.count == 20000
+
+
+def test_merge_of_partials():
+    values = random_values(60000, 2)
+    merged = KllSketch()
+    for start in range(0, len(values), 7000):
+        merged.merge(sketch_of(values[start:start + 7000]))
+    assert merged.count == len(values)
+    assert max(rank_errors(merged, values)) <= MAX_RANK_ERROR
+
+
+def test_same_input_same_sketch():
+    values = random_values(10000, 3)
+    assert sketch_of(values).to_text() == sketch_of(values).to_text()
+
+
+def test_text_round_trip():
+    sketch = sketch_of(random_values(5000, 4))
+    text = sketch.to_text()
+    assert ',' not in text and '\t' not in text
+    restored = KllSketch.from_text(text)
+    assert restored.k == sketch.k
+    assert restored.levels == sketch.levels
+    assert restored.count == sketch.count
+    assert restored.quantiles(FRACTIONS) == sketch.quantiles(FRACTIONS)
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        KllSketch(4)
+    with pytest.raises(ValueError):
+        KllSketch.from_text('200')
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+from collections import Counter
+
+import salt_plan
+
+
+def test_salted_key_round_trip():
+    # O perfil pode ter qualquer caractere; o sal é sempre o último campo
+    key = 'Cão;Poodle#Toy;Encaracolado'
+    assert salt_plan.unsalted_key(salt_plan.salted_key(key, 3)) == key
+    assert salt_plan.salted_key('a', 0) == 'a#0'
+
+
+def test_plan_splits_only_hot_keys():
+    counts = Counter({'hot': 8000, 'warm': 1200, 'cold': 800})
+    # hot: ceil(0.8 * 4 * 2) = 7; warm: ceil(0.12 * 4 * 2) = 1 (fora do plano); cold: 1
+    assert salt_plan.plan(counts, reducers=4) == {'hot': 7}
+
+
+def test_plan_respects_max_salts():
+    assert salt_plan.plan(Counter({'hot': 10000}), reducers=64, max_salts=16) == {'hot': 16}
+
+
+def test_plan_is_empty_for_small_samples_or_one_reducer():
+    assert salt_plan.plan(Counter({'hot': 999}), reducers=4) == {}
+    assert salt_plan.plan(Counter({'hot': 10000}), reducers=1) == {}
+
+
+def test_write_and_load(tmp_path):
+    path = str(tmp_path / 'salts.csv')
+    salts = {'Gato;Sphynx;Sem pelo': 3, 'Cão;Poodle;Encaracolado': 2}
+    salt_plan.write(salts, path)
+    assert salt_plan.load(path) == salts
+    assert salt_plan.load(str(tmp_path / 'missing.csv')) == {}
+
+
+def test_count_keys_reads_the_field():
+    lines = ['1,Cão;Poodle;Encaracolado,2025-01-01 10:00:00\n', '2,Gato;Persa;Longo,2025-01-02 10:00:00\n',
+             '3,Cão;Poodle;Encaracolado,2025-01-03 10:00:00\n', 'malformed\n']
+    assert salt_plan.count_keys(lines, 1) == Counter({'Cão;Poodle;Encaracolado': 2, 'Gato;Persa;Longo': 1})
+
+
+def test_main_writes_the_plan(tmp_path, monkeypatch):
+    sample = ''.join(f"{pet_id},{'hot' if pet_id % 10 else 'cold'},2025-01-01 10:00:00\n" for pet_id in range(2000))
+    monkeypatch.setattr('sys.stdin', io.StringIO(sample))
+    path = str(tmp_path / 'salts.csv')
+    assert salt_plan.main(['--field', '1', '--reducers', '4', '--output', path]) == 0
+    assert salt_plan.load(path) == {'hot': 8}
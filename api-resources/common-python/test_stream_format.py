@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+
+import pytest
+
+import stream_format
+from job_metrics import JobMetrics, RECORDS_IN
+
+
+def write_and_read(fmt, emit):
+    """Emite com um fluxo do formato e devolve um fluxo do mesmo formato lendo a saída."""
+    out = io.BytesIO()
+    writer = stream_format.open_stream(fmt, stdin=io.BytesIO(), stdout=out)
+    emit(writer)
+    writer.flush()
+    return stream_format.open_stream(fmt, stdin=io.BytesIO(out.getvalue()), stdout=io.BytesIO())
+
+
+@pytest.mark.parametrize('value', [
+    0, -1, 2 ** 31 - 1, 2 ** 31, -2 ** 63, 1.5, True, False,
+    '', 'Cão;Golden Retriever;Longo', 'a,b\tc\n', b'\x00\xff',
+    (1, 'x', 2.5), [], [1, [2, 'três']],
+])
+def test_typedbytes_round_trip(value):
+    decoded = stream_format.decode(stream_format.encode(value))
+    if isinstance(value, tuple):
+        value = list(value)
+    assert decoded == value
+
+
+def test_typedbytes_rejects_unknown_types():
+    with pytest.raises(TypeError):
+        stream_format.encode(object())
+    with pytest.raises(ValueError):
+        stream_format.decode(b'\x63')
+
+
+def test_typedbytes_truncated_object():
+    data = stream_format.encode('Cão')
+    with pytest.raises(EOFError):
+        stream_format.decode(data[:-1])
+
+
+def test_typedbytes_stream_round_trip_across_chunks(monkeypatch):
+    # Blocos pequenos: pares divididos entre leituras precisam ser remontados
+    monkeypatch.setattr(stream_format, 'CHUNK_SIZE', 7)
+    records = [(pet_id, (pet_id * 86400, 'Cão')) for pet_id in range(50)]
+
+    def emit(stream):
+        for key, values in records:
+            stream.emit(key, values)
+
+    reader = write_and_read(stream_format.TYPEDBYTES, emit)
+    assert list(reader.records()) == [(key, list(values)) for key, values in records]
+
+
+def test_text_stream_round_trip():
+    def emit(stream):
+        stream.emit(1, (20188, 30))
+        stream.emit(1, (20190, 30))
+        stream.emit(2, ('2025-04-10', 'x'))
+
+    reader = write_and_read(stream_format.TEXT, emit)
+    assert [(key, [list(values) for values in group]) for key, group in reader.groups()] == [
+        ('1', [['20188', '30'], ['20190', '30']]),
+        ('2', [['2025-04-10', 'x']]),
+    ]
+
+
+def test_text_stream_composite_keys():
+    def emit(stream):
+        stream.emit_key(('Cão;Poodle;Encaracolado#1', 7, 1744293600))
+
+    reader = write_and_read(stream_format.TEXT, emit)
+    assert list(reader.key_records()) == [['Cão;Poodle;Encaracolado#1', '7', '1744293600']]
+
+
+def test_output_is_text_in_both_formats():
+    for fmt in stream_format.FORMATS:
+        out = io.BytesIO()
+        stream = stream_format.open_stream(fmt, stdin=io.BytesIO(), stdout=out)
+        stream.output(12, '2026-11-14,27')
+        stream.flush()
+        if fmt == stream_format.TEXT:
+            assert out.getvalue() == '12\t2026-11-14,27\n'.encode('utf-8')
+        else:
+            assert list(stream_format.read_pairs(io.BytesIO(out.getvalue()))) == [('12', '2026-11-14,27')]
+
+
+def test_read_lines_counts_records_per_chunk(monkeypatch):
+    monkeypatch.setattr(stream_format, 'CHUNK_SIZE', 5)
+    metrics = JobMetrics('Test', stream=io.StringIO())
+    data = ' 1,Cão \n2,b\n\n3,c'.encode('utf-8')
+    assert list(stream_format.read_lines(io.BytesIO(data), metrics)) == ['1,Cão', '2,b', '', '3,c']
+    assert metrics.counters[RECORDS_IN] == 4
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        stream_format.open_stream('avro')
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+
+import task_profiler
+from job_metrics import JobMetrics
+
+
+def test_parse_modes():
+    assert task_profiler.parse_modes('cpu') == {'cpu'}
+    assert task_profiler.parse_modes(' memory , cpu,') == {'cpu', 'memory'}
+    assert task_profiler.parse_modes('') == set()
+
+
+def test_invalid_mode_disables_profiling(capsys):
+    assert task_profiler.parse_modes('cpux') == set()
+    assert 'WARNING: Invalid PETSHOP_PROFILE' in capsys.readouterr().err
+
+
+def test_task_runs_without_profiling_on_a_typo(monkeypatch, capsys):
+    # Um erro de digitação no -cmdenv não pode derrubar as tasks
+    monkeypatch.setattr(task_profiler, 'PROFILE', 'cpu,memroy')
+    monkeypatch.setattr(task_profiler, '_active', None)
+    metrics = JobMetrics('Test', stream=io.StringIO())
+    assert metrics.profiler is None
+    assert 'memroy' in capsys.readouterr().err
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import vaccine_equivalence
+from vaccine_equivalence import UnionFind, build_index
+
+
+def test_build_index_uses_the_transitive_closure():
+    # 4~7 e 7~9 tornam 4, 7 e 9 equivalentes mesmo sem o par (4, 9)
+    index = build_index([('4', '7'), ('7', '9'), ('10', '12')])
+    assert index == {4: 4, 7: 4, 9: 4, 10: 10, 12: 10}
+
+
+def test_class_is_the_smallest_id_whatever_the_union_order():
+    index = build_index([(8, 9), (5, 9), (2, 3), (3, 8)])
+    assert set(index.values()) == {2}
+
+
+def test_union_find_components():
+    union_find = UnionFind()
+    union_find.union(1, 2)
+    union_find.union(3, 4)
+    assert union_find.find(1) == union_find.find(2)
+    assert union_find.find(1) != union_find.find(3)
+    union_find.union(2, 4)
+    assert len({union_find.find(item) for item in (1, 2, 3, 4)}) == 1
+
+
+def test_main_writes_an_index_that_load_index_reads(tmp_path):
+    pairs = tmp_path / 'pairs.csv'
+    pairs.write_text('vaccine_id,equivalent_vaccine_id\n4,7\n7,9\n', encoding='utf-8')
+    index = tmp_path / 'vaccine_equivalence.csv'
+    assert vaccine_equivalence.main([str(pairs), str(index)]) == 0
+    assert index.read_text(encoding='utf-8').splitlines() == [
+        'vaccine_reference_id,class_id', '4,4', '7,4', '9,4']
+    assert vaccine_equivalence.load_index(str(index)) == {'4': '4', '7': '4', '9': '4'}
+
+
+def test_load_index_without_the_file(tmp_path):
+    assert vaccine_equivalence.load_index(str(tmp_path / 'missing.csv')) == {}
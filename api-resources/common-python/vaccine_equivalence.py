@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Classes de equivalência de vacinas (fecho transitivo de vaccine_equivalence).
+
+A tabela guarda pares (vaccine_id < equivalent_vaccine_id); uma union-find
+reduz o grafo uma vez por execução a um índice 'vacina -> classe', em que a
+classe é o menor id do componente. O reducer carrega o índice e trata uma
+vacina aplicada como aplicação de toda a sua classe com um lookup O(1).
+
+Uso (no pipeline, antes do job):
+    python3 vaccine_equivalence.py pares.csv vaccine_equivalence.csv
+
+pares.csv é o CSV (com cabeçalho vaccine_id,equivalent_vaccine_id) exportado
+do banco; o índice gerado só contém vacinas que têm alguma equivalência.
+"""
+
+import csv
+import os
+import sys
+
+INDEX_COLUMNS = ('vaccine_reference_id', 'class_id')
+
+
+class UnionFind:
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, item):
+        if item not in self.parent:
+            self.parent[item] = item
+            self.size[item] = 1
+            return item
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # Compressão de caminho
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first == second:
+            return
+        if self.size[first] < self.size[second]:
+            first, second = second, first
+        self.parent[second] = first
+        self.size[first] += self.size[second]
+
+    def classes(self):
+        """Mapa item -> menor item do seu componente."""
+        smallest = {}
+        for item in self.parent:
+            root = self.find(item)
+            if root not in smallest or item < smallest[root]:
+                smallest[root] = item
+        return {item: smallest[self.find(item)] for item in self.parent}
+
+
+def build_index(pairs):
+    """Recebe pares (id, id equivalente) e devolve o mapa id -> classe (ids inteiros)."""
+    union_find = UnionFind()
+    for vaccine_id, equivalent_id in pairs:
+        union_find.union(int(vaccine_id), int(equivalent_id))
+    return union_find.classes()
+
+
+def read_pairs(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            yield row['vaccine_id'], row['equivalent_vaccine_id']
+
+
+def write_index(index, path):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(INDEX_COLUMNS)
+        for vaccine_id in sorted(index):
+            writer.writerow((vaccine_id, index[vaccine_id]))
+
+
+def load_index(path):
+    """
+    Mapa vaccine_reference_id -> class_id como texto, no formato em que os ids
+    chegam ao reducer. Sem o arquivo, cada vacina é a sua própria classe.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline='', encoding='utf-8') as f:
+        return {row['vaccine_reference_id'].strip(): row['class_id'].strip() for row in csv.DictReader(f)}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        sys.stderr.write("Usage: vaccine_equivalence.py PAIRS_CSV INDEX_CSV\n")
+        return 2
+    index = build_index(read_pairs(argv[0]))
+    write_index(index, argv[1])
+    print(f"Vaccine equivalence index: {len(index)} vaccines in {len(set(index.values()))} classes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,595 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Executor local dos jobs Hadoop Streaming (map -> shuffle/sort -> reduce).
+
+Aceita os mesmos argumentos do hadoop-streaming usados pelos scripts
+run_*_pipeline.sh, executando os mapper.py/reducer.py em N processos locais,
+sem JVM/YARN. O particionamento reproduz o HashPartitioner do Hadoop sobre a
+chave (texto até o primeiro TAB) e a ordenação compara os bytes da chave como
+o comparador de Text, de modo que cada part-NNNNN é idêntico ao gerado pelo
+cluster com o mesmo número de reducers.
+
+Com -D stream.map.output=typedbytes (e stream.reduce.input/output), os
+registros entre as tasks são pares typedbytes: a partição e a ordenação usam
+os bytes serializados da chave, como o TypedBytesWritable, e a saída do
+reducer é gravada em texto ('chave\tvalor'), como pelo TextOutputFormat.
+
+Ordenação secundária (só em texto): -D stream.num.map.output.key.fields=N
+torna os N primeiros campos (separados por TAB) a chave; -partitioner
+org.apache.hadoop.mapred.lib.KeyFieldBasedPartitioner com
+-D mapreduce.partition.keypartitioner.options=-k1,1 particiona só pelos
+campos indicados, e -D mapreduce.job.output.key.comparator.class=
+...KeyFieldBasedComparator com -D mapreduce.partition.keycomparator.options=
+'-k1,1 -k2,2n' ordena campo a campo (n: numérico, r: decrescente), como o
+Hadoop. Posições de caractere (-k2.3) não são suportadas.
+
+Uso:
+    python3 local_runner.py \\
+        -file mapper.py -mapper 'python3 mapper.py' \\
+        -file reducer.py -reducer 'python3 reducer.py' \\
+        [-file combiner.py -combiner 'python3 combiner.py'] \\
+        [-cmdenv NOME=valor] [-D stream.map.output=typedbytes ...] \\
+        [-partitioner org.apache.hadoop.mapred.lib.KeyFieldBasedPartitioner] \\
+        -input /tmp/petshop/input -output /tmp/petshop/output \\
+        -numReduceTasks 2 -workers 4
+"""
+
+import argparse
+import heapq
+import multiprocessing
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from collections import namedtuple
+from operator import itemgetter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'common-python'))
+import stream_format
+from local_job import list_input_files, report_counters
+
+# Tamanho mínimo de um split de entrada (evita dezenas de tasks para poucos KB)
+MIN_SPLIT_SIZE = 1024 * 1024
+
+# Protocolo de contadores/status do streaming no stderr das tasks
+COUNTER_PREFIX = b'reporter:counter:'
+STATUS_PREFIX = b'reporter:status:'
+
+# Propriedades -D de formato do streaming (valores: stream_format.FORMATS)
+STREAM_PROPERTIES = ('stream.map.output', 'stream.reduce.input', 'stream.reduce.output')
+
+# Propriedades -D da chave composta (ordenação secundária)
+KEY_FIELDS_PROPERTY = 'stream.num.map.output.key.fields'
+PARTITIONER_OPTIONS_PROPERTY = 'mapreduce.partition.keypartitioner.options'
+COMPARATOR_PROPERTY = 'mapreduce.job.output.key.comparator.class'
+COMPARATOR_OPTIONS_PROPERTY = 'mapreduce.partition.keycomparator.options'
+
+KEY_FIELD_PARTITIONERS = ('org.apache.hadoop.mapred.lib.KeyFieldBasedPartitioner',
+                          'org.apache.hadoop.mapreduce.lib.partition.KeyFieldBasedPartitioner')
+KEY_FIELD_COMPARATORS = ('org.apache.hadoop.mapred.lib.KeyFieldBasedComparator',
+                         'org.apache.hadoop.mapreduce.lib.partition.KeyFieldBasedComparator')
+
+# Um -k das opções do KeyFieldHelper: campo inicial e final (1-based; final None = fim da chave)
+KeySpec = namedtuple('KeySpec', 'start end numeric reverse')
+KEY_SPEC = re.compile(r'-k(\d+)([nr]*)(?:,(\d+)([nr]*))?')
+NUMBER_PREFIX = re.compile(rb'-?\d*(\.\d*)?')
+
+
+def partition_for(key, num_partitions):
+    """Replica o HashPartitioner do Hadoop: Text.hashCode() & MAX_INT % R."""
+    if num_partitions == 1:
+        return 0
+    h = 1
+    for b in key:
+        # WritableComparator.hashBytes soma os bytes com sinal (byte Java)
+        h = (31 * h + (b - 256 if b > 127 else b)) & 0xFFFFFFFF
+    return (h & 0x7FFFFFFF) % num_partitions
+
+
+def parse_key_specs(options):
+    """
+    Lista de KeySpec de opções como '-k1,1 -k2,2n'; -n e -r sozinhos valem para
+    os -k sem opções próprias, como no KeyFieldHelper do Hadoop.
+    """
+    specs = []
+    numeric = reverse = False
+    for option in options.split():
+        if re.fullmatch(r'-[nr]+', option):
+            numeric = numeric or 'n' in option
+            reverse = reverse or 'r' in option
+            continue
+        match = KEY_SPEC.fullmatch(option)
+        if not match or int(match.group(1)) < 1 or (match.group(3) and int(match.group(3)) < int(match.group(1))):
+            raise ValueError(f"Unsupported key field option: {option}")
+        start, start_flags, end, end_flags = match.groups()
+        specs.append((int(start), int(end) if end else None, (start_flags or '') + (end_flags or '')))
+    return [KeySpec(start, end, 'n' in flags if flags else numeric, 'r' in flags if flags else reverse)
+            for start, end, flags in specs]
+
+
+def key_field(fields, spec):
+    """Bytes dos campos [start, end] da chave (com os TABs internos), ou None se não existirem."""
+    if spec.start > len(fields):
+        return None
+    return b'\t'.join(fields[spec.start - 1:spec.end])
+
+
+def string_hash(key):
+    """String.hashCode() do Java da chave: 31 * h + unidade UTF-16 do texto decodificado."""
+    h = 0
+    text = key.decode('utf-8', errors='replace').encode('utf-16-be', errors='surrogatepass')
+    for i in range(0, len(text), 2):
+        h = (31 * h + (text[i] << 8 | text[i + 1])) & 0xFFFFFFFF
+    return h
+
+
+def key_field_partition(key, specs, num_partitions):
+    """
+    Replica o KeyFieldBasedPartitioner: hash (31 * h + byte) dos campos das
+    specs; sem -k, o hashCode() do texto da chave inteira.
+    """
+    if num_partitions == 1 or not key:
+        return 0
+    if not specs:
+        return (string_hash(key) & 0x7FFFFFFF) % num_partitions
+    h = 0
+    fields = key.split(b'\t')
+    for spec in specs:
+        field = key_field(fields, spec)
+        if field is None:
+            continue
+        for b in field:
+            h = (31 * h + (b - 256 if b > 127 else b)) & 0xFFFFFFFF
+    return (h & 0x7FFFFFFF) % num_partitions
+
+
+def numeric_value(field):
+    """Valor do prefixo numérico do campo (0 se não houver), como a comparação -n."""
+    number = NUMBER_PREFIX.match(field).group()
+    if number.strip(b'-.'):
+        return float(number) if b'.' in number else int(number)
+    return 0
+
+
+def key_field_value(spec):
+    """Função campos da chave -> valor comparável de uma spec do KeyFieldBasedComparator."""
+    def value(fields):
+        if spec.start > len(fields):
+            # Campo inexistente vem antes de qualquer valor
+            return (0,)
+        field = fields[spec.start - 1] if spec.end == spec.start else b'\t'.join(fields[spec.start - 1:spec.end])
+        if spec.numeric:
+            number = int(field) if field.isdigit() else numeric_value(field)
+            return (1, -number if spec.reverse else number)
+        if spec.reverse:
+            # Bytes invertidos, com um terminador maior que qualquer byte de texto
+            return (1, bytes(255 - b for b in field) + b'\xff')
+        return (1, field)
+    return value
+
+
+def key_field_order(specs):
+    """
+    Função de ordenação da chave equivalente ao KeyFieldBasedComparator com as
+    specs; sem -k, os bytes da chave inteira.
+    """
+    if not specs:
+        return bytes
+    values = [key_field_value(spec) for spec in specs]
+
+    def order(key):
+        fields = key.split(b'\t')
+        return tuple([value(fields) for value in values])
+    return order
+
+
+def record_order(job):
+    """
+    Chave de ordenação dos registros (chave, registro): os bytes da chave, como
+    o comparador de Text, ou os campos do KeyFieldBasedComparator.
+    """
+    if not job['comparator_specs']:
+        return itemgetter(0)
+    order = key_field_order(job['comparator_specs'])
+    return lambda record: order(record[0])
+
+
+def record_partitioner(job):
+    """Partição de uma chave: HashPartitioner ou KeyFieldBasedPartitioner."""
+    num_partitions = job['num_reducers']
+    specs = job['partitioner_specs']
+    if specs is None:
+        return lambda key: partition_for(key, num_partitions)
+    return lambda key: key_field_partition(key, specs, num_partitions)
+
+
+def record_key(line, key_fields=1):
+    """Chave de uma linha 'chave\\tvalor\\n': os key_fields primeiros campos (a linha toda se não houver TAB)."""
+    if key_fields == 1:
+        return line.split(b'\t', 1)[0]
+    return b'\t'.join(line.rstrip(b'\n').split(b'\t', key_fields)[:key_fields])
+
+
+def normalize_line(line):
+    """Garante o formato 'chave\\tvalor\\n' que o streaming entrega ao reducer."""
+    if not line.endswith(b'\n'):
+        line += b'\n'
+    if b'\t' not in line:
+        line = line[:-1] + b'\t\n'
+    return line
+
+
+def read_text_records(stream, key_fields=1):
+    """Registros (chave, linha) de um fluxo em texto."""
+    for line in stream:
+        line = normalize_line(line)
+        yield record_key(line, key_fields), line
+
+
+def read_records(job, stream):
+    """Registros (chave, registro) da saída do map (ou do combiner) no formato do job."""
+    if job['map_output'] == stream_format.TYPEDBYTES:
+        # (chave serializada, chave + valor serializados)
+        return stream_format.read_raw_pairs(stream)
+    return read_text_records(stream, job['key_fields'])
+
+
+def write_text_output(stream, out):
+    for line in stream:
+        out.write(normalize_line(line))
+
+
+def write_typedbytes_output(stream, out):
+    """Grava pares typedbytes como 'chave\\tvalor\\n' (toString() de cada objeto)."""
+    for key, value in stream_format.read_pairs(stream):
+        out.write(f"{key}\t{value}\n".encode('utf-8'))
+
+
+OUTPUT_WRITERS = {
+    stream_format.TEXT: write_text_output,
+    stream_format.TYPEDBYTES: write_typedbytes_output,
+}
+
+
+def compute_splits(files, workers):
+    """Divide os arquivos de entrada em faixas de bytes (splits) para os mappers."""
+    total_size = sum(os.path.getsize(f) for f in files)
+    split_size = max(MIN_SPLIT_SIZE, -(-total_size // max(workers, 1)))
+    splits = []
+    for path in files:
+        size = os.path.getsize(path)
+        start = 0
+        while start < size:
+            end = min(start + split_size, size)
+            splits.append((path, start, end))
+            start = end
+        if size == 0:
+            splits.append((path, 0, 0))
+    return splits
+
+
+def read_split(path, start, end):
+    """
+    Lê as linhas cujo primeiro byte está em [start, end), como o
+    LineRecordReader: a linha que cruza o fim pertence a este split.
+    """
+    with open(path, 'rb') as f:
+        if start > 0:
+            f.seek(start - 1)
+            f.readline()
+        pos = f.tell()
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            yield line
+
+
+def start_task(command, workdir, stdout, counters, env=None):
+    process = subprocess.Popen(
+        shlex.split(command),
+        cwd=workdir,
+        env=env,
+        stdin=subprocess.PIPE,
+        stdout=stdout,
+        stderr=subprocess.PIPE,
+    )
+    process.stderr_reader = watch_stderr(process, counters)
+    return process
+
+
+def watch_stderr(process, counters):
+    """
+    Repassa o stderr da task para o nosso, acumulando em 'counters' as linhas
+    do protocolo 'reporter:counter:<grupo>,<contador>,<incremento>'.
+    """
+    def _reader():
+        for line in process.stderr:
+            if line.startswith(COUNTER_PREFIX):
+                try:
+                    group, name, amount = line[len(COUNTER_PREFIX):].decode('utf-8').rstrip('\n').split(',', 2)
+                    counters[(group, name)] = counters.get((group, name), 0) + int(amount)
+                    continue
+                except ValueError:
+                    pass
+            elif line.startswith(STATUS_PREFIX):
+                continue
+            sys.stderr.buffer.write(line)
+            sys.stderr.buffer.flush()
+
+    thread = threading.Thread(target=_reader, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_task(process, description):
+    process.stderr_reader.join()
+    if process.wait() != 0:
+        raise RuntimeError(f"{description} failed with exit code {process.returncode}")
+
+
+def feed(process, lines):
+    """Escreve as linhas no stdin da task em uma thread separada (evita deadlock)."""
+    def _writer():
+        try:
+            for line in lines:
+                process.stdin.write(line)
+        except BrokenPipeError:
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    thread = threading.Thread(target=_writer, daemon=True)
+    thread.start()
+    return thread
+
+
+def spill(buffers, job, task_id, spill_id, counters):
+    """
+    Ordena cada partição em memória e grava um run ordenado por partição,
+    passando-o antes pelo combiner quando o job tiver um.
+    """
+    runs = {}
+    for partition, records in buffers.items():
+        records.sort(key=record_order(job))
+        run_path = os.path.join(job['spill_dir'], f"map-{task_id:05d}-spill-{spill_id:03d}-part-{partition:05d}")
+        with open(run_path, 'wb') as f:
+            if job['combiner']:
+                combine(job, records, f, counters)
+            else:
+                f.writelines(record for _, record in records)
+        runs[partition] = run_path
+    return runs
+
+
+def combine(job, records, out, counters):
+    # A saída do combiner é lida no formato da saída do map (validado em parse_args)
+    process = start_task(job['combiner'], job['workdir'], subprocess.PIPE, counters, job['env'])
+    writer = feed(process, (record for _, record in records))
+    for _, record in read_records(job, process.stdout):
+        out.write(record)
+    writer.join()
+    wait_task(process, 'Combiner')
+
+
+def run_map_task(args):
+    task_id, split, job = args
+    counters = {}
+    process = start_task(job['mapper'], job['workdir'], subprocess.PIPE, counters, job['env'])
+    writer = feed(process, read_split(*split))
+
+    partitioner = record_partitioner(job)
+    buffer_limit = job['sort_buffer_bytes']
+    buffers = {}
+    buffered = 0
+    spills = []
+    partition_cache = {}
+
+    for key, record in read_records(job, process.stdout):
+        partition = partition_cache.get(key)
+        if partition is None:
+            partition = partitioner(key)
+            if len(partition_cache) < 100000:
+                partition_cache[key] = partition
+        buffers.setdefault(partition, []).append((key, record))
+        buffered += len(record)
+        if buffered >= buffer_limit:
+            spills.append(spill(buffers, job, task_id, len(spills), counters))
+            buffers = {}
+            buffered = 0
+
+    if buffers:
+        spills.append(spill(buffers, job, task_id, len(spills), counters))
+
+    writer.join()
+    wait_task(process, f"Map task {task_id}")
+    return spills, counters
+
+
+def read_run(path, job):
+    with open(path, 'rb') as f:
+        yield from read_records(job, f)
+
+
+def run_reduce_task(args):
+    partition, runs, job = args
+    merged = heapq.merge(*(read_run(path, job) for path in runs), key=record_order(job))
+    output_path = os.path.join(job['output'], f"part-{partition:05d}")
+
+    counters = {}
+    process = start_task(job['reducer'], job['workdir'], subprocess.PIPE, counters, job['env'])
+    writer = feed(process, (record for _, record in merged))
+    with open(output_path, 'wb') as out:
+        OUTPUT_WRITERS[job['reduce_output']](process.stdout, out)
+
+    writer.join()
+    wait_task(process, f"Reduce task {partition}")
+    return counters
+
+
+def prepare_workdir(files, workdir):
+    """Equivalente local do -file: disponibiliza os arquivos no diretório da task."""
+    for path in files:
+        target = os.path.join(workdir, os.path.basename(path))
+        if os.path.lexists(target):
+            os.remove(target)
+        os.symlink(os.path.abspath(path), target)
+
+
+def run_job(options):
+    if os.path.exists(options.output):
+        raise FileExistsError(f"Output directory already exists: {options.output}")
+
+    input_files = list_input_files(options.input)
+    splits = compute_splits(input_files, options.workers)
+    tmp_dir = tempfile.mkdtemp(prefix='petshop-local-runner-')
+    workdir = os.path.join(tmp_dir, 'work')
+    spill_dir = os.path.join(tmp_dir, 'spill')
+    os.makedirs(workdir)
+    os.makedirs(spill_dir)
+    os.makedirs(options.output)
+
+    job = {
+        'mapper': options.mapper,
+        'reducer': options.reducer,
+        'combiner': options.combiner,
+        'workdir': workdir,
+        'spill_dir': spill_dir,
+        'output': options.output,
+        'num_reducers': options.numReduceTasks,
+        'sort_buffer_bytes': options.sort_buffer_mb * 1024 * 1024,
+        'env': dict(os.environ, **options.cmdenv),
+        'map_output': options.properties['stream.map.output'],
+        'key_fields': options.key_fields,
+        'partitioner_specs': options.partitioner_specs,
+        'comparator_specs': options.comparator_specs,
+        'reduce_output': options.properties['stream.reduce.output'],
+    }
+
+    try:
+        prepare_workdir(options.file, workdir)
+        with multiprocessing.Pool(options.workers) as pool:
+            map_results = pool.map(run_map_task, [(i, split, job) for i, split in enumerate(splits)])
+
+            # Runs em ordem (task, spill): o merge estável preserva a ordem de entrada
+            runs_by_partition = {p: [] for p in range(options.numReduceTasks)}
+            for spills, _ in map_results:
+                for runs in spills:
+                    for partition, path in runs.items():
+                        runs_by_partition[partition].append(path)
+
+            reduce_results = pool.map(run_reduce_task, [(p, runs, job) for p, runs in runs_by_partition.items()])
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    open(os.path.join(options.output, '_SUCCESS'), 'wb').close()
+    sys.stderr.write(f"Local job finished: {len(splits)} map task(s), {options.numReduceTasks} reduce task(s).\n")
+    report_counters([counters for _, counters in map_results] + reduce_results)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Executa um job Hadoop Streaming localmente.')
+    parser.add_argument('-file', action='append', default=[], help='Arquivo disponibilizado no diretório das tasks')
+    parser.add_argument('-mapper', required=True, help="Comando do mapper (ex: 'python3 mapper.py')")
+    parser.add_argument('-reducer', required=True, help="Comando do reducer (ex: 'python3 reducer.py')")
+    parser.add_argument('-combiner', help="Comando do combiner, executado sobre cada spill ordenado do map")
+    parser.add_argument('-cmdenv', action='append', default=[], help='Variável NOME=valor no ambiente das tasks')
+    parser.add_argument('-D', dest='properties', action='append', default=[],
+                        help='Propriedade do job (propriedade=valor); apenas as de formato e de chave composta são usadas')
+    parser.add_argument('-partitioner', help='Classe do particionador (padrão: HashPartitioner)')
+    parser.add_argument('-input', action='append', required=True, help='Arquivo ou diretório de entrada')
+    parser.add_argument('-output', required=True, help='Diretório de saída (não pode existir)')
+    parser.add_argument('-numReduceTasks', type=int, default=1, help='Número de reducers / arquivos part-*')
+    parser.add_argument('-workers', type=int, default=os.cpu_count() or 1, help='Processos locais em paralelo')
+    parser.add_argument('-sort_buffer_mb', type=int, default=64, help='Memória de ordenação por map task antes do spill')
+    options = parser.parse_args(argv)
+    if options.numReduceTasks < 1:
+        parser.error('-numReduceTasks must be >= 1')
+    if options.workers < 1:
+        parser.error('-workers must be >= 1')
+    cmdenv = {}
+    for assignment in options.cmdenv:
+        name, sep, value = assignment.partition('=')
+        if not name or not sep:
+            parser.error(f"-cmdenv expects NAME=VALUE, got '{assignment}'")
+        cmdenv[name] = value
+    options.cmdenv = cmdenv
+    properties = dict.fromkeys(STREAM_PROPERTIES, stream_format.TEXT)
+    job_properties = {}
+    for assignment in options.properties:
+        name, sep, value = assignment.partition('=')
+        if not name or not sep:
+            parser.error(f"-D expects property=value, got '{assignment}'")
+        if name in STREAM_PROPERTIES:
+            if value not in stream_format.FORMATS:
+                parser.error(f"{name} must be one of {', '.join(stream_format.FORMATS)}, got '{value}'")
+            properties[name] = value
+        else:
+            job_properties[name] = value
+    # O shuffle não converte formatos: o reducer recebe exatamente o que o map emitiu
+    if properties['stream.reduce.input'] != properties['stream.map.output']:
+        parser.error('stream.reduce.input must match stream.map.output')
+    if options.combiner and properties['stream.reduce.output'] != properties['stream.map.output']:
+        parser.error('a combiner requires stream.reduce.output to match stream.map.output')
+    options.properties = properties
+    parse_key_options(parser, options, job_properties)
+    return options
+
+
+def parse_key_options(parser, options, properties):
+    """Campos da chave, specs do particionador e do comparador (None: padrão do Hadoop)."""
+    try:
+        options.key_fields = int(properties.get(KEY_FIELDS_PROPERTY, '1'))
+    except ValueError:
+        options.key_fields = 0
+    if options.key_fields < 1:
+        parser.error(f"{KEY_FIELDS_PROPERTY} must be an integer >= 1")
+
+    options.partitioner_specs = None
+    if options.partitioner:
+        if options.partitioner not in KEY_FIELD_PARTITIONERS:
+            parser.error(f"Unsupported partitioner: {options.partitioner} (expected KeyFieldBasedPartitioner)")
+        options.partitioner_specs = properties.get(PARTITIONER_OPTIONS_PROPERTY, '')
+
+    options.comparator_specs = None
+    comparator = properties.get(COMPARATOR_PROPERTY)
+    if comparator:
+        if comparator not in KEY_FIELD_COMPARATORS:
+            parser.error(f"Unsupported key comparator: {comparator} (expected KeyFieldBasedComparator)")
+        options.comparator_specs = properties.get(COMPARATOR_OPTIONS_PROPERTY, '')
+
+    try:
+        if options.partitioner_specs is not None:
+            options.partitioner_specs = parse_key_specs(options.partitioner_specs)
+        if options.comparator_specs is not None:
+            options.comparator_specs = parse_key_specs(options.comparator_specs)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Chaves typedbytes são comparadas e particionadas pelos bytes serializados
+    custom_keys = options.key_fields > 1 or options.partitioner_specs is not None or options.comparator_specs is not None
+    if custom_keys and options.properties['stream.map.output'] != stream_format.TEXT:
+        parser.error('composite keys (key fields, KeyFieldBased partitioner/comparator) require text map output')
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    try:
+        run_job(options)
+    except (RuntimeError, OSError, EOFError) as e:
+        sys.stderr.write(f"ERROR: {e}\n")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+
+# Combiner entry point (-combiner 'python3 combiner.py'): merges the partial
+# sums, counts and sketches of a map task without finalising them.
+
+from reducer import reduce_partials, stream
+from job_metrics import JobMetrics
+
+
+def emit_partial(pet_profile, partial_sum, count, sketch):
+    stream.emit(pet_profile, (partial_sum, count, sketch.to_text()))
+
+
+if __name__ == "__main__":
+    reduce_partials(emit_partial, JobMetrics('LtvByPetProfileCombiner'))
@@ -1,13 +1,89 @@
 #!/usr/bin/env python3
 
+import os
 import sys
 
-for line in sys.stdin:
-    line = line.strip()
-    # Format from Sqoop: Cão;Golden;Longo,123.45
-    # After schema change: species;animal_type;fur_type,purchase_value
-    fields = line.split(',')
-    if len(fields) == 2:
+# Shared modules: shipped with -file (Hadoop) or read from ../common-python
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common-python'))
+import stream_format
+from kll_sketch import KllSketch, DEFAULT_K
+from job_metrics import JobMetrics, RECORDS_OUT, MALFORMED_ROWS
+
+# In-mapper combining: partial sums and counts per profile are kept in a bounded
+# table and spilled when it fills up, so the shuffle carries O(profiles) lines
+# per map task instead of one line per purchase.
+MAX_PROFILES = int(os.environ.get('LTV_MAPPER_MAX_PROFILES', '10000'))
+
+# Each partial also carries a KLL sketch of the purchase values (p50/p90/p99),
+# bounded to O(k) values whatever the number of purchases.
+SKETCH_K = int(os.environ.get('LTV_SKETCH_K', str(DEFAULT_K)))
+
+# Rollup levels, from the finest to the grand total. Each cell of the cube is
+# keyed as 'level:path', where path keeps the first N profile fields:
+#   profile:Cão;Golden;Longo   animal_type:Cão;Golden   species:Cão   total:
+LEVELS = (('profile', 3), ('animal_type', 2), ('species', 1), ('total', 0))
+
+
+def rollup_keys(pet_profile):
+    """Keys of the rollup cells a purchase of this profile adds up to."""
+    fields = pet_profile.split(';')
+    return [f"{level}:{';'.join(fields[:depth])}" for level, depth in LEVELS]
+
+
+def flush(partials, stream, metrics):
+    # Partials are kept per profile and only expanded into the coarser cells
+    # here, so each purchase costs one dict update whatever the number of levels.
+    cells = {}
+    for pet_profile, (partial_sum, count, sketch) in partials.items():
+        for key in rollup_keys(pet_profile):
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = [0.0, 0, KllSketch(SKETCH_K)]
+            cell[0] += partial_sum
+            cell[1] += count
+            cell[2].merge(sketch)
+    for key, (partial_sum, count, sketch) in cells.items():
+        stream.emit(key, (partial_sum, count, sketch.to_text()))
+    metrics.incr(RECORDS_OUT, len(cells))
+    partials.clear()
+
+
+def main():
+    metrics = JobMetrics('LtvByPetProfileMapper')
+    stream = stream_format.open_stream()
+    partials = {}
+
+    for line in stream_format.read_lines(metrics=metrics):
+        # Format from Sqoop: Cão;Golden;Longo,123.45
+        # After schema change: species;animal_type;fur_type,purchase_value
+        fields = line.split(',')
+        if len(fields) != 2:
+            metrics.incr(MALFORMED_ROWS)
+            continue
+
         pet_profile = fields[0]
-        purchase_value = fields[1]
-        print(f"{pet_profile}\t{purchase_value}")
+        try:
+            value = float(fields[1])
+        except ValueError:
+            metrics.incr(MALFORMED_ROWS)
+            continue
+        if pet_profile.count(';') != 2:
+            metrics.incr(MALFORMED_ROWS)
+            continue
+
+        partial = partials.get(pet_profile)
+        if partial is None:
+            if len(partials) >= MAX_PROFILES:
+                flush(partials, stream, metrics)
+            partial = partials[pet_profile] = [0.0, 0, KllSketch(SKETCH_K)]
+        partial[0] += value
+        partial[1] += 1
+        partial[2].add(value)
+
+    flush(partials, stream, metrics)
+    stream.flush()
+    metrics.flush()
+
+
+if __name__ == "__main__":
+    main()
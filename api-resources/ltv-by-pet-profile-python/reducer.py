@@ -1,29 +1,84 @@
 #!/usr/bin/env python3
 
+import os
 import sys
 
-current_pet_profile = None
-current_sum = 0.0
-
-for line in sys.stdin:
-    line = line.strip()
-    if not line:
-        continue
-
-    try:
-        pet_profile, value_str = line.split('\t')
-        value = float(value_str)
-    except ValueError:
-        sys.stderr.write(f"Skipping malformed input: {line}\n")
-        continue
-
-    if current_pet_profile == pet_profile:
-        current_sum += value
-    else:
-        if current_pet_profile:
-            print(f"{current_pet_profile}\t{current_sum}")
-        current_pet_profile = pet_profile
-        current_sum = value
-
-if current_pet_profile:
-    print(f"{current_pet_profile}\t{current_sum}")
+# Shared modules: shipped with -file (Hadoop) or read from ../common-python
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common-python'))
+import stream_format
+from kll_sketch import KllSketch
+from job_metrics import JobMetrics, clock, RECORDS_OUT, MALFORMED_ROWS, KEYS_PROCESSED
+
+stream = stream_format.open_stream()
+
+# Quantiles emitted next to the totals
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def parse_partial(values):
+    """
+    Parses (sum, count, sketch) from the mapper/combiner (a bare value counts
+    as one purchase).
+    """
+    if len(values) == 3:
+        return float(values[0]), int(values[1]), KllSketch.from_text(values[2])
+    if len(values) == 1:
+        value = float(values[0])
+        sketch = KllSketch()
+        sketch.add(value)
+        return value, 1, sketch
+    raise ValueError(f"expected sum,count,sketch, got {len(values)} values")
+
+
+def reduce_partials(emit, metrics):
+    """
+    Adds up the partial sums and counts and merges the sketches of each
+    profile, calling emit(profile, sum, count, sketch).
+    """
+    def finish(pet_profile, total, count, sketch):
+        started = clock()
+        emit(pet_profile, total, count, sketch)
+        metrics.lap('emit', started)
+        metrics.incr(KEYS_PROCESSED)
+        metrics.incr(RECORDS_OUT)
+        metrics.maybe_flush()
+
+    # Each group holds every partial of one profile, in shuffle order
+    for pet_profile, records in stream.groups(metrics):
+        total_sum = None
+        for values in records:
+            started = clock()
+
+            try:
+                value, count, sketch = parse_partial(values)
+            except ValueError:
+                metrics.incr(MALFORMED_ROWS)
+                metrics.log_sample("Skipping malformed input for %s: %s", pet_profile, values)
+                continue
+            started = metrics.lap('parse', started)
+
+            if total_sum is None:
+                total_sum = value
+                total_count = count
+                total_sketch = sketch
+            else:
+                total_sum += value
+                total_count += count
+                total_sketch.merge(sketch)
+            metrics.lap('compute', started)
+
+        if total_sum is not None:
+            finish(pet_profile, total_sum, total_count, total_sketch)
+
+    stream.flush()
+    metrics.flush()
+
+
+def emit_total(cell, total, count, sketch):
+    # level:path \t sum,count,mean,p50,p90,p99 (see LEVELS in the mapper)
+    quantiles = ','.join(map(str, sketch.quantiles(QUANTILES)))
+    stream.output(cell, f"{total},{count},{total / count},{quantiles}")
+
+
+if __name__ == "__main__":
+    reduce_partials(emit_total, JobMetrics('LtvByPetProfile'))
@@ -0,0 +1,381 @@
+#!/bin/bash
+
+# Funções compartilhadas pelos scripts run_*_pipeline.sh.
+#
+# O engine de execução é escolhido pela variável ENGINE (definida por cada
+# script a partir de <JOB>_ENGINE ou PIPELINE_ENGINE):
+#   hadoop - Sqoop + Hadoop Streaming no cluster (padrão)
+#   local  - psql + local_runner.py, sem JVM/YARN (tenants pequenos)
+
+RESOURCES_DIR=$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)
+ENGINE=${ENGINE:-hadoop}
+LOCAL_DATA_DIR=${LOCAL_DATA_DIR:-/tmp/petshop}
+LOCAL_WORKERS=${LOCAL_WORKERS:-$(nproc 2>/dev/null || echo 1)}
+# Paralelismo da importação (mappers do Sqoop), dos reducers e da carga
+NUM_MAPPERS=${NUM_MAPPERS:-1}
+NUM_REDUCERS=${NUM_REDUCERS:-1}
+LOAD_JOBS=${LOAD_JOBS:-$NUM_REDUCERS}
+# Snapshots binários das recomendações (disco local, lidos com mmap)
+SNAPSHOT_DIR=${SNAPSHOT_DIR:-$LOCAL_DATA_DIR/snapshots}
+# Formato do fluxo mapper -> reducer: text (padrão) ou typedbytes (binário)
+STREAM_FORMAT=${PIPELINE_STREAM_FORMAT:-text}
+# Profiling das tasks (common-python/task_profiler.py): cpu, memory ou cpu,memory (padrão: desligado).
+# Os dumps ficam em /tmp/logs/profiles em cada nó; etapas reaproveitadas pelo cache não são medidas.
+PROFILE=${PIPELINE_PROFILE:-}
+# Cache de etapas: on (padrão) ou off. Só vale para execuções iniciadas pela API,
+# que passa o execution_id da execução atual em PIPELINE_EXECUTION_ID.
+STAGE_CACHE=${PIPELINE_STAGE_CACHE:-on}
+EXECUTION_ID=${PIPELINE_EXECUTION_ID:-}
+# Marcador com a impressão digital da etapa que gerou um diretório de dados
+STAGE_MARKER=_STAGE_FINGERPRINT
+# Etapas executadas por esta chamada (todas por padrão); o pipeline_orchestrator.py
+# executa cada etapa em uma chamada separada
+STAGES=${PIPELINE_STAGES:-import,compute,load}
+
+# Falhas em qualquer ponto de um pipe (ex: hdfs dfs -cat | bulk_loader.py) interrompem o script
+set -o pipefail
+
+case "$ENGINE" in
+    hadoop|local) ;;
+    *) echo "Invalid engine: $ENGINE (expected 'hadoop' or 'local')" >&2; exit 1 ;;
+esac
+
+case "$STREAM_FORMAT" in
+    text|typedbytes) ;;
+    *) echo "Invalid stream format: $STREAM_FORMAT (expected 'text' or 'typedbytes')" >&2; exit 1 ;;
+esac
+
+case "$STAGE_CACHE" in
+    on|off) ;;
+    *) echo "Invalid stage cache: $STAGE_CACHE (expected 'on' or 'off')" >&2; exit 1 ;;
+esac
+
+for mode in ${PROFILE//,/ }; do
+    case "$mode" in
+        cpu|memory) ;;
+        *) echo "Invalid profile mode: $mode (expected 'cpu' and/or 'memory')" >&2; exit 1 ;;
+    esac
+done
+
+for stage in ${STAGES//,/ }; do
+    case "$stage" in
+        import|compute|load) ;;
+        *) echo "Invalid stage: $stage (expected 'import', 'compute' or 'load')" >&2; exit 1 ;;
+    esac
+done
+
+if [[ -n "$EXECUTION_ID" && ! "$EXECUTION_ID" =~ ^[0-9]+$ ]]; then
+    echo "Invalid execution id: $EXECUTION_ID" >&2
+    exit 1
+fi
+
+# Caminho do diretório de dados no engine atual (HDFS ou disco local)
+data_dir() {
+    if [ "$ENGINE" = "local" ]; then
+        echo "$LOCAL_DATA_DIR$1"
+    else
+        echo "$1"
+    fi
+}
+
+# Remove um diretório de dados, se existir
+clean_dir() {
+    if [ "$ENGINE" = "local" ]; then
+        rm -rf "$1"
+    else
+        hdfs dfs -test -d "$1" && hdfs dfs -rm -r "$1" || true
+    fi
+}
+
+# Importa o resultado de uma consulta para o diretório de entrada do job, em
+# NUM_MAPPERS arquivos part-m-NNNNN.
+# Args: consulta (com \$CONDITIONS), coluna de split (inteira), diretório destino
+import_query() {
+    local query=$1
+    local split_by=$2
+    local target_dir=$3
+
+    if [ "$ENGINE" = "local" ]; then
+        # Mesmo formato de texto do Sqoop: campos separados por vírgula, nulos como 'null'.
+        # Cada split é uma consulta paralela sobre o resto da divisão da coluna de split.
+        mkdir -p "$target_dir"
+        local pids=()
+        local split condition
+        for ((split = 0; split < NUM_MAPPERS; split++)); do
+            condition=TRUE
+            if [ "$NUM_MAPPERS" -gt 1 ]; then
+                condition="mod($split_by, $NUM_MAPPERS) = $split"
+            fi
+            psql -X -q -A -t -F ',' -P null=null -v ON_ERROR_STOP=1 \
+                -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME \
+                -c "${query//\$CONDITIONS/$condition}" \
+                -o "$target_dir/$(printf 'part-m-%05d' $split)" &
+            pids+=($!)
+        done
+        local pid
+        for pid in "${pids[@]}"; do
+            wait $pid || return 1
+        done
+    else
+        sqoop import \
+            --connect jdbc:postgresql://$DB_HOST:$DB_PORT/$DB_NAME \
+            --username $DB_USER \
+            --password $DB_PASSWORD \
+            --query "$query" \
+            --target-dir "$target_dir" \
+            --m $NUM_MAPPERS \
+            --split-by "$split_by"
+    fi
+}
+
+# Escreve no stdout o valor (primeira coluna da primeira linha) de uma consulta
+query_value() {
+    psql -X -q -A -t -v ON_ERROR_STOP=1 \
+        -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME \
+        -c "$1" | head -n 1
+}
+
+# Escreve no stdout as linhas de uma consulta, com as colunas separadas por TAB
+query_rows() {
+    psql -X -q -A -t -F $'\t' -v ON_ERROR_STOP=1 \
+        -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME \
+        -c "$1"
+}
+
+# Exporta o resultado de uma consulta para um CSV local (com cabeçalho), usado
+# como arquivo auxiliar dos jobs (enviado com -file / cache distribuído).
+# Args: consulta, arquivo destino
+export_csv() {
+    local query=$1
+    local target_file=$2
+
+    mkdir -p "$(dirname "$target_file")"
+    psql -X -q -v ON_ERROR_STOP=1 \
+        -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME \
+        -c "COPY ($query) TO STDOUT WITH (FORMAT csv, HEADER)" \
+        -o "$target_file"
+}
+
+# Executa o job de streaming com os argumentos do hadoop-streaming, com
+# NUM_REDUCERS reducers (particionados pelo hash da chave). Com STREAM_FORMAT
+# typedbytes, a saída do map, a entrada e a saída do reduce usam typedbytes;
+# a entrada do map (Sqoop) e os part-* finais continuam em texto.
+# Com PROFILE, cada task grava seus dumps de profiling (task_profiler.py).
+run_streaming_job() {
+    local properties=()
+    local format_env=()
+    local profile_env=()
+    if [ "$STREAM_FORMAT" = "typedbytes" ]; then
+        # Opções genéricas (-D) precisam vir antes das opções do streaming
+        properties=(-D stream.map.output=typedbytes -D stream.reduce.input=typedbytes -D stream.reduce.output=typedbytes)
+        format_env=(-cmdenv PETSHOP_STREAM_FORMAT=typedbytes)
+    fi
+    if [ -n "$PROFILE" ]; then
+        profile_env=(-cmdenv PETSHOP_PROFILE=$PROFILE)
+    fi
+    if [ "$ENGINE" = "local" ]; then
+        python3 "$RESOURCES_DIR/local_runner.py" "${properties[@]}" -workers "$LOCAL_WORKERS" "$@" \
+            "${format_env[@]}" "${profile_env[@]}" -numReduceTasks "$NUM_REDUCERS"
+    else
+        hadoop jar $HADOOP_HOME/share/hadoop/tools/lib/hadoop-streaming-*.jar "${properties[@]}" "$@" \
+            "${format_env[@]}" "${profile_env[@]}" -numReduceTasks "$NUM_REDUCERS"
+    fi
+}
+
+# Lista os arquivos part-* de um diretório de saída
+list_parts() {
+    if [ "$ENGINE" = "local" ]; then
+        ls -1 "$1"/part-* 2>/dev/null
+    else
+        hdfs dfs -ls -C "$1/part-*"
+    fi
+}
+
+# Renomeia os arquivos de saída para seguir o padrão 'part-r-NNNNN'
+rename_output() {
+    local part
+    for part in $(list_parts "$1"); do
+        case "$(basename "$part")" in
+            part-r-*) continue ;;
+        esac
+        if [ "$ENGINE" = "local" ]; then
+            mv "$part" "$1/part-r-${part##*/part-}"
+        else
+            hdfs dfs -mv "$part" "$1/part-r-${part##*/part-}"
+        fi
+    done
+}
+
+# Escreve no stdout as primeiras linhas de cada arquivo de um diretório de dados,
+# como amostra da distribuição das chaves (salt_plan.py)
+# Args: diretório, linhas por arquivo
+sample_input() {
+    local part
+    for part in $(list_parts "$1"); do
+        if [ "$ENGINE" = "local" ]; then
+            head -n "$2" "$part"
+        else
+            # O head fecha o pipe antes do fim do arquivo: o erro do cat é esperado
+            { hdfs dfs -cat "$part" 2>/dev/null || true; } | head -n "$2"
+        fi
+    done
+}
+
+# Escreve no stdout o conteúdo da saída do job (todas as partições)
+cat_output() {
+    if [ "$ENGINE" = "local" ]; then
+        cat "$1"/part-r-*
+    else
+        hdfs dfs -cat "$1/part-r-*"
+    fi
+}
+
+# Carrega a saída do job na tabela com COPY. As partições são lidas e
+# enviadas em paralelo (LOAD_JOBS conexões); a troca na tabela de destino
+# acontece em uma única transação.
+# Args: diretório de saída, tabela, opções extras do bulk_loader.py
+load_output() {
+    local output_dir=$1
+    local table=$2
+    shift 2
+
+    local reader=()
+    if [ "$ENGINE" = "hadoop" ]; then
+        reader=(--reader "hdfs dfs -cat")
+    fi
+    python3 "$RESOURCES_DIR/bulk_loader.py" --table "$table" --jobs "$LOAD_JOBS" "${reader[@]}" \
+        -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME "$@" \
+        $(list_parts "$output_dir" | grep '/part-r-')
+}
+
+# Grava o snapshot binário de uma tabela de recomendações em
+# $SNAPSHOT_DIR/<tabela>.snap, substituindo o anterior atomicamente.
+# Args: tabela, diretório de saída do job (sem ele, lê 'pet_id<TAB>valor' do stdin),
+#       opções extras do recommendation_snapshot.py (ex: --named-output)
+build_snapshot() {
+    local table=$1
+    local output_dir=$2
+    local snapshot=(python3 "$RESOURCES_DIR/recommendation_snapshot.py" build --table "$table"
+        --output "$SNAPSHOT_DIR/$table.snap" "${@:3}")
+
+    if [ -z "$output_dir" ]; then
+        "${snapshot[@]}"
+        return
+    fi
+    local reader=()
+    if [ "$ENGINE" = "hadoop" ]; then
+        reader=(--reader "hdfs dfs -cat")
+    fi
+    # stdin vazio: uma saída sem partições gera um snapshot vazio
+    "${snapshot[@]}" "${reader[@]}" $(list_parts "$output_dir" | grep '/part-r-') < /dev/null
+}
+
+# Cache de etapas
+#
+# Cada etapa (import, compute, load) calcula uma impressão digital das suas
+# entradas: estado das tabelas de origem, consultas, scripts e parâmetros. Se
+# a última execução do job terminou com sucesso (COMPLETED) e registrou a mesma
+# impressão para a etapa, a etapa é pulada. As impressões ficam em
+# execution_history.stage_fingerprints da execução atual, inclusive as das
+# etapas puladas, para a próxima execução comparar com elas. Os diretórios de
+# dados guardam também a impressão de quem os gerou ($STAGE_MARKER): um
+# diretório apagado ou reescrito por uma execução fora da API não é reutilizado.
+
+# Sucesso se a etapa foi selecionada em PIPELINE_STAGES
+stage_selected() {
+    [[ ",$STAGES," == *",$1,"* ]]
+}
+
+# Escreve no stdout a impressão digital do diretório gerado por uma etapa anterior,
+# nesta ou em outra chamada do script; falha se a etapa não foi concluída.
+# Args: diretório de dados, etapa
+stage_output() {
+    local marker
+    marker=$(read_stage_marker "$1")
+    if [ -z "$marker" ]; then
+        echo "Missing output of stage '$2' in $1: run that stage first" >&2
+        return 1
+    fi
+    echo "$marker"
+}
+
+# Escreve no stdout a impressão digital (sha256) dos argumentos. Caminhos
+# absolutos de arquivos entram pelo conteúdo (scripts, catálogos).
+fingerprint() {
+    local arg
+    for arg in "$@"; do
+        printf '%s\n' "$arg"
+        if [[ "$arg" == /* && -f "$arg" ]]; then
+            sha256sum < "$arg"
+        fi
+    done | sha256sum | cut -d ' ' -f 1
+}
+
+# Escreve no stdout a quantidade de linhas e a última alteração de cada tabela.
+# Exclusões lógicas e edições atualizam dlastupdate; exclusões físicas, a contagem.
+# Args: tabelas
+table_state() {
+    local table sql=""
+    for table in "$@"; do
+        sql="${sql:+$sql UNION ALL }SELECT '$table', count(*), max(dlastupdate) FROM $table"
+    done
+    query_rows "$sql"
+}
+
+# Escreve no stdout a impressão digital da carga: saída do job, bulk_loader.py (e
+# seus parsers, common-python/job_output.py) e estado das tabelas de destino.
+# Registrada depois da carga, ela já inclui as linhas carregadas; qualquer
+# alteração feita nas tabelas fora do pipeline muda o estado e força uma nova carga.
+# Args: impressão digital do job, tabelas de destino
+load_fingerprint() {
+    fingerprint "$1" "$RESOURCES_DIR/bulk_loader.py" "$RESOURCES_DIR/common-python/job_output.py" \
+        "$(table_state "${@:2}")"
+}
+
+# Escreve no stdout a impressão digital gravada no diretório de dados (vazio se não houver)
+read_stage_marker() {
+    if [ "$ENGINE" = "local" ]; then
+        cat "$1/$STAGE_MARKER" 2>/dev/null || true
+    else
+        hdfs dfs -cat "$1/$STAGE_MARKER" 2>/dev/null || true
+    fi
+}
+
+# Sucesso se a etapa pode ser pulada: a última execução do job (antes da atual)
+# terminou com sucesso com a mesma impressão digital e o diretório de dados da
+# etapa, se houver, ainda tem a saída gerada com ela.
+# Args: etapa, impressão digital, diretório de dados (opcional)
+stage_cached() {
+    local stage=$1
+    local stage_fingerprint=$2
+    local dir=$3
+
+    if [ "$STAGE_CACHE" = "off" ] || [ -z "$EXECUTION_ID" ]; then
+        return 1
+    fi
+    local previous
+    previous=$(query_value "SELECT CASE WHEN status = 'COMPLETED' THEN stage_fingerprints->>'$stage' END FROM execution_history WHERE target_table = (SELECT target_table FROM execution_history WHERE execution_id = $EXECUTION_ID) AND execution_id <> $EXECUTION_ID ORDER BY start_time DESC, execution_id DESC LIMIT 1")
+    if [ "$previous" != "$stage_fingerprint" ]; then
+        return 1
+    fi
+    [ -z "$dir" ] || [ "$(read_stage_marker "$dir")" = "$stage_fingerprint" ]
+}
+
+# Registra a impressão digital da etapa no diretório de dados (se houver) e na execução atual
+# Args: etapa, impressão digital, diretório de dados (opcional)
+record_stage() {
+    local stage=$1
+    local stage_fingerprint=$2
+    local dir=$3
+
+    if [ -n "$dir" ]; then
+        if [ "$ENGINE" = "local" ]; then
+            echo "$stage_fingerprint" > "$dir/$STAGE_MARKER"
+        else
+            echo "$stage_fingerprint" | hdfs dfs -put -f - "$dir/$STAGE_MARKER"
+        fi
+    fi
+    if [ -n "$EXECUTION_ID" ]; then
+        query_value "UPDATE execution_history SET stage_fingerprints = coalesce(stage_fingerprints, '{}'::jsonb) || jsonb_build_object('$stage', '$stage_fingerprint') WHERE execution_id = $EXECUTION_ID" > /dev/null
+    fi
+}
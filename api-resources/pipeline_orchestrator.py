@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Executa os pipelines run_*_pipeline.sh como um grafo de etapas (DAG).
+
+Cada pipeline é dividido nas etapas import -> compute -> load (uma chamada do
+script por etapa, com PIPELINE_STAGES). Etapas independentes rodam ao mesmo
+tempo, limitadas por tipo: importações e cargas disputam conexões com o
+PostgreSQL, e os jobs disputam o cluster (ou os núcleos no engine local).
+A importação do booking-recommendation espera a carga do booking-reference,
+que ela lê pelo JOIN com booking_reference. Com BOOKING_RECOMMENDATION_MODE=fused
+o job combinado do booking-recommendation também calcula e carrega
+booking_reference: o pipeline booking-reference sai do grafo e não há espera.
+
+Uma atualização completa leva o tempo do caminho crítico
+(booking-reference -> booking-recommendation), e não a soma dos pipelines.
+
+Cada pipeline ganha uma linha em execution_history (RUNNING, depois COMPLETED
+ou FAILED), e o execution_id vai para o script em PIPELINE_EXECUTION_ID, como
+nas execuções pela API: o cache de etapas continua valendo. A duração e as
+tentativas de cada etapa ficam em execution_history.stage_timings. Etapas que
+falham são repetidas (--retries); se ainda assim falharem, os pipelines que
+dependem delas não são executados.
+
+Uso:
+    python3 pipeline_orchestrator.py -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME \\
+        [--only booking-recommendation,ltv-by-pet-profile] \\
+        [--imports 2] [--computes 1] [--loads 2] [--retries 1]
+
+--only também inclui as dependências dos pipelines escolhidos. A senha vem de
+PGPASSWORD, como nos demais comandos psql dos pipelines.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+RESOURCES_DIR = os.path.dirname(os.path.realpath(__file__))
+
+# Etapas de cada pipeline, na ordem em que dependem umas das outras
+STAGES = ('import', 'compute', 'load')
+
+# pipeline -> (script, tabela em execution_history, pipelines cuja carga precede a importação)
+PIPELINES = {
+    'vaccine-recommendation': ('run_vaccine_pipeline.sh', 'vaccine_recommendation', ()),
+    'booking-reference': ('run_booking_reference_pipeline.sh', 'booking_reference', ()),
+    'booking-recommendation': ('run_booking_recommendation_pipeline.sh', 'booking_recommendation', ('booking-reference',)),
+    'ltv-by-pet-profile': ('run_ltv_by_pet_profile_pipeline.sh', 'ltv_by_pet_profile', ()),
+}
+
+# Modo do run_booking_recommendation_pipeline.sh (repassado ao script pelo ambiente)
+BOOKING_MODE = os.environ.get('BOOKING_RECOMMENDATION_MODE', 'full')
+
+# Linhas finais da saída de uma etapa guardadas em error_message quando ela falha
+ERROR_TAIL_LINES = 50
+
+# Execuções RUNNING mais novas que isso bloqueiam o início (como o guard da API)
+RUNNING_TIMEOUT_MINUTES = 10
+
+
+class OrchestratorError(Exception):
+    pass
+
+
+def pipeline_graph(booking_mode):
+    """
+    PIPELINES no modo do booking-recommendation: no fused, o próprio job combinado
+    grava booking_reference, então o booking-reference não roda separado.
+    """
+    if booking_mode != 'fused':
+        return PIPELINES
+    graph = {pipeline: spec for pipeline, spec in PIPELINES.items() if pipeline != 'booking-reference'}
+    script, table, _ = graph['booking-recommendation']
+    graph['booking-recommendation'] = (script, table, ())
+    return graph
+
+
+class Database:
+    """Comandos SQL via psql, como nos scripts dos pipelines."""
+
+    def __init__(self, options):
+        self.command = ['psql', '-X', '-q', '-A', '-t', '-v', 'ON_ERROR_STOP=1']
+        for flag, value in (('-h', options.host), ('-p', options.port), ('-U', options.user), ('-d', options.dbname)):
+            if value:
+                self.command += [flag, value]
+
+    def query(self, sql):
+        """Linhas do resultado, com as colunas separadas por TAB."""
+        result = subprocess.run(self.command + ['-F', '\t', '-c', sql], capture_output=True, encoding='utf-8')
+        if result.returncode != 0:
+            raise OrchestratorError(f"psql failed with exit code {result.returncode}: {result.stderr.strip()}")
+        return [line.split('\t') for line in result.stdout.splitlines() if line]
+
+
+def quote(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+class Stage:
+
+    def __init__(self, pipeline, name):
+        self.pipeline = pipeline
+        self.name = name
+        self.upstream = []
+        self.done = threading.Event()
+        self.status = None
+        self.seconds = 0.0
+        self.attempts = 0
+        self.output = deque(maxlen=ERROR_TAIL_LINES)
+
+    @property
+    def label(self):
+        return f"{self.pipeline}:{self.name}"
+
+
+class Orchestrator:
+
+    def __init__(self, options, database):
+        self.options = options
+        self.database = database
+        self.limits = {
+            'import': threading.Semaphore(options.imports),
+            'compute': threading.Semaphore(options.computes),
+            'load': threading.Semaphore(options.loads),
+        }
+        self.print_lock = threading.Lock()
+        self.graph = pipeline_graph(BOOKING_MODE)
+        self.pipelines = select_pipelines(options.only, self.graph)
+        self.stages = {}
+        for pipeline in self.pipelines:
+            previous = None
+            for name in STAGES:
+                stage = Stage(pipeline, name)
+                if previous:
+                    stage.upstream.append(previous)
+                previous = stage
+                self.stages[stage.label] = stage
+        for pipeline in self.pipelines:
+            for dependency in self.graph[pipeline][2]:
+                self.stages[f"{pipeline}:import"].upstream.append(self.stages[f"{dependency}:load"])
+        self.execution_ids = {}
+
+    def log(self, label, message):
+        with self.print_lock:
+            print(f"[{label}] {message}", flush=True)
+
+    def start_executions(self):
+        tables = [self.graph[pipeline][1] for pipeline in self.pipelines]
+        running = self.database.query(
+            f"SELECT target_table, execution_id FROM execution_history WHERE status = 'RUNNING' "
+            f"AND target_table IN ({', '.join(map(quote, tables))}) "
+            f"AND start_time > NOW() - INTERVAL '{RUNNING_TIMEOUT_MINUTES} minutes'")
+        if running:
+            raise OrchestratorError("Pipelines already running: " + ', '.join(f"{table} (execution {execution_id})"
+                                                                             for table, execution_id in running))
+        for pipeline in self.pipelines:
+            [[execution_id]] = self.database.query(
+                f"INSERT INTO execution_history (target_table, start_time, status) "
+                f"VALUES ({quote(self.graph[pipeline][1])}, NOW(), 'RUNNING') RETURNING execution_id")
+            self.execution_ids[pipeline] = execution_id
+
+    def finish_execution(self, pipeline):
+        stages = [self.stages[f"{pipeline}:{name}"] for name in STAGES]
+        failed = [stage for stage in stages if stage.status != 'COMPLETED']
+        if not failed:
+            update = "status = 'COMPLETED'"
+        else:
+            stage = failed[0]
+            if stage.status == 'SKIPPED':
+                message = f"Stage {stage.name} not run: an upstream stage failed"
+            else:
+                message = f"Stage {stage.name} failed after {stage.attempts} attempt(s):\n" + ''.join(stage.output)
+            update = f"status = 'FAILED', error_message = {quote(message)}"
+        self.database.query(f"UPDATE execution_history SET end_time = NOW(), {update} "
+                            f"WHERE execution_id = {self.execution_ids[pipeline]}")
+
+    def record_timing(self, stage):
+        timing = json.dumps({stage.name: {'seconds': round(stage.seconds, 3), 'attempts': stage.attempts,
+                                          'status': stage.status}})
+        self.database.query(f"UPDATE execution_history SET stage_timings = coalesce(stage_timings, '{{}}'::jsonb) "
+                            f"|| {quote(timing)}::jsonb WHERE execution_id = {self.execution_ids[stage.pipeline]}")
+
+    def run_attempt(self, stage):
+        script = os.path.join(RESOURCES_DIR, self.graph[stage.pipeline][0])
+        env = dict(os.environ, PIPELINE_STAGES=stage.name,
+                   PIPELINE_EXECUTION_ID=self.execution_ids[stage.pipeline])
+        command = ['bash', script, self.options.user or '', self.options.host or '', self.options.dbname or '',
+                   os.environ.get('PGPASSWORD', ''), self.options.port or '']
+        process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   encoding='utf-8', errors='replace')
+        for line in process.stdout:
+            stage.output.append(line)
+            if self.options.verbose:
+                self.log(stage.label, line.rstrip('\n'))
+        return process.wait()
+
+    def run_stage(self, stage):
+        for upstream in stage.upstream:
+            upstream.done.wait()
+        try:
+            if any(upstream.status != 'COMPLETED' for upstream in stage.upstream):
+                stage.status = 'SKIPPED'
+                self.log(stage.label, "skipped: an upstream stage failed")
+                return
+            with self.limits[stage.name]:
+                started = time.monotonic()
+                for attempt in range(1, self.options.retries + 2):
+                    stage.attempts = attempt
+                    stage.output.clear()
+                    self.log(stage.label, f"started (attempt {attempt})")
+                    returncode = self.run_attempt(stage)
+                    if returncode == 0:
+                        stage.status = 'COMPLETED'
+                        break
+                    self.log(stage.label, f"failed with exit code {returncode}")
+                    if attempt <= self.options.retries:
+                        time.sleep(self.options.retry_delay * attempt)
+                else:
+                    stage.status = 'FAILED'
+                    sys.stderr.write(''.join(stage.output))
+                stage.seconds = time.monotonic() - started
+            self.log(stage.label, f"{stage.status.lower()} in {stage.seconds:.1f}s")
+            self.record_timing(stage)
+        except BaseException:
+            stage.status = stage.status or 'FAILED'
+            raise
+        finally:
+            stage.done.set()
+
+    def run(self):
+        self.start_executions()
+        started = time.monotonic()
+        threads = [threading.Thread(target=self.run_stage, args=(stage,), name=stage.label)
+                   for stage in self.stages.values()]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            for pipeline in self.pipelines:
+                self.finish_execution(pipeline)
+        elapsed = time.monotonic() - started
+        self.report(elapsed)
+        return all(stage.status == 'COMPLETED' for stage in self.stages.values())
+
+    def report(self, elapsed):
+        total = sum(stage.seconds for stage in self.stages.values())
+        print(f"{'stage':40} {'status':10} {'attempts':>8} {'seconds':>9}")
+        for stage in self.stages.values():
+            print(f"{stage.label:40} {stage.status:10} {stage.attempts:8d} {stage.seconds:9.1f}")
+        print(f"Finished in {elapsed:.1f}s ({total:.1f}s of stage time)")
+
+
+def select_pipelines(only, graph=PIPELINES):
+    """Pipelines escolhidos e suas dependências, em ordem de dependência."""
+    if not only:
+        return list(graph)
+    selected = set()
+    pending = list(only)
+    while pending:
+        pipeline = pending.pop()
+        if pipeline not in selected:
+            selected.add(pipeline)
+            pending.extend(graph[pipeline][2])
+    return [pipeline for pipeline in graph if pipeline in selected]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Executa os pipelines como um grafo de etapas.', add_help=False)
+    parser.add_argument('--help', action='help', help='Mostra esta ajuda')
+    parser.add_argument('--only', help='Pipelines separados por vírgula (padrão: todos), com suas dependências')
+    parser.add_argument('--imports', type=int, default=2, help='Importações simultâneas')
+    parser.add_argument('--computes', type=int, default=1, help='Jobs MapReduce simultâneos')
+    parser.add_argument('--loads', type=int, default=2, help='Cargas simultâneas')
+    parser.add_argument('--retries', type=int, default=1, help='Novas tentativas de uma etapa que falhou')
+    parser.add_argument('--retry-delay', type=float, default=30, help='Espera (s) antes da nova tentativa, multiplicada pela tentativa')
+    parser.add_argument('--verbose', action='store_true', help='Mostra a saída das etapas com o prefixo [pipeline:etapa]')
+    parser.add_argument('-h', '--host', help='Host do PostgreSQL')
+    parser.add_argument('-p', '--port', help='Porta do PostgreSQL')
+    parser.add_argument('-U', '--user', help='Usuário do PostgreSQL')
+    parser.add_argument('-d', '--dbname', help='Banco de dados')
+    options = parser.parse_args(argv)
+    if options.only:
+        options.only = options.only.split(',')
+        unknown = [pipeline for pipeline in options.only if pipeline not in PIPELINES]
+        if unknown:
+            parser.error(f"unknown pipeline(s): {', '.join(unknown)} (expected {', '.join(PIPELINES)})")
+        if BOOKING_MODE == 'fused' and 'booking-reference' in options.only:
+            parser.error("booking-reference is computed and loaded by booking-recommendation "
+                         "when BOOKING_RECOMMENDATION_MODE=fused")
+    for name in ('imports', 'computes', 'loads'):
+        if getattr(options, name) < 1:
+            parser.error(f"--{name} must be >= 1")
+    if options.retries < 0:
+        parser.error('--retries must be >= 0')
+    return options
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    try:
+        succeeded = Orchestrator(options, Database(options)).run()
+    except OrchestratorError as e:
+        sys.stderr.write(f"ERROR: {e}\n")
+        return 1
+    return 0 if succeeded else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Snapshot binário das recomendações por pet_id, para consultas sem o banco.
+
+Os pipelines de booking e de vacinas gravam, além da carga no PostgreSQL, um
+arquivo ordenado por pet_id com registros de tamanho fixo. Quem dispara
+notificações abre o arquivo com mmap (BookingSnapshot / VaccineSnapshot) e
+responde consultas pontuais ou em lote por busca binária, sem uma consulta
+por pet no banco e sem carregar o arquivo inteiro em memória.
+
+Formato (little-endian):
+    cabeçalho   magic (8 bytes), versão, pets, entradas, bytes do catálogo (u32)
+    booking     pets x (pet_id i64, dia sugerido i32, frequência média i32)
+    vaccine     pets x (pet_id i64, primeira entrada u32, quantidade u32)
+                entradas x (vaccine_reference_id i32, dia sugerido i32)
+                catálogo JSON: {vaccine_reference_id: [nome, descrição, obrigatória]}
+
+Os dias são contados desde 1970-01-01, como no date_codec. O arquivo é
+substituído atomicamente (os.replace): leitores abertos continuam vendo a
+versão antiga até reabrirem.
+
+Uso:
+    python3 recommendation_snapshot.py build --table booking_recommendation \\
+        --output /tmp/petshop/snapshots/booking_recommendation.snap \\
+        [--reader 'hdfs dfs -cat'] [--named-output recommendation] /petshop/output_x/part-r-*
+
+    python3 recommendation_snapshot.py lookup ARQUIVO.snap 12 57 1033
+
+    from recommendation_snapshot import open_snapshot
+    with open_snapshot('booking_recommendation.snap') as snapshot:
+        snapshot.get(12)                  # BookingRecommendation ou None
+        snapshot.get_many([12, 57, 99])   # {pet_id: recomendação} dos encontrados
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import date
+
+# Parsers e leitura da saída dos jobs, os mesmos da carga (bulk_loader.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'common-python'))
+from job_output import (ReadError, named_output_parser, parse_booking_recommendation, parse_rows,
+                        parse_vaccine_recommendation, read_inputs)
+
+VERSION = 1
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+HEADER = struct.Struct('<8sIIII')
+BOOKING_RECORD = struct.Struct('<qii')
+VACCINE_INDEX = struct.Struct('<qII')
+VACCINE_ENTRY = struct.Struct('<ii')
+PET_ID = struct.Struct('<q')
+
+BOOKING_MAGIC = b'PSBOOKR\x00'
+VACCINE_MAGIC = b'PSVACCR\x00'
+
+BookingRecommendation = namedtuple('BookingRecommendation', 'pet_id suggested_date average_frequency_days')
+VaccineRecommendation = namedtuple(
+    'VaccineRecommendation', 'vaccine_reference_id vaccine_name description mandatory suggested_date')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def to_day(iso_date):
+    return date.fromisoformat(iso_date).toordinal() - EPOCH_ORDINAL
+
+
+def from_day(day):
+    return date.fromordinal(day + EPOCH_ORDINAL).isoformat()
+
+
+# --- Escrita ---
+
+def booking_snapshot(rows):
+    """Conteúdo do snapshot de booking; um pet repetido fica com a última linha."""
+    records = {}
+    for pet_id, suggested_date, average_frequency_days in rows:
+        records[int(pet_id)] = (to_day(suggested_date), int(average_frequency_days))
+    parts = [HEADER.pack(BOOKING_MAGIC, VERSION, len(records), 0, 0)]
+    parts += [BOOKING_RECORD.pack(pet_id, *records[pet_id]) for pet_id in sorted(records)]
+    return b''.join(parts)
+
+
+def vaccine_snapshot(rows):
+    """Conteúdo do snapshot de vacinas: índice por pet, entradas e catálogo."""
+    entries_by_pet = {}
+    catalog = {}
+    for pet_id, vaccine_name, description, mandatory, suggested_date, vaccine_reference_id in rows:
+        vaccine_reference_id = int(vaccine_reference_id)
+        entries_by_pet.setdefault(int(pet_id), set()).add((to_day(suggested_date), vaccine_reference_id))
+        catalog[vaccine_reference_id] = [vaccine_name, description, mandatory == 't']
+
+    index = []
+    entries = []
+    for pet_id in sorted(entries_by_pet):
+        # Por pet, em ordem de data sugerida
+        pet_entries = sorted(entries_by_pet[pet_id])
+        index.append(VACCINE_INDEX.pack(pet_id, len(entries), len(pet_entries)))
+        entries += [VACCINE_ENTRY.pack(vaccine_reference_id, day) for day, vaccine_reference_id in pet_entries]
+    catalog_json = json.dumps(catalog, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    header = HEADER.pack(VACCINE_MAGIC, VERSION, len(index), len(entries), len(catalog_json))
+    return b''.join([header] + index + entries + [catalog_json])
+
+
+# Tabela -> (parser das linhas do reducer, montagem do snapshot)
+SNAPSHOTS = {
+    'booking_recommendation': (parse_booking_recommendation, booking_snapshot),
+    'vaccine_recommendation': (parse_vaccine_recommendation, vaccine_snapshot),
+}
+
+
+def write_atomic(path, data):
+    """Grava em um arquivo temporário no mesmo diretório e troca com os.replace."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def build(table, lines, output, named_output=None):
+    parser, assemble = SNAPSHOTS[table]
+    stats = {'rows': 0, 'rejected': 0}
+    data = assemble(parse_rows(lines, named_output_parser(parser, named_output), stats))
+    write_atomic(output, data)
+    stats['bytes'] = len(data)
+    return stats
+
+
+# --- Leitura ---
+
+class _PetIds:
+    """Sequência dos pet_ids do índice, lida direto do mmap (para o bisect)."""
+
+    def __init__(self, buffer, offset, record_size, count):
+        self.buffer = buffer
+        self.offset = offset
+        self.record_size = record_size
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        return PET_ID.unpack_from(self.buffer, self.offset + position * self.record_size)[0]
+
+
+class _Snapshot:
+    """
+    Arquivo mapeado com um índice de registros de tamanho fixo ordenado por
+    pet_id; decode(posição) monta a recomendação do registro na posição.
+    """
+
+    def __init__(self, path, magic, record, decode):
+        self.path = path
+        self._record = decode
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise SnapshotError(f"{path}: file too short for a snapshot header")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            file_magic, version, self.count, self.entry_count, self.catalog_size = HEADER.unpack_from(self._mmap, 0)
+            if file_magic != magic:
+                raise SnapshotError(f"{path}: not a {type(self).__name__} file")
+            if version != VERSION:
+                raise SnapshotError(f"{path}: unsupported snapshot version {version}")
+            if len(self._mmap) != self._expected_size(record):
+                raise SnapshotError(f"{path}: truncated snapshot ({len(self._mmap)} bytes)")
+        except SnapshotError:
+            self._mmap.close()
+            raise
+        self._pet_ids = _PetIds(self._mmap, HEADER.size, record.size, self.count)
+
+    def _expected_size(self, record):
+        return HEADER.size + self.count * record.size
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, pet_id):
+        return self._position(pet_id, 0) >= 0
+
+    def _position(self, pet_id, lo):
+        """Posição do pet no índice (>= lo) ou -1."""
+        position = bisect_left(self._pet_ids, pet_id, lo)
+        if position < self.count and self._pet_ids[position] == pet_id:
+            return position
+        return -1
+
+    def _seek(self, pet_id, lo):
+        """
+        Primeira posição >= lo com pet_id >= o procurado, por busca exponencial
+        a partir de lo: em lotes ordenados o próximo pet costuma estar perto.
+        """
+        step = 1
+        hi = lo
+        while hi < self.count and self._pet_ids[hi] < pet_id:
+            lo = hi + 1
+            hi += step
+            step *= 2
+        return bisect_left(self._pet_ids, pet_id, lo, min(hi, self.count))
+
+    def get(self, pet_id, default=None):
+        position = self._position(int(pet_id), 0)
+        return self._record(position) if position >= 0 else default
+
+    def get_many(self, pet_ids):
+        """{pet_id: recomendação} dos pets encontrados; as buscas avançam em ordem pelo índice."""
+        found = {}
+        lo = 0
+        for pet_id in sorted({int(pet_id) for pet_id in pet_ids}):
+            lo = self._seek(pet_id, lo)
+            if lo == self.count:
+                break
+            if self._pet_ids[lo] == pet_id:
+                found[pet_id] = self._record(lo)
+        return found
+
+
+class BookingSnapshot(_Snapshot):
+
+    MAGIC = BOOKING_MAGIC
+
+    def __init__(self, path):
+        super().__init__(path, BOOKING_MAGIC, BOOKING_RECORD, self._recommendation)
+
+    def _recommendation(self, position):
+        pet_id, day, average_frequency_days = BOOKING_RECORD.unpack_from(
+            self._mmap, HEADER.size + position * BOOKING_RECORD.size)
+        return BookingRecommendation(pet_id, from_day(day), average_frequency_days)
+
+
+class VaccineSnapshot(_Snapshot):
+
+    MAGIC = VACCINE_MAGIC
+
+    def __init__(self, path):
+        super().__init__(path, VACCINE_MAGIC, VACCINE_INDEX, self._recommendations)
+        self._entries_offset = HEADER.size + self.count * VACCINE_INDEX.size
+        catalog_offset = self._entries_offset + self.entry_count * VACCINE_ENTRY.size
+        catalog = json.loads(self._mmap[catalog_offset:catalog_offset + self.catalog_size].decode('utf-8'))
+        self.catalog = {int(vaccine_reference_id): tuple(fields) for vaccine_reference_id, fields in catalog.items()}
+
+    def _expected_size(self, record):
+        return (HEADER.size + self.count * record.size
+                + self.entry_count * VACCINE_ENTRY.size + self.catalog_size)
+
+    def _recommendations(self, position):
+        _, first, count = VACCINE_INDEX.unpack_from(self._mmap, HEADER.size + position * VACCINE_INDEX.size)
+        recommendations = []
+        for offset in range(self._entries_offset + first * VACCINE_ENTRY.size,
+                            self._entries_offset + (first + count) * VACCINE_ENTRY.size,
+                            VACCINE_ENTRY.size):
+            vaccine_reference_id, day = VACCINE_ENTRY.unpack_from(self._mmap, offset)
+            vaccine_name, description, mandatory = self.catalog[vaccine_reference_id]
+            recommendations.append(
+                VaccineRecommendation(vaccine_reference_id, vaccine_name, description, mandatory, from_day(day)))
+        return recommendations
+
+
+def open_snapshot(path):
+    """Abre o snapshot com a classe indicada pelo magic do arquivo."""
+    with open(path, 'rb') as f:
+        magic = f.read(len(BOOKING_MAGIC))
+    for snapshot_class in (BookingSnapshot, VaccineSnapshot):
+        if magic == snapshot_class.MAGIC:
+            return snapshot_class(path)
+    raise SnapshotError(f"{path}: not a recommendation snapshot")
+
+
+# --- Linha de comando ---
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Gera ou consulta snapshots binários de recomendações.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help='Gera o snapshot a partir da saída do job')
+    build_parser.add_argument('--table', required=True, choices=sorted(SNAPSHOTS), help='Tabela de recomendações')
+    build_parser.add_argument('--output', required=True, help='Arquivo do snapshot')
+    build_parser.add_argument('--reader', help="Comando que lê cada arquivo (ex: 'hdfs dfs -cat'); padrão: arquivo local")
+    build_parser.add_argument('--named-output', help="Lê só as linhas 'NOME:pet_id' da saída nomeada NOME")
+    build_parser.add_argument('files', nargs='*', help="Arquivos 'pet_id\\tvalor' (padrão: stdin)")
+
+    lookup_parser = commands.add_parser('lookup', help='Consulta pets no snapshot (uma linha JSON por pet)')
+    lookup_parser.add_argument('snapshot', help='Arquivo do snapshot')
+    lookup_parser.add_argument('pet_ids', nargs='+', type=int, help='pet_ids')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    try:
+        if options.command == 'build':
+            stats = build(options.table, read_inputs(options.files, options.reader), options.output,
+                          options.named_output)
+            print(f"Snapshot {options.output}: {stats['rows']} rows, {stats['bytes']} bytes "
+                  f"({stats['rejected']} rejected)")
+        else:
+            with open_snapshot(options.snapshot) as snapshot:
+                found = snapshot.get_many(options.pet_ids)
+            for pet_id in options.pet_ids:
+                recommendation = found.get(pet_id)
+                if isinstance(recommendation, list):
+                    recommendation = [item._asdict() for item in recommendation]
+                elif recommendation is not None:
+                    recommendation = recommendation._asdict()
+                print(json.dumps({'pet_id': pet_id, 'recommendation': recommendation}, ensure_ascii=False))
+    except (SnapshotError, ReadError, OSError) as e:
+        sys.stderr.write(f"ERROR: {e}\n")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
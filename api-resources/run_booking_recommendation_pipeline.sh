@@ -42,69 +42,273 @@ DB_NAME=$3
 DB_PASSWORD=$4
 DB_PORT=$5
 
+# Engine: hadoop (padrão) ou local, por job ou para todos via PIPELINE_ENGINE
+ENGINE=${BOOKING_RECOMMENDATION_ENGINE:-${PIPELINE_ENGINE:-hadoop}}
+source "$(dirname "$0")/pipeline_lib.sh"
+
 # Vars
-INPUT_DIR=/petshop/input_booking_recommendation
-OUTPUT_DIR=/petshop/output_booking_recommendation
+INPUT_DIR=$(data_dir /petshop/input_booking_recommendation)
+PARTIAL_DIR=$(data_dir /petshop/partial_booking_recommendation)
+OUTPUT_DIR=$(data_dir /petshop/output_booking_recommendation)
 MAPPER_PATH=/api-resources/booking-recommendation-python/mapper.py
 REDUCER_PATH=/api-resources/booking-recommendation-python/reducer.py
+MERGE_MAPPER_PATH=/api-resources/booking-fused-python/merge_mapper.py
+MERGE_REDUCER_PATH=/api-resources/booking-fused-python/merge_reducer.py
+COMMON_DIR=/api-resources/common-python
+SALTS_FILE=$LOCAL_DATA_DIR/booking_salts.csv
+# Linhas lidas do início de cada arquivo de entrada para o plano de sal (modo fused)
+SALT_SAMPLE_LINES=${BOOKING_SALT_SAMPLE_LINES:-100000}
+# full: recalcula todos os pets; incremental: só os afetados desde a última execução concluída;
+# fused: como full, mas com uma única importação e um par de jobs que também recalcula booking_reference
+MODE=${BOOKING_RECOMMENDATION_MODE:-full}
 export PGPASSWORD=$DB_PASSWORD
 
+case "$MODE" in
+    full|incremental) ;;
+    fused)
+        # Uma importação e um par de jobs (perfil#sal, depois merge por perfil) para
+        # booking_reference e booking_recommendation
+        MAPPER_PATH=/api-resources/booking-fused-python/mapper.py
+        REDUCER_PATH=/api-resources/booking-fused-python/reducer.py
+        ;;
+    *) echo "Invalid mode: $MODE (expected 'full', 'incremental' or 'fused')" >&2; exit 1 ;;
+esac
+
+# Cálculo: streaming (mapper.py/reducer.py, padrão) ou numpy (vectorized.py: os mesmos part-*
+# calculados com arrays em um só processo; apenas no engine local, modos full e incremental)
+COMPUTE=${BOOKING_RECOMMENDATION_COMPUTE:-streaming}
+VECTORIZED_PATH=/api-resources/booking-recommendation-python/vectorized.py
+
+case "$COMPUTE" in
+    streaming) ;;
+    numpy)
+        if [ "$ENGINE" != "local" ] || [ "$MODE" = "fused" ]; then
+            echo "The numpy compute requires the local engine and mode 'full' or 'incremental'" >&2
+            exit 1
+        fi
+        ;;
+    *) echo "Invalid compute: $COMPUTE (expected 'streaming' or 'numpy')" >&2; exit 1 ;;
+esac
+
 echo "Starting booking recommendation pipeline..."
 
-# Clean HDFS input dir
-echo "Cleaning HDFS input directory..."
-hdfs dfs -test -d $INPUT_DIR && hdfs dfs -rm -r $INPUT_DIR || true
-
-# Sqoop import
-echo "Importing data from PostgreSQL with Sqoop..."
-sqoop import \
-    --connect jdbc:postgresql://$DB_HOST:$DB_PORT/$DB_NAME \
-    --username $DB_USER \
-    --password $DB_PASSWORD \
-    --query "SELECT b.pet_id, b.booking_date, br.frequency_days FROM booking b JOIN pet p ON b.pet_id = p.pet_id JOIN booking_reference br ON p.species = br.species AND p.animal_type = br.animal_type AND p.fur_type = br.fur_type WHERE b.status = 'Realizado' AND p.ignore_recommendation = false AND p.nenabled = TRUE AND b.nenabled = TRUE AND br.nenabled = TRUE AND \$CONDITIONS" \
-    --target-dir $INPUT_DIR \
-    --m 1 \
-    --split-by p.pet_id
-
-# Clean HDFS output dir
-echo "Cleaning HDFS output directory..."
-hdfs dfs -test -d $OUTPUT_DIR && hdfs dfs -rm -r $OUTPUT_DIR || true
-
-# Ensures that the scripts are executable.
-chmod +x $MAPPER_PATH
-chmod +x $REDUCER_PATH
-
-# Run Hadoop job
-echo "Running Hadoop MapReduce job..."
-hadoop jar $HADOOP_HOME/share/hadoop/tools/lib/hadoop-streaming-*.jar \
-    -file $MAPPER_PATH \
-    -mapper 'python3 mapper.py' \
-    -file $REDUCER_PATH \
-    -reducer 'python3 reducer.py' \
-    -input $INPUT_DIR \
-    -output $OUTPUT_DIR
-
-# Renomeia o arquivo de saída para seguir o padrão 'part-r-00000'
-hdfs dfs -mv $OUTPUT_DIR/part-00000 $OUTPUT_DIR/part-r-00000
+# Marca d'água: início da última execução concluída (a execução atual ainda está RUNNING).
+# Alterações feitas durante aquela execução são reprocessadas, nunca perdidas.
+if [ "$MODE" = "incremental" ]; then
+    WATERMARK=$(query_value "SELECT max(start_time) FROM execution_history WHERE target_table = 'booking_recommendation' AND status = 'COMPLETED'")
+    if [ -z "$WATERMARK" ]; then
+        echo "No completed execution found, falling back to full mode."
+        MODE=full
+    fi
+fi
+
+INCREMENTAL_FILTER=""
+if [ "$MODE" = "incremental" ]; then
+    # Pets afetados: pet ou agendamentos alterados desde a marca d'água, recomendações
+    # já vencidas, recomendações de pets sem perfil de referência (serão removidas) e
+    # pets elegíveis (2+ agendamentos realizados) ainda sem recomendação
+    AFFECTED_PETS="SELECT pet_id FROM pet WHERE dlastupdate > '$WATERMARK'::timestamptz \
+UNION SELECT pet_id FROM booking WHERE dlastupdate > '$WATERMARK'::timestamptz \
+UNION SELECT pet_id FROM booking_recommendation WHERE suggested_date < CURRENT_DATE \
+UNION SELECT r.pet_id FROM booking_recommendation r JOIN pet p ON r.pet_id = p.pet_id LEFT JOIN booking_reference br ON p.species = br.species AND p.animal_type = br.animal_type AND p.fur_type = br.fur_type AND br.nenabled = TRUE WHERE br.booking_reference_id IS NULL \
+UNION SELECT b.pet_id FROM booking b WHERE b.status = 'Realizado' AND b.nenabled = TRUE AND NOT EXISTS (SELECT 1 FROM booking_recommendation r WHERE r.pet_id = b.pet_id) GROUP BY b.pet_id HAVING count(*) >= 2"
+    INCREMENTAL_FILTER="AND p.pet_id IN ($AFFECTED_PETS)"
+    echo "Incremental mode: changes since $WATERMARK"
+fi
+
+if stage_selected import; then
+    # Import (Sqoop no cluster, psql no engine local), pulado se as tabelas de origem
+    # não mudaram desde a última execução concluída
+    if [ "$MODE" = "fused" ]; then
+        # Mesma leitura do job de referência (todos os pets), com a marca de pets sem recomendação
+        IMPORT_QUERY="SELECT b.pet_id, CONCAT(p.species, ';', p.animal_type, ';', p.fur_type) AS pet_profile, to_char(b.booking_date, 'YYYY-MM-DD HH24:MI:SS') AS booking_date, CASE WHEN p.ignore_recommendation = false THEN 0 ELSE 1 END AS ignore_recommendation FROM booking b JOIN pet p ON b.pet_id = p.pet_id WHERE b.status = 'Realizado' AND p.nenabled = TRUE AND b.nenabled = TRUE AND \$CONDITIONS"
+        SPLIT_BY=b.pet_id
+    else
+        IMPORT_QUERY="SELECT b.pet_id, to_char(b.booking_date, 'YYYY-MM-DD HH24:MI:SS') AS booking_date, br.frequency_days FROM booking b JOIN pet p ON b.pet_id = p.pet_id JOIN booking_reference br ON p.species = br.species AND p.animal_type = br.animal_type AND p.fur_type = br.fur_type WHERE b.status = 'Realizado' AND p.ignore_recommendation = false AND p.nenabled = TRUE AND b.nenabled = TRUE AND br.nenabled = TRUE $INCREMENTAL_FILTER AND \$CONDITIONS"
+        SPLIT_BY=p.pet_id
+    fi
+    IMPORT_FINGERPRINT=$(fingerprint "$IMPORT_QUERY" "$(table_state booking pet booking_reference)")
+    if stage_cached import $IMPORT_FINGERPRINT $INPUT_DIR; then
+        echo "Source tables unchanged, reusing imported data."
+    else
+        # Clean HDFS input dir
+        echo "Cleaning HDFS input directory..."
+        clean_dir $INPUT_DIR
+
+        echo "Importing data from PostgreSQL ($ENGINE engine)..."
+        import_query "$IMPORT_QUERY" $SPLIT_BY $INPUT_DIR
+    fi
+    record_stage import $IMPORT_FINGERPRINT $INPUT_DIR
+fi
+
+if stage_selected compute; then
+    IMPORT_FINGERPRINT=$(stage_output $INPUT_DIR import)
+    if [ "$COMPUTE" = "numpy" ] && ! python3 -c 'import numpy' 2>/dev/null; then
+        echo "NumPy not available, falling back to the streaming job."
+        COMPUTE=streaming
+    fi
+    JOB_MODULES=()
+    MERGE_JOB_ARGS=()
+    if [ "$COMPUTE" = "numpy" ]; then
+        JOB_ARGS=(
+            $VECTORIZED_PATH
+            --reducers $NUM_REDUCERS
+            --output $OUTPUT_DIR
+            $INPUT_DIR
+        )
+        # Módulos importados pelo vectorized.py (no streaming, os -file já estão em JOB_ARGS)
+        JOB_MODULES=($COMMON_DIR/date_codec.py $COMMON_DIR/job_metrics.py $COMMON_DIR/local_job.py)
+    elif [ "$MODE" = "fused" ]; then
+        # Plano de sal: perfis quentes na amostra da entrada são divididos (por pet_id)
+        # entre vários reducers no primeiro job; o segundo job mescla os histogramas
+        # parciais de cada perfil e repassa as recomendações, já finais
+        echo "Sampling input for the salt plan..."
+        sample_input $INPUT_DIR $SALT_SAMPLE_LINES \
+            | python3 $COMMON_DIR/salt_plan.py --field 1 --reducers $NUM_REDUCERS --output $SALTS_FILE
+
+        # Ordenação secundária: chave composta (perfil#sal, pet_id, segundo), particionada só
+        # pelo perfil#sal e ordenada com pet_id e segundo numéricos; o reducer recebe as visitas
+        # de cada pet já em ordem. Opções genéricas (-D) precisam vir antes das opções do streaming.
+        JOB_ARGS=(
+            -D stream.num.map.output.key.fields=3
+            -D mapreduce.partition.keypartitioner.options=-k1,1
+            -D mapreduce.job.output.key.comparator.class=org.apache.hadoop.mapreduce.lib.partition.KeyFieldBasedComparator
+            -D 'mapreduce.partition.keycomparator.options=-k1,1 -k2,2n -k3,3n'
+            -partitioner org.apache.hadoop.mapred.lib.KeyFieldBasedPartitioner
+            -file $MAPPER_PATH
+            -mapper 'python3 mapper.py'
+            -file $REDUCER_PATH
+            -reducer 'python3 reducer.py'
+            -file $COMMON_DIR/booking_frequency.py
+            -file $COMMON_DIR/date_codec.py
+            -file $COMMON_DIR/gap_histogram.py
+            -file $COMMON_DIR/job_metrics.py
+            -file $COMMON_DIR/task_profiler.py
+            -file $COMMON_DIR/salt_plan.py
+            -file $COMMON_DIR/stream_format.py
+            -file $SALTS_FILE
+            -input $INPUT_DIR
+            -output $PARTIAL_DIR
+        )
+        MERGE_JOB_ARGS=(
+            -file $MERGE_MAPPER_PATH
+            -mapper 'python3 merge_mapper.py'
+            -file $MERGE_REDUCER_PATH
+            -reducer 'python3 merge_reducer.py'
+            -file $COMMON_DIR/gap_histogram.py
+            -file $COMMON_DIR/job_metrics.py
+            -file $COMMON_DIR/task_profiler.py
+            -file $COMMON_DIR/stream_format.py
+            -input $PARTIAL_DIR
+            -output $OUTPUT_DIR
+        )
+    else
+        # Ordenação secundária: chave composta (pet_id, segundo), particionada só pelo
+        # pet_id e ordenada com o segundo numérico; o reducer recebe as visitas de cada
+        # pet já em ordem. Opções genéricas (-D) precisam vir antes das opções do streaming.
+        JOB_ARGS=(
+            -D stream.num.map.output.key.fields=2
+            -D mapreduce.partition.keypartitioner.options=-k1,1
+            -D mapreduce.job.output.key.comparator.class=org.apache.hadoop.mapreduce.lib.partition.KeyFieldBasedComparator
+            -D 'mapreduce.partition.keycomparator.options=-k1,1 -k2,2n'
+            -partitioner org.apache.hadoop.mapred.lib.KeyFieldBasedPartitioner
+            -file $MAPPER_PATH
+            -mapper 'python3 mapper.py'
+            -file $REDUCER_PATH
+            -reducer 'python3 reducer.py'
+            -file $COMMON_DIR/booking_frequency.py
+            -file $COMMON_DIR/date_codec.py
+            -file $COMMON_DIR/gap_histogram.py
+            -file $COMMON_DIR/job_metrics.py
+            -file $COMMON_DIR/task_profiler.py
+            -file $COMMON_DIR/stream_format.py
+            -input $INPUT_DIR
+            -output $OUTPUT_DIR
+        )
+    fi
+    # As datas sugeridas partem de hoje quando a última visita já passou: a saída muda com o dia
+    COMPUTE_FINGERPRINT=$(fingerprint $IMPORT_FINGERPRINT "$(date +%F)" "${JOB_ARGS[@]}" "${MERGE_JOB_ARGS[@]}" "${JOB_MODULES[@]}")
+    if stage_cached compute $COMPUTE_FINGERPRINT $OUTPUT_DIR; then
+        echo "Job inputs unchanged, reusing MapReduce output."
+    else
+        # Clean HDFS output dirs
+        echo "Cleaning HDFS output directories..."
+        clean_dir $PARTIAL_DIR
+        clean_dir $OUTPUT_DIR
+
+        if [ "$COMPUTE" = "numpy" ]; then
+            echo "Running vectorized job (NumPy)..."
+            python3 "${JOB_ARGS[@]}"
+        else
+            # Ensures that the scripts are executable.
+            chmod +x $MAPPER_PATH
+            chmod +x $REDUCER_PATH
+
+            # Run MapReduce job
+            echo "Running MapReduce job ($ENGINE engine)..."
+            # A chave composta só é comparada campo a campo em texto: o job não usa typedbytes
+            STREAM_FORMAT=text run_streaming_job "${JOB_ARGS[@]}"
+
+            if [ "$MODE" = "fused" ]; then
+                chmod +x $MERGE_MAPPER_PATH
+                chmod +x $MERGE_REDUCER_PATH
+
+                # Histogramas parciais por sal -> referência por perfil; recomendações repassadas
+                echo "Running merge MapReduce job ($ENGINE engine)..."
+                run_streaming_job "${MERGE_JOB_ARGS[@]}"
+                clean_dir $PARTIAL_DIR
+            fi
+        fi
+
+        # Renomeia os arquivos de saída para seguir o padrão 'part-r-NNNNN'
+        rename_output $OUTPUT_DIR
+    fi
+    record_stage compute $COMPUTE_FINGERPRINT $OUTPUT_DIR
+fi
 
 # Load results to Redis
 # echo "Loading results to Redis..."
 # redis-cli -h localhost KEYS "recommendation:booking:pet:*" | xargs -r redis-cli -h localhost DEL
-# hdfs dfs -cat $OUTPUT_DIR/part-r-00000 | while IFS=$'\t' read -r pet_id values; do
+# cat_output $OUTPUT_DIR | while IFS=$'\t' read -r pet_id values; do
 #     sug_date=$(echo $values | cut -d',' -f1)
 #     avg_freq=$(echo $values | cut -d',' -f2)
 #     redis-cli -h localhost HSET "recommendation:booking:pet:$pet_id" suggested_date "$sug_date" average_frequency_days "$avg_freq"
 # done
 
-# Load results to PostgreSQL
-echo "Loading results to PostgreSQL..."
-psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -c "TRUNCATE TABLE booking_recommendation;"
+if stage_selected load; then
+    # Load results to PostgreSQL, pulado se a saída do job e as tabelas são as da última execução concluída
+    COMPUTE_FINGERPRINT=$(stage_output $OUTPUT_DIR compute)
+    LOAD_TABLES=booking_recommendation
+    if [ "$MODE" = "fused" ]; then
+        LOAD_TABLES="booking_reference booking_recommendation"
+    fi
+    if stage_cached load "$(load_fingerprint $COMPUTE_FINGERPRINT $LOAD_TABLES)"; then
+        echo "Results unchanged, skipping load."
+    else
+        echo "Loading results to PostgreSQL..."
+        if [ "$MODE" = "incremental" ]; then
+            load_output $OUTPUT_DIR booking_recommendation --upsert --scope "$AFFECTED_PETS"
+        elif [ "$MODE" = "fused" ]; then
+            # As duas saídas nomeadas do job combinado estão nos mesmos part-r-*
+            load_output $OUTPUT_DIR booking_reference --truncate --named-output reference
+            load_output $OUTPUT_DIR booking_recommendation --truncate --named-output recommendation
+        else
+            load_output $OUTPUT_DIR booking_recommendation --truncate
+        fi
+    fi
+    record_stage load "$(load_fingerprint $COMPUTE_FINGERPRINT $LOAD_TABLES)"
 
-hdfs dfs -cat $OUTPUT_DIR/part-r-00000 | while IFS=$'\t' read -r pet_id values; do
-  suggested_date=$(echo $values | cut -d',' -f1)
-  avg_freq_days=$(echo $values | cut -d',' -f2)
-  
-  psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -c "INSERT INTO booking_recommendation (pet_id, suggested_date, average_frequency_days) VALUES ($pet_id, '$suggested_date', $avg_freq_days);"
-done
+    # Snapshot binário por pet_id para os consumidores (notificações) não consultarem o banco
+    echo "Writing recommendation snapshot..."
+    if [ "$MODE" = "incremental" ]; then
+        # A saída só tem os pets afetados: o snapshot vem da tabela já mesclada
+        query_rows "SELECT pet_id, concat(suggested_date, ',', average_frequency_days) FROM booking_recommendation" \
+            | build_snapshot booking_recommendation
+    elif [ "$MODE" = "fused" ]; then
+        build_snapshot booking_recommendation $OUTPUT_DIR --named-output recommendation
+    else
+        build_snapshot booking_recommendation $OUTPUT_DIR
+    fi
+fi
 
 echo "Pipeline finished successfully!"
\ No newline at end of file
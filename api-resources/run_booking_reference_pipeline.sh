@@ -42,61 +42,128 @@ DB_NAME=$3
 DB_PASSWORD=$4
 DB_PORT=$5
 
+# Engine: hadoop (padrão) ou local, por job ou para todos via PIPELINE_ENGINE
+ENGINE=${BOOKING_REFERENCE_ENGINE:-${PIPELINE_ENGINE:-hadoop}}
+source "$(dirname "$0")/pipeline_lib.sh"
+
 # Vars
-INPUT_DIR=/petshop/input_booking_reference
-OUTPUT_DIR=/petshop/output_booking_reference
+INPUT_DIR=$(data_dir /petshop/input_booking_reference)
+PARTIAL_DIR=$(data_dir /petshop/partial_booking_reference)
+OUTPUT_DIR=$(data_dir /petshop/output_booking_reference)
 MAPPER_PATH=/api-resources/booking-recommendation-generate-reference-python/mapper.py
 REDUCER_PATH=/api-resources/booking-recommendation-generate-reference-python/reducer.py
+MERGE_MAPPER_PATH=/api-resources/booking-recommendation-generate-reference-python/merge_mapper.py
+MERGE_REDUCER_PATH=/api-resources/booking-recommendation-generate-reference-python/merge_reducer.py
+COMMON_DIR=/api-resources/common-python
+SALTS_FILE=$LOCAL_DATA_DIR/booking_reference_salts.csv
+# Linhas lidas do início de cada arquivo de entrada para o plano de sal
+SALT_SAMPLE_LINES=${BOOKING_REFERENCE_SALT_SAMPLE_LINES:-100000}
 export PGPASSWORD=$DB_PASSWORD
 
 echo "Starting booking reference pipeline..."
 
-# Clean HDFS input dir
-echo "Cleaning HDFS input directory..."
-hdfs dfs -test -d $INPUT_DIR && hdfs dfs -rm -r $INPUT_DIR || true
-
-# Sqoop import
-echo "Importing data from PostgreSQL with Sqoop..."
-sqoop import \
-    --connect jdbc:postgresql://$DB_HOST:$DB_PORT/$DB_NAME \
-    --username $DB_USER \
-    --password $DB_PASSWORD \
-    --query "SELECT b.pet_id, CONCAT(p.species, ';', p.animal_type, ';', p.fur_type) AS pet_profile, b.booking_date FROM booking b JOIN pet p ON b.pet_id = p.pet_id WHERE b.status = 'Realizado' AND p.nenabled = TRUE AND b.nenabled = TRUE AND \$CONDITIONS" \
-    --target-dir $INPUT_DIR \
-    --m 1 \
-    --split-by b.pet_id
-
-# Clean HDFS output dir
-echo "Cleaning HDFS output directory..."
-hdfs dfs -test -d $OUTPUT_DIR && hdfs dfs -rm -r $OUTPUT_DIR || true
-
-# Ensures that the scripts are executable.
-chmod +x $MAPPER_PATH
-chmod +x $REDUCER_PATH
-
-# Run Hadoop job
-echo "Running Hadoop MapReduce job..."
-hadoop jar $HADOOP_HOME/share/hadoop/tools/lib/hadoop-streaming-*.jar \
-    -file $MAPPER_PATH \
-    -mapper 'python3 mapper.py' \
-    -file $REDUCER_PATH \
-    -reducer 'python3 reducer.py' \
-    -input $INPUT_DIR \
-    -output $OUTPUT_DIR
-
-# Renomeia o arquivo de saída para seguir o padrão 'part-r-00000'
-hdfs dfs -mv $OUTPUT_DIR/part-00000 $OUTPUT_DIR/part-r-00000
-
-# Load results to PostgreSQL
-echo "Loading results to PostgreSQL..."
-psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -c "TRUNCATE TABLE booking_reference;"
-
-hdfs dfs -cat $OUTPUT_DIR/part-r-00000 | while IFS=$'\t' read -r pet_profile frequency_days; do
-  species=$(echo $pet_profile | cut -d';' -f1)
-  animal_type=$(echo $pet_profile | cut -d';' -f2)
-  fur_type=$(echo $pet_profile | cut -d';' -f3)
-  
-  psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -c "INSERT INTO booking_reference (species, animal_type, fur_type, frequency_days) VALUES ('$species', '$animal_type', '$fur_type', $frequency_days);"
-done
+if stage_selected import; then
+    # Import (Sqoop no cluster, psql no engine local), pulado se as tabelas de origem
+    # não mudaram desde a última execução concluída
+    IMPORT_QUERY="SELECT b.pet_id, CONCAT(p.species, ';', p.animal_type, ';', p.fur_type) AS pet_profile, to_char(b.booking_date, 'YYYY-MM-DD HH24:MI:SS') AS booking_date FROM booking b JOIN pet p ON b.pet_id = p.pet_id WHERE b.status = 'Realizado' AND p.nenabled = TRUE AND b.nenabled = TRUE AND \$CONDITIONS"
+    IMPORT_FINGERPRINT=$(fingerprint "$IMPORT_QUERY" "$(table_state booking pet)")
+    if stage_cached import $IMPORT_FINGERPRINT $INPUT_DIR; then
+        echo "Source tables unchanged, reusing imported data."
+    else
+        # Clean HDFS input dir
+        echo "Cleaning HDFS input directory..."
+        clean_dir $INPUT_DIR
+
+        echo "Importing data from PostgreSQL ($ENGINE engine)..."
+        import_query "$IMPORT_QUERY" b.pet_id $INPUT_DIR
+    fi
+    record_stage import $IMPORT_FINGERPRINT $INPUT_DIR
+fi
+
+if stage_selected compute; then
+    IMPORT_FINGERPRINT=$(stage_output $INPUT_DIR import)
+
+    # Plano de sal: perfis quentes na amostra da entrada são divididos (por pet_id)
+    # entre vários reducers no primeiro job; o segundo job mescla os histogramas
+    # parciais de cada perfil, com o mesmo resultado de um único reducer por perfil
+    echo "Sampling input for the salt plan..."
+    sample_input $INPUT_DIR $SALT_SAMPLE_LINES \
+        | python3 $COMMON_DIR/salt_plan.py --field 1 --reducers $NUM_REDUCERS --output $SALTS_FILE
+
+    # Ordenação secundária: chave composta (perfil#sal, pet_id, dia), particionada só pelo
+    # perfil#sal e ordenada com pet_id e dia numéricos; o reducer recebe os dias de cada
+    # pet já em ordem. Opções genéricas (-D) precisam vir antes das opções do streaming.
+    JOB_ARGS=(
+        -D stream.num.map.output.key.fields=3
+        -D mapreduce.partition.keypartitioner.options=-k1,1
+        -D mapreduce.job.output.key.comparator.class=org.apache.hadoop.mapreduce.lib.partition.KeyFieldBasedComparator
+        -D 'mapreduce.partition.keycomparator.options=-k1,1 -k2,2n -k3,3n'
+        -partitioner org.apache.hadoop.mapred.lib.KeyFieldBasedPartitioner
+        -file $MAPPER_PATH
+        -mapper 'python3 mapper.py'
+        -file $REDUCER_PATH
+        -reducer 'python3 reducer.py'
+        -file $COMMON_DIR/date_codec.py
+        -file $COMMON_DIR/gap_histogram.py
+        -file $COMMON_DIR/job_metrics.py
+        -file $COMMON_DIR/task_profiler.py
+        -file $COMMON_DIR/salt_plan.py
+        -file $COMMON_DIR/stream_format.py
+        -file $SALTS_FILE
+        -input $INPUT_DIR
+        -output $PARTIAL_DIR
+    )
+    MERGE_JOB_ARGS=(
+        -file $MERGE_MAPPER_PATH
+        -mapper 'python3 merge_mapper.py'
+        -file $MERGE_REDUCER_PATH
+        -reducer 'python3 merge_reducer.py'
+        -file $COMMON_DIR/gap_histogram.py
+        -file $COMMON_DIR/job_metrics.py
+        -file $COMMON_DIR/task_profiler.py
+        -file $COMMON_DIR/stream_format.py
+        -input $PARTIAL_DIR
+        -output $OUTPUT_DIR
+    )
+    COMPUTE_FINGERPRINT=$(fingerprint $IMPORT_FINGERPRINT "${JOB_ARGS[@]}" "${MERGE_JOB_ARGS[@]}")
+    if stage_cached compute $COMPUTE_FINGERPRINT $OUTPUT_DIR; then
+        echo "Job inputs unchanged, reusing MapReduce output."
+    else
+        # Clean HDFS output dirs
+        echo "Cleaning HDFS output directories..."
+        clean_dir $PARTIAL_DIR
+        clean_dir $OUTPUT_DIR
+
+        # Ensures that the scripts are executable.
+        chmod +x $MAPPER_PATH
+        chmod +x $REDUCER_PATH
+        chmod +x $MERGE_MAPPER_PATH
+        chmod +x $MERGE_REDUCER_PATH
+
+        # Run MapReduce jobs: histogramas parciais por sal e merge por perfil
+        echo "Running MapReduce job ($ENGINE engine)..."
+        # A chave composta só é comparada campo a campo em texto: o primeiro job não usa typedbytes
+        STREAM_FORMAT=text run_streaming_job "${JOB_ARGS[@]}"
+        echo "Running merge MapReduce job ($ENGINE engine)..."
+        run_streaming_job "${MERGE_JOB_ARGS[@]}"
+        clean_dir $PARTIAL_DIR
+
+        # Renomeia os arquivos de saída para seguir o padrão 'part-r-NNNNN'
+        rename_output $OUTPUT_DIR
+    fi
+    record_stage compute $COMPUTE_FINGERPRINT $OUTPUT_DIR
+fi
+
+if stage_selected load; then
+    # Load results to PostgreSQL, pulado se a saída do job e a tabela são as da última execução concluída
+    COMPUTE_FINGERPRINT=$(stage_output $OUTPUT_DIR compute)
+    if stage_cached load "$(load_fingerprint $COMPUTE_FINGERPRINT booking_reference)"; then
+        echo "Results unchanged, skipping load."
+    else
+        echo "Loading results to PostgreSQL..."
+        load_output $OUTPUT_DIR booking_reference --truncate
+    fi
+    record_stage load "$(load_fingerprint $COMPUTE_FINGERPRINT booking_reference)"
+fi
 
 echo "Pipeline finished successfully!"
\ No newline at end of file
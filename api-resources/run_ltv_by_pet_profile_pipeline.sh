@@ -42,61 +42,91 @@ DB_NAME=$3
 DB_PASSWORD=$4
 DB_PORT=$5
 
+# Engine: hadoop (padrão) ou local, por job ou para todos via PIPELINE_ENGINE
+ENGINE=${LTV_BY_PET_PROFILE_ENGINE:-${PIPELINE_ENGINE:-hadoop}}
+source "$(dirname "$0")/pipeline_lib.sh"
+
 # Vars
-INPUT_DIR=/petshop/input_ltv
-OUTPUT_DIR=/petshop/output_ltv
+INPUT_DIR=$(data_dir /petshop/input_ltv)
+OUTPUT_DIR=$(data_dir /petshop/output_ltv)
 MAPPER_PATH=/api-resources/ltv-by-pet-profile-python/mapper.py
 REDUCER_PATH=/api-resources/ltv-by-pet-profile-python/reducer.py
+COMBINER_PATH=/api-resources/ltv-by-pet-profile-python/combiner.py
+COMMON_DIR=/api-resources/common-python
 export PGPASSWORD=$DB_PASSWORD
 
 echo "Starting LTV by pet profile pipeline..."
 
-# Clean HDFS input dir
-echo "Cleaning HDFS input directory..."
-hdfs dfs -test -d $INPUT_DIR && hdfs dfs -rm -r $INPUT_DIR || true
-
-# Sqoop import
-echo "Importing data from PostgreSQL with Sqoop..."
-sqoop import \
-    --connect jdbc:postgresql://$DB_HOST:$DB_PORT/$DB_NAME \
-    --username $DB_USER \
-    --password $DB_PASSWORD \
-    --query "SELECT CONCAT(p.species, ';', p.animal_type, ';', p.fur_type) AS perfil_pet, (hc.quantity * hc.price) AS valor_compra FROM purchase hc JOIN pet p ON hc.tutor_id = p.tutor_id WHERE hc.nenabled = TRUE AND p.nenabled = TRUE AND \$CONDITIONS" \
-    --target-dir $INPUT_DIR \
-    --m 1 \
-    --split-by hc.purchase_id
-
-# Clean HDFS output dir
-echo "Cleaning HDFS output directory..."
-hdfs dfs -test -d $OUTPUT_DIR && hdfs dfs -rm -r $OUTPUT_DIR || true
-
-# Ensures that the scripts are executable.
-chmod +x $MAPPER_PATH
-chmod +x $REDUCER_PATH
-
-# Run Hadoop job
-echo "Running Hadoop MapReduce job..."
-hadoop jar $HADOOP_HOME/share/hadoop/tools/lib/hadoop-streaming-*.jar \
-    -file $MAPPER_PATH \
-    -mapper 'python3 mapper.py' \
-    -file $REDUCER_PATH \
-    -reducer 'python3 reducer.py' \
-    -input $INPUT_DIR \
-    -output $OUTPUT_DIR
-
-# Renomeia o arquivo de saída para seguir o padrão 'part-r-00000'
-hdfs dfs -mv $OUTPUT_DIR/part-00000 $OUTPUT_DIR/part-r-00000
-
-# Load results to PostgreSQL
-echo "Loading results to PostgreSQL..."
-psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -c "TRUNCATE TABLE ltv_by_pet_profile;"
-
-hdfs dfs -cat $OUTPUT_DIR/part-r-00000 | while IFS=$'\t' read -r pet_profile total_value; do
-  species=$(echo $pet_profile | cut -d';' -f1)
-  animal_type=$(echo $pet_profile | cut -d';' -f2)
-  fur_type=$(echo $pet_profile | cut -d';' -f3)
-  
-  psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -c "INSERT INTO ltv_by_pet_profile (species, animal_type, fur_type, total_value) VALUES ('$species', '$animal_type', '$fur_type', $total_value);"
-done
+if stage_selected import; then
+    # Import (Sqoop no cluster, psql no engine local), pulado se as tabelas de origem
+    # não mudaram desde a última execução concluída
+    IMPORT_QUERY="SELECT CONCAT(p.species, ';', p.animal_type, ';', p.fur_type) AS perfil_pet, (hc.quantity * hc.price) AS valor_compra FROM purchase hc JOIN pet p ON hc.tutor_id = p.tutor_id WHERE hc.nenabled = TRUE AND p.nenabled = TRUE AND \$CONDITIONS"
+    IMPORT_FINGERPRINT=$(fingerprint "$IMPORT_QUERY" "$(table_state purchase pet)")
+    if stage_cached import $IMPORT_FINGERPRINT $INPUT_DIR; then
+        echo "Source tables unchanged, reusing imported data."
+    else
+        # Clean HDFS input dir
+        echo "Cleaning HDFS input directory..."
+        clean_dir $INPUT_DIR
+
+        echo "Importing data from PostgreSQL ($ENGINE engine)..."
+        import_query "$IMPORT_QUERY" hc.purchase_id $INPUT_DIR
+    fi
+    record_stage import $IMPORT_FINGERPRINT $INPUT_DIR
+fi
+
+if stage_selected compute; then
+    IMPORT_FINGERPRINT=$(stage_output $INPUT_DIR import)
+    JOB_ARGS=(
+        -file $MAPPER_PATH
+        -mapper 'python3 mapper.py'
+        -file $REDUCER_PATH
+        -reducer 'python3 reducer.py'
+        -file $COMBINER_PATH
+        -combiner 'python3 combiner.py'
+        -file $COMMON_DIR/job_metrics.py
+        -file $COMMON_DIR/task_profiler.py
+        -file $COMMON_DIR/kll_sketch.py
+        -file $COMMON_DIR/stream_format.py
+        -input $INPUT_DIR
+        -output $OUTPUT_DIR
+    )
+    COMPUTE_FINGERPRINT=$(fingerprint $IMPORT_FINGERPRINT "${JOB_ARGS[@]}")
+    if stage_cached compute $COMPUTE_FINGERPRINT $OUTPUT_DIR; then
+        echo "Job inputs unchanged, reusing MapReduce output."
+    else
+        # Clean HDFS output dir
+        echo "Cleaning HDFS output directory..."
+        clean_dir $OUTPUT_DIR
+
+        # Ensures that the scripts are executable.
+        chmod +x $MAPPER_PATH
+        chmod +x $REDUCER_PATH
+        chmod +x $COMBINER_PATH
+
+        # Run MapReduce job
+        echo "Running MapReduce job ($ENGINE engine)..."
+        run_streaming_job "${JOB_ARGS[@]}"
+
+        # Renomeia os arquivos de saída para seguir o padrão 'part-r-NNNNN'
+        rename_output $OUTPUT_DIR
+    fi
+    record_stage compute $COMPUTE_FINGERPRINT $OUTPUT_DIR
+fi
+
+if stage_selected load; then
+    # Load results to PostgreSQL, pulado se a saída do job e as tabelas são as da última execução concluída.
+    # A saída traz todas as células do rollup: o perfil completo vai para ltv_by_pet_profile
+    # e o cubo inteiro (com contagens e médias) para ltv_rollup
+    COMPUTE_FINGERPRINT=$(stage_output $OUTPUT_DIR compute)
+    if stage_cached load "$(load_fingerprint $COMPUTE_FINGERPRINT ltv_by_pet_profile ltv_rollup)"; then
+        echo "Results unchanged, skipping load."
+    else
+        echo "Loading results to PostgreSQL..."
+        load_output $OUTPUT_DIR ltv_by_pet_profile --truncate
+        load_output $OUTPUT_DIR ltv_rollup --truncate
+    fi
+    record_stage load "$(load_fingerprint $COMPUTE_FINGERPRINT ltv_by_pet_profile ltv_rollup)"
+fi
 
 echo "Pipeline finished successfully!"
\ No newline at end of file
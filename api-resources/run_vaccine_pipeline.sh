@@ -42,63 +42,113 @@ DB_NAME=$3
 DB_PASSWORD=$4
 DB_PORT=$5
 
+# Engine: hadoop (padrão) ou local, por job ou para todos via PIPELINE_ENGINE
+ENGINE=${VACCINE_RECOMMENDATION_ENGINE:-${PIPELINE_ENGINE:-hadoop}}
+source "$(dirname "$0")/pipeline_lib.sh"
+
 # Vars
-INPUT_DIR=/petshop/input_vaccine_recommendation
-OUTPUT_DIR=/petshop/output_vaccine_recommendation
+INPUT_DIR=$(data_dir /petshop/input_vaccine_recommendation)
+OUTPUT_DIR=$(data_dir /petshop/output_vaccine_recommendation)
 MAPPER_PATH=/api-resources/vaccine-recommendation-python/mapper.py
 REDUCER_PATH=/api-resources/vaccine-recommendation-python/reducer.py
+COMMON_DIR=/api-resources/common-python
+CATALOG_FILE=$LOCAL_DATA_DIR/vaccine_catalog.csv
+EQUIVALENCE_PAIRS_FILE=$LOCAL_DATA_DIR/vaccine_equivalence_pairs.csv
+EQUIVALENCE_FILE=$LOCAL_DATA_DIR/vaccine_equivalence.csv
+# Data de referência única para todos os reducers da execução
+AS_OF=$(date +%F)
 export PGPASSWORD=$DB_PASSWORD
 
 echo "Starting vaccine recommendation pipeline..."
 
-# Clean HDFS input dir
-echo "Cleaning HDFS input directory..."
-hdfs dfs -test -d $INPUT_DIR && hdfs dfs -rm -r $INPUT_DIR || true
-
-# Sqoop import
-echo "Importing data from PostgreSQL with Sqoop..."
-sqoop import \
-    --connect jdbc:postgresql://$DB_HOST:$DB_PORT/$DB_NAME \
-    --username $DB_USER \
-    --password $DB_PASSWORD \
-    --query "SELECT p.pet_id, p.species, p.birth_date, vr.vaccine_reference_id, vr.vaccine_name, vr.description, vr.target_species, vr.first_dose_age_months, vr.booster_interval_months, vr.mandatory, vc.application_date FROM pet p INNER JOIN vaccine_reference vr ON p.species::text = vr.target_species::text OR vr.target_species::text = 'Ambos' LEFT JOIN vaccination_record vc ON p.pet_id = vc.pet_id AND vr.vaccine_reference_id = vc.vaccine_reference_id WHERE p.ignore_recommendation = false AND p.nenabled = TRUE AND vr.nenabled = TRUE AND \$CONDITIONS" \
-    --target-dir $INPUT_DIR \
-    --m 1 \
-    --split-by p.pet_id
-
-# Clean HDFS output dir
-echo "Cleaning HDFS output directory..."
-hdfs dfs -test -d $OUTPUT_DIR && hdfs dfs -rm -r $OUTPUT_DIR || true
-
-# Ensures that the scripts are executable.
-chmod +x $MAPPER_PATH
-chmod +x $REDUCER_PATH
-
-# Run Hadoop job
-echo "Running Hadoop MapReduce job..."
-hadoop jar $HADOOP_HOME/share/hadoop/tools/lib/hadoop-streaming-*.jar \
-    -file $MAPPER_PATH \
-    -mapper 'python3 mapper.py' \
-    -file $REDUCER_PATH \
-    -reducer 'python3 reducer.py' \
-    -input $INPUT_DIR \
-    -output $OUTPUT_DIR
-
-# Renomeia o arquivo de saída para seguir o padrão 'part-r-00000'
-hdfs dfs -mv $OUTPUT_DIR/part-00000 $OUTPUT_DIR/part-r-00000
-
-# Load results to PostgreSQL
-echo "Loading results to PostgreSQL..."
-psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -c "TRUNCATE TABLE vaccine_recommendation;"
-
-hdfs dfs -cat $OUTPUT_DIR/part-r-00000 | while IFS=$'\t' read -r pet_id values; do
-  vaccine_name=$(echo $values | cut -d',' -f1)
-  description=$(echo $values | cut -d',' -f2)
-  mandatory=$(echo $values | cut -d',' -f3)
-  sug_date=$(echo $values | cut -d',' -f4)
-  vaccine_reference_id=$(echo $values | cut -d',' -f5)
-  
-  psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -c "INSERT INTO vaccine_recommendation (pet_id, vaccine_name, description, mandatory, suggested_date, vaccine_reference_id) VALUES ($pet_id, '$vaccine_name', '$description', $mandatory, '$sug_date', $vaccine_reference_id);"
-done
+if stage_selected import; then
+    # Catálogo de vacinas: exportado uma vez e enviado às tasks com -file, em vez de
+    # ser repetido em cada linha de pet pelo JOIN da importação
+    echo "Exporting vaccine catalog..."
+    export_csv \
+        "SELECT vaccine_reference_id, vaccine_name, description, target_species, first_dose_age_months, booster_interval_months, mandatory FROM vaccine_reference WHERE nenabled = TRUE ORDER BY vaccine_reference_id" \
+        $CATALOG_FILE
+
+    # Equivalências: o grafo é reduzido uma vez a um índice vacina -> classe (union-find)
+    echo "Building vaccine equivalence index..."
+    export_csv \
+        "SELECT vaccine_id, equivalent_vaccine_id FROM vaccine_equivalence WHERE nenabled = TRUE" \
+        $EQUIVALENCE_PAIRS_FILE
+    python3 $COMMON_DIR/vaccine_equivalence.py $EQUIVALENCE_PAIRS_FILE $EQUIVALENCE_FILE
+
+    # Import (Sqoop no cluster, psql no engine local), pulado se as tabelas de origem
+    # não mudaram desde a última execução concluída
+    IMPORT_QUERY="SELECT p.pet_id, p.species, p.birth_date, vc.vaccine_reference_id, vc.application_date FROM pet p LEFT JOIN vaccination_record vc ON p.pet_id = vc.pet_id WHERE p.ignore_recommendation = false AND p.nenabled = TRUE AND \$CONDITIONS"
+    IMPORT_FINGERPRINT=$(fingerprint "$IMPORT_QUERY" "$(table_state pet vaccination_record)")
+    if stage_cached import $IMPORT_FINGERPRINT $INPUT_DIR; then
+        echo "Source tables unchanged, reusing imported data."
+    else
+        # Clean HDFS input dir
+        echo "Cleaning HDFS input directory..."
+        clean_dir $INPUT_DIR
+
+        echo "Importing data from PostgreSQL ($ENGINE engine)..."
+        import_query "$IMPORT_QUERY" p.pet_id $INPUT_DIR
+    fi
+    record_stage import $IMPORT_FINGERPRINT $INPUT_DIR
+fi
+
+if stage_selected compute; then
+    IMPORT_FINGERPRINT=$(stage_output $INPUT_DIR import)
+    # O catálogo, as equivalências e a data de referência entram na impressão do job
+    # pelos argumentos (-file pelo conteúdo, -cmdenv pelo valor)
+    JOB_ARGS=(
+        -file $MAPPER_PATH
+        -mapper 'python3 mapper.py'
+        -file $REDUCER_PATH
+        -reducer 'python3 reducer.py'
+        -file $COMMON_DIR/date_codec.py
+        -file $COMMON_DIR/job_metrics.py
+        -file $COMMON_DIR/task_profiler.py
+        -file $COMMON_DIR/stream_format.py
+        -file $COMMON_DIR/vaccine_equivalence.py
+        -file $CATALOG_FILE
+        -file $EQUIVALENCE_FILE
+        -cmdenv VACCINE_AS_OF=$AS_OF
+        -input $INPUT_DIR
+        -output $OUTPUT_DIR
+    )
+    COMPUTE_FINGERPRINT=$(fingerprint $IMPORT_FINGERPRINT "${JOB_ARGS[@]}")
+    if stage_cached compute $COMPUTE_FINGERPRINT $OUTPUT_DIR; then
+        echo "Job inputs unchanged, reusing MapReduce output."
+    else
+        # Clean HDFS output dir
+        echo "Cleaning HDFS output directory..."
+        clean_dir $OUTPUT_DIR
+
+        # Ensures that the scripts are executable.
+        chmod +x $MAPPER_PATH
+        chmod +x $REDUCER_PATH
+
+        # Run MapReduce job
+        echo "Running MapReduce job ($ENGINE engine)..."
+        run_streaming_job "${JOB_ARGS[@]}"
+
+        # Renomeia os arquivos de saída para seguir o padrão 'part-r-NNNNN'
+        rename_output $OUTPUT_DIR
+    fi
+    record_stage compute $COMPUTE_FINGERPRINT $OUTPUT_DIR
+fi
+
+if stage_selected load; then
+    # Load results to PostgreSQL, pulado se a saída do job e a tabela são as da última execução concluída
+    COMPUTE_FINGERPRINT=$(stage_output $OUTPUT_DIR compute)
+    if stage_cached load "$(load_fingerprint $COMPUTE_FINGERPRINT vaccine_recommendation)"; then
+        echo "Results unchanged, skipping load."
+    else
+        echo "Loading results to PostgreSQL..."
+        load_output $OUTPUT_DIR vaccine_recommendation --truncate
+    fi
+    record_stage load "$(load_fingerprint $COMPUTE_FINGERPRINT vaccine_recommendation)"
+
+    # Snapshot binário por pet_id para os consumidores (notificações) não consultarem o banco
+    echo "Writing recommendation snapshot..."
+    build_snapshot vaccine_recommendation $OUTPUT_DIR
+fi
 
 echo "Pipeline finished successfully!"
\ No newline at end of file
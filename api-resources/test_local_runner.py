@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import local_runner
+from local_runner import KeySpec, key_field_order, key_field_partition, parse_key_specs, string_hash
+
+
+def test_string_hash_matches_java():
+    # Valores de String.hashCode() no Java
+    assert string_hash(b'') == 0
+    assert string_hash(b'hello') == 99162322
+    assert string_hash('Cão'.encode('utf-8')) == 71535
+    # Fora do BMP: par de surrogates
+    assert string_hash('😀'.encode('utf-8')) == 31 * 0xD83D + 0xDE00
+
+
+def test_partitioner_without_specs_hashes_the_whole_key():
+    keys = [key.encode() for key in 'abcdefgh']
+    assert parse_key_specs('') == []
+    assert {key_field_partition(key, [], 4) for key in keys} == {0, 1, 2, 3}
+    assert key_field_partition(b'a\t1', [], 4) == (string_hash(b'a\t1') & 0x7FFFFFFF) % 4
+    # Com -k1,1 só o primeiro campo entra no hash
+    first = [KeySpec(1, 1, False, False)]
+    assert key_field_partition(b'a\t1', first, 4) == key_field_partition(b'a\t2', first, 4)
+
+
+def test_comparator_without_specs_orders_by_key_bytes():
+    keys = [b'b\t2', b'a\t9', b'a\t10']
+    assert sorted(keys, key=key_field_order([])) == [b'a\t10', b'a\t9', b'b\t2']
+    assert sorted(keys, key=key_field_order(parse_key_specs('-k1,1 -k2,2n'))) == [b'a\t9', b'a\t10', b'b\t2']
+    job = {'comparator_specs': []}
+    assert sorted([(key, None) for key in keys], key=local_runner.record_order(job))[0][0] == b'a\t10'
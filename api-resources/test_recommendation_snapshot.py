@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+import recommendation_snapshot
+from recommendation_snapshot import (BookingRecommendation, BookingSnapshot, SnapshotError, VaccineRecommendation,
+                                     VaccineSnapshot, build, open_snapshot)
+
+BOOKING_LINES = [
+    '57\t2026-11-20,14\n',
+    '12\t2026-11-14,27\n',
+    'x\t2026-11-14,27\n',
+    '1033\t2027-01-02,90\n',
+    '12\t2026-11-15,28\n',
+]
+
+VACCINE_LINES = [
+    '7\tV10,"Cinomose, Parvovirose e Hepatite",t,2026-12-01,4\n',
+    '7\tAntirrábica,Raiva,true,2026-11-10,9\n',
+    '3\tAntirrábica,Raiva,t,2027-02-01,9\n',
+    '3\t"Complexo Tosse dos Canis (Bordetella, Mucosa)","Bordetella, Parainfluenza",false,2027-03-01,2\n',
+]
+
+
+@pytest.fixture
+def booking_path(tmp_path):
+    path = str(tmp_path / 'booking_recommendation.snap')
+    stats = build('booking_recommendation', BOOKING_LINES, path)
+    assert stats['rows'] == 4
+    assert stats['rejected'] == 1
+    return path
+
+
+@pytest.fixture
+def vaccine_path(tmp_path):
+    path = str(tmp_path / 'vaccine_recommendation.snap')
+    stats = build('vaccine_recommendation', VACCINE_LINES, path)
+    assert stats['rows'] == 4
+    assert stats['rejected'] == 0
+    return path
+
+
+def test_booking_lookups(booking_path):
+    with BookingSnapshot(booking_path) as snapshot:
+        assert len(snapshot) == 3
+        # Um pet repetido fica com a última linha
+        assert snapshot.get(12) == BookingRecommendation(12, '2026-11-15', 28)
+        assert snapshot.get('1033') == BookingRecommendation(1033, '2027-01-02', 90)
+        assert snapshot.get(13) is None
+        assert snapshot.get(13, 'missing') == 'missing'
+        assert 57 in snapshot and 58 not in snapshot
+
+
+def test_booking_get_many(booking_path):
+    with BookingSnapshot(booking_path) as snapshot:
+        found = snapshot.get_many([1033, 1, 12, 12, 99999, 57])
+    assert sorted(found) == [12, 57, 1033]
+    assert found[57] == BookingRecommendation(57, '2026-11-20', 14)
+
+
+def test_get_many_matches_get_on_a_larger_snapshot(tmp_path):
+    path = str(tmp_path / 'large.snap')
+    build('booking_recommendation', [f"{pet_id}\t2026-11-14,{pet_id % 90}\n" for pet_id in range(0, 3000, 3)], path)
+    wanted = list(range(-5, 3010, 7))
+    with BookingSnapshot(path) as snapshot:
+        expected = {pet_id: snapshot.get(pet_id) for pet_id in wanted if snapshot.get(pet_id) is not None}
+        assert snapshot.get_many(wanted) == expected
+    assert len(expected) == len([pet_id for pet_id in wanted if 0 <= pet_id < 3000 and pet_id % 3 == 0])
+
+
+def test_vaccine_lookups(vaccine_path):
+    with VaccineSnapshot(vaccine_path) as snapshot:
+        assert len(snapshot) == 2
+        # Por pet, em ordem de data sugerida; a descrição mantém as vírgulas
+        assert snapshot.get(7) == [
+            VaccineRecommendation(9, 'Antirrábica', 'Raiva', True, '2026-11-10'),
+            VaccineRecommendation(4, 'V10', 'Cinomose, Parvovirose e Hepatite', True, '2026-12-01'),
+        ]
+        # O nome do catálogo com vírgula chega inteiro
+        assert snapshot.get_many([3, 4]) == {3: [
+            VaccineRecommendation(9, 'Antirrábica', 'Raiva', True, '2027-02-01'),
+            VaccineRecommendation(2, 'Complexo Tosse dos Canis (Bordetella, Mucosa)', 'Bordetella, Parainfluenza',
+                                  False, '2027-03-01'),
+        ]}
+
+
+def test_open_snapshot_picks_the_class(booking_path, vaccine_path):
+    with open_snapshot(booking_path) as snapshot:
+        assert isinstance(snapshot, BookingSnapshot)
+    with open_snapshot(vaccine_path) as snapshot:
+        assert isinstance(snapshot, VaccineSnapshot)
+
+
+def test_named_output(tmp_path):
+    path = str(tmp_path / 'fused.snap')
+    lines = ['reference:Cão;Poodle;Encaracolado\t27,24,59,82\n', 'recommendation:5\t2026-11-14,27\n']
+    build('booking_recommendation', lines, path, named_output='recommendation')
+    with BookingSnapshot(path) as snapshot:
+        assert snapshot.get_many([5]) == {5: BookingRecommendation(5, '2026-11-14', 27)}
+
+
+def test_invalid_files(tmp_path, booking_path):
+    with pytest.raises(SnapshotError):
+        VaccineSnapshot(booking_path)
+
+    with open(booking_path, 'rb') as f:
+        data = f.read()
+    truncated = tmp_path / 'truncated.snap'
+    truncated.write_bytes(data[:-1])
+    with pytest.raises(SnapshotError):
+        BookingSnapshot(str(truncated))
+
+    other = tmp_path / 'other.snap'
+    other.write_bytes(b'\x00' * 64)
+    with pytest.raises(SnapshotError):
+        open_snapshot(str(other))
+
+
+def test_lookup_command(booking_path, capsys):
+    assert recommendation_snapshot.main(['lookup', booking_path, '12', '13']) == 0
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert lines == [
+        {'pet_id': 12, 'recommendation': {'pet_id': 12, 'suggested_date': '2026-11-15', 'average_frequency_days': 28}},
+        {'pet_id': 13, 'recommendation': None},
+    ]
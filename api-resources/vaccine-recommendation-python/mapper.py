@@ -1,24 +1,50 @@
 #!/usr/bin/env python3
 
+import os
 import sys
-import logging
 
-# Configuração básica de log para depuração
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - MAPPER - %(levelname)s - %(message)s')
+# Módulos compartilhados: enviados com -file (Hadoop) ou lidos de ../common-python
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common-python'))
+import date_codec
+import stream_format
+from job_metrics import JobMetrics, RECORDS_OUT, MALFORMED_ROWS
 
-for line in sys.stdin:
-    line = line.strip()
+# Contadores do mapper; linhas ignoradas só são logadas se amostradas
+metrics = JobMetrics('VaccineRecommendationMapper')
+metrics.setup_sampled_logger('/tmp/logs/pet_vaccine_mapper.log', __name__)
+stream = stream_format.open_stream()
+
+# Linhas lidas em blocos, já sem espaços nas pontas; RECORDS_IN é contado por bloco
+for line in stream_format.read_lines(metrics=metrics):
     if not line:
         continue
 
     fields = line.split(',')
     
-    # A consulta SQL tem 11 campos. A verificação deve ser >= 11.
-    # O último campo (application_date) pode ser 'null'.
-    if len(fields) >= 11:
-        pet_id = fields[0].strip()
-        # Emite o pet_id como chave e a linha inteira como valor,
-        # espelhando o comportamento do mapper Java.
-        print(f"{pet_id}\t{line}")
+    # A consulta SQL tem 5 campos: pet_id, species, birth_date, vaccine_reference_id, application_date.
+    # Os dois últimos são 'null' para pets sem registro de vacinação.
+    # Os dados das vacinas vêm do catálogo lido pelo reducer, não da entrada.
+    if len(fields) >= 5:
+        # Nascimento como dias desde 1970-01-01: convertido uma única vez, aqui
+        birth_day = date_codec.to_epoch_day(fields[2].strip())
+        try:
+            pet_id = int(fields[0])
+        except ValueError:
+            birth_day = None
+        if birth_day is None:
+            metrics.incr(MALFORMED_ROWS)
+            metrics.log_sample("Linha com pet_id ou data de nascimento inválidos ignorada: '%s'", line)
+            continue
+        species = fields[1].strip()
+        vaccine_reference_id = fields[3].strip()
+        if fields[4].strip().lower() == 'null':
+            vaccine_reference_id = 'null'
+        # Emite o pet_id como chave e apenas os campos usados pelo reducer como valor
+        stream.emit(pet_id, (species, birth_day, vaccine_reference_id))
+        metrics.incr(RECORDS_OUT)
     else:
-        logging.warning(f"Linha mal formatada ignorada (campos insuficientes: {len(fields)}): '{line}'")
\ No newline at end of file
+        metrics.incr(MALFORMED_ROWS)
+        metrics.log_sample("Linha mal formatada ignorada (campos insuficientes: %d): '%s'", len(fields), line)
+
+stream.flush()
+metrics.flush()
@@ -1,29 +1,30 @@
 #!/usr/bin/env python3
 
 import sys
-import logging
 import os
-from datetime import datetime
+import csv
+import io
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import date, datetime
 import math
 import calendar
 
+# Módulos compartilhados: enviados com -file (Hadoop) ou lidos de ../common-python
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'common-python'))
+import date_codec
+import stream_format
+from vaccine_equivalence import load_index
+from job_metrics import JobMetrics, clock, RECORDS_OUT, MALFORMED_ROWS, SKIPPED_PETS, KEYS_PROCESSED
+
 # --- CONFIGURAÇÃO DO LOG ---
-# Tenta criar um arquivo de log em um local comum, mas se falhar, continua logando para stderr.
-try:
-    log_dir = '/tmp/logs'
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-    LOG_FILE = os.path.join(log_dir, 'pet_vaccine_recommender.log')
-    log_handler = logging.FileHandler(LOG_FILE)
-except Exception:
-    log_handler = logging.StreamHandler(sys.stderr)
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - REDUCER - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    handlers=[log_handler]
-)
+# O log por registro só é escrito para a amostra definida por
+# PETSHOP_LOG_SAMPLE_RATE; a saúde do job é reportada por contadores do Hadoop.
+LOG_FILE = '/tmp/logs/pet_vaccine_recommender.log'
+
+metrics = JobMetrics('VaccineRecommendation')
+metrics.setup_sampled_logger(LOG_FILE, __name__)
+stream = stream_format.open_stream()
 # --- FIM DA CONFIGURAÇÃO DO LOG ---
 
 def add_months(source_date, months):
@@ -32,91 +33,140 @@ def add_months(source_date, months):
     year = source_date.year + month // 12
     month = month % 12 + 1
     day = min(source_date.day, calendar.monthrange(year, month)[1])
-    return datetime(year, month, day)
-
-def process_pet_data(pet_id, records):
-    logging.info(f"Iniciando Reducer para a chave: {pet_id}")
+    return date(year, month, day)
+
+def first_month_after(birth_date, as_of):
+    """Menor número de meses k tal que add_months(birth_date, k) > as_of."""
+    months = (as_of.year - birth_date.year) * 12 + as_of.month - birth_date.month
+    if add_months(birth_date, months) <= as_of:
+        months += 1
+    return months
+
+# Catálogo de vacinas exportado uma única vez pelo pipeline e enviado com -file
+# (cache distribuído): fica no diretório de trabalho da task.
+CATALOG_FILE = os.environ.get('VACCINE_CATALOG_FILE', 'vaccine_catalog.csv')
+# Índice vacina -> classe de equivalência, gerado por vaccine_equivalence.py
+EQUIVALENCE_FILE = os.environ.get('VACCINE_EQUIVALENCE_FILE', 'vaccine_equivalence.csv')
+
+# Data de referência única da execução (AAAA-MM-DD); padrão: hoje
+AS_OF = os.environ.get('VACCINE_AS_OF')
+AS_OF = datetime.strptime(AS_OF, "%Y-%m-%d").date() if AS_OF else date.today()
+
+ALL_SPECIES = 'ambos'
+
+# class_id: classe de equivalência (o próprio id se não houver equivalentes);
+# months: idade da primeira dose arredondada para cima (meses inteiros);
+# output_prefix: 'nome,descrição,obrigatória,' já formatado para a saída (linha CSV)
+Vaccine = namedtuple('Vaccine', 'vaccine_reference_id class_id target_species months output_prefix')
+
+class VaccineCatalog:
+    """
+    Catálogo indexado por espécie: para cada espécie, as vacinas dela e as de
+    'Ambos', ordenadas pela idade da primeira dose. Um bisect na idade do pet
+    leva direto à primeira vacina ainda não vencida.
+    """
+
+    def __init__(self, vaccines):
+        vaccines = sorted(vaccines, key=lambda vaccine: vaccine.months)
+        species_names = {vaccine.target_species for vaccine in vaccines if vaccine.target_species.lower() != ALL_SPECIES}
+        self.by_species = {species: self._index(vaccines, species) for species in species_names}
+        # Espécies fora do catálogo recebem só as vacinas de 'Ambos'
+        self.default = self._index(vaccines, None)
+
+    @staticmethod
+    def _index(vaccines, species):
+        selected = [vaccine for vaccine in vaccines
+                    if vaccine.target_species == species or vaccine.target_species.lower() == ALL_SPECIES]
+        return [vaccine.months for vaccine in selected], selected
+
+    def pending(self, species, birth_date, as_of):
+        """Vacinas da espécie cuja data da primeira dose é posterior a as_of."""
+        months, vaccines = self.by_species.get(species, self.default)
+        return vaccines[bisect_left(months, first_month_after(birth_date, as_of)):]
+
+def csv_prefix(*fields):
+    """Campos como início de uma linha CSV: nome e descrição com vírgulas vão entre aspas."""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='').writerow(fields)
+    return buffer.getvalue() + ','
+
+def load_catalog(path, equivalence):
+    """Lê o CSV (com cabeçalho) exportado de vaccine_reference."""
+    vaccines = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            # COPY exporta booleanos como t/f; a saída mantém true/false
+            mandatory = 'true' if row['mandatory'].strip().lower() in ('t', 'true') else 'false'
+            vaccine_reference_id = row['vaccine_reference_id'].strip()
+            vaccines.append(Vaccine(
+                vaccine_reference_id=vaccine_reference_id,
+                class_id=equivalence.get(vaccine_reference_id, vaccine_reference_id),
+                target_species=row['target_species'].strip(),
+                months=int(math.ceil(float(row['first_dose_age_months']))),
+                output_prefix=csv_prefix(row['vaccine_name'].strip(), row['description'].strip(), mandatory),
+            ))
+    return VaccineCatalog(vaccines)
+
+def process_pet_data(pet_id, records, catalog, equivalence):
+    started = clock()
+    metrics.incr(KEYS_PROCESSED)
+    metrics.log_sample("Iniciando Reducer para a chave: %s", pet_id)
     
     species = None
     birth_date = None
-    applied_vaccines = set()
-    processed_vaccines = set()
-
-    all_records_parsed = []
-    for record_line in records:
-        try:
-            fields = record_line.split(',')
-            if len(fields) < 11:
-                logging.warning(f"Registro para o pet {pet_id} tem campos insuficientes ({len(fields)}). Ignorando: {record_line}")
+    # Classes de equivalência já aplicadas: uma dose vale para todas as equivalentes
+    applied_classes = set()
+
+    # Cada registro: [species, dia do nascimento, vaccine_reference_id] ('null' se não houver aplicação).
+    # Espécie e nascimento se repetem em todos: só o primeiro registro válido é parseado por inteiro.
+    for fields in records:
+        if birth_date is None:
+            if len(fields) < 3:
+                metrics.incr(MALFORMED_ROWS)
+                metrics.log_sample("Registro para o pet %s tem campos insuficientes (%d). Ignorando: %s", pet_id, len(fields), fields)
                 continue
-            all_records_parsed.append(fields)
-
-            if species is None:
-                species = fields[1].strip()
-            
-            if birth_date is None:
-                birth_date = datetime.strptime(fields[2].strip(), "%Y-%m-%d")
-
-            if fields[10].strip().lower() != 'null':
-                applied_vaccine = fields[4].strip()
-                applied_vaccines.add(applied_vaccine)
-        except (ValueError, IndexError) as e:
-            logging.error(f"Erro ao parsear registro inicial para o pet {pet_id}: {record_line}. Erro: {e}")
-            continue
+            # Dias desde a época vindos do mapper; datas em texto passam pelo parser de fallback
+            birth_day = date_codec.decode_epoch_day(fields[1])
+            if birth_day is None:
+                metrics.incr(MALFORMED_ROWS)
+                metrics.log_sample("Data de nascimento inválida no registro inicial do pet %s: %s", pet_id, fields)
+                continue
+            birth_date = date.fromordinal(birth_day + date_codec.EPOCH_ORDINAL)
+            species = fields[0].strip()
+
+        applied_vaccine = fields[-1].strip()
+        if applied_vaccine.lower() != 'null':
+            applied_classes.add(equivalence.get(applied_vaccine, applied_vaccine))
+    started = metrics.lap('parse', started)
 
     if birth_date is None:
-        logging.warning(f"Nenhuma data de nascimento válida encontrada para o pet {pet_id}. Ignorando.")
+        metrics.incr(SKIPPED_PETS)
+        metrics.log_sample("Nenhuma data de nascimento válida encontrada para o pet %s. Ignorando.", pet_id)
         return
 
-    for fields in all_records_parsed:
-        try:
-            vaccine_name = fields[4].strip()
-            if vaccine_name in processed_vaccines:
-                continue
-            processed_vaccines.add(vaccine_name)
-
-            if vaccine_name not in applied_vaccines:
-                target_species = fields[6].strip()
-                if target_species == species or target_species.lower() == 'ambos':
-                    first_dose_age_months = float(fields[7].strip())
-                    
-                    recommendation_date = add_months(birth_date, int(math.ceil(first_dose_age_months)))
-                    logging.debug(f"Data de recomendação para '{vaccine_name}': {recommendation_date}")
-
-                    if recommendation_date > datetime.now():
-                        description = fields[5].strip()
-                        mandatory = fields[9].strip()
-                        suggested_date_str = recommendation_date.strftime("%Y-%m-%d")
-                        vaccine_reference_id = fields[3].strip()
-                        
-                        result = f"{vaccine_name},{description},{mandatory},{suggested_date_str},{vaccine_reference_id}"
-                        print(f"{pet_id}\t{result}")
-                        logging.info(f"Recomendação para {pet_id}: {result}")
-        except (ValueError, IndexError) as e:
-            logging.error(f"Erro ao processar recomendação para o pet {pet_id}. Registro: {fields}. Erro: {e}")
-            continue
+    recommendations = []
 
-current_pet_id = None
-pet_records = []
-
-logging.info("Reducer script iniciado.")
-for line in sys.stdin:
-    line = line.strip()
-    if not line:
-        continue
-
-    try:
-        pet_id, values_str = line.split('\t', 1)
-        if current_pet_id and current_pet_id != pet_id:
-            process_pet_data(current_pet_id, pet_records)
-            pet_records = []
-        current_pet_id = pet_id
-        pet_records.append(values_str)
-    except ValueError:
-        logging.warning(f"Linha malformada ignorada (sem tab): {line}")
-        continue
-
-if current_pet_id:
-    process_pet_data(current_pet_id, pet_records)
-
-logging.info("Reducer script finalizado.")
\ No newline at end of file
+    for vaccine in catalog.pending(species, birth_date, AS_OF):
+        if vaccine.class_id in applied_classes:
+            continue
+        suggested_date_str = add_months(birth_date, vaccine.months).isoformat()
+        # Data e id nunca precisam de aspas: a linha continua sendo CSV válido
+        recommendations.append(f"{vaccine.output_prefix}{suggested_date_str},{vaccine.vaccine_reference_id}")
+    started = metrics.lap('compute', started)
+
+    for result in recommendations:
+        stream.output(pet_id, result)
+        metrics.log_sample("Recomendação para %s: %s", pet_id, result)
+    metrics.lap('emit', started)
+    metrics.incr(RECORDS_OUT, len(recommendations))
+    metrics.maybe_flush()
+
+equivalence = load_index(EQUIVALENCE_FILE)
+catalog = load_catalog(CATALOG_FILE, equivalence)
+
+# Cada grupo traz os registros de um pet, consumidos sem montar uma lista
+for pet_id, records in stream.groups(metrics):
+    process_pet_data(pet_id, records, catalog, equivalence)
+
+stream.flush()
+metrics.flush()
\ No newline at end of file
@@ -35,6 +35,7 @@ module.exports = {
         'vaccine_reference',
         'vaccine_equivalence',
         'ltv_by_pet_profile',
+        'ltv_rollup',
         'execution_history'
     ]),
     organizationTables: [
@@ -28,6 +28,9 @@ BEGIN
     IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'enum_execution_history_status') THEN
         CREATE TYPE enum_execution_history_status AS ENUM ('RUNNING', 'COMPLETED', 'FAILED');
     END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'enum_ltv_rollup_level') THEN
+        CREATE TYPE enum_ltv_rollup_level AS ENUM ('total', 'species', 'animal_type', 'profile');
+    END IF;
 END$$;
 
 
@@ -254,6 +257,11 @@ CREATE TABLE IF NOT EXISTS booking_reference (
     booking_reference_id SERIAL PRIMARY KEY,
     frequency_days INTEGER NOT NULL,
 
+    -- Quantis dos intervalos entre agendamentos (em dias)
+    p50_gap_days INTEGER,
+    p90_gap_days INTEGER,
+    p99_gap_days INTEGER,
+
     -- classification columns
     species enum_pet_species NOT NULL,
     animal_type VARCHAR(50),
@@ -269,6 +277,10 @@ CREATE TABLE IF NOT EXISTS booking_reference (
 );
 DROP TRIGGER IF EXISTS update_booking_reference_dlastupdate ON booking_reference;
 CREATE TRIGGER update_booking_reference_dlastupdate BEFORE UPDATE ON booking_reference FOR EACH ROW EXECUTE PROCEDURE update_last_modified_column();
+-- Bancos criados antes das colunas de quantis
+ALTER TABLE booking_reference ADD COLUMN IF NOT EXISTS p50_gap_days INTEGER;
+ALTER TABLE booking_reference ADD COLUMN IF NOT EXISTS p90_gap_days INTEGER;
+ALTER TABLE booking_reference ADD COLUMN IF NOT EXISTS p99_gap_days INTEGER;
 
 CREATE TABLE IF NOT EXISTS booking_recommendation (
     booking_recommendation_id SERIAL PRIMARY KEY,
@@ -316,6 +328,40 @@ CREATE TABLE IF NOT EXISTS ltv_by_pet_profile (
 DROP TRIGGER IF EXISTS update_ltv_by_pet_profile_dlastupdate ON ltv_by_pet_profile;
 CREATE TRIGGER update_ltv_by_pet_profile_dlastupdate BEFORE UPDATE ON ltv_by_pet_profile FOR EACH ROW EXECUTE PROCEDURE update_last_modified_column();
 
+-- Rollup do LTV (total, espécie, espécie + tipo, perfil completo), gerado na mesma
+-- execução que ltv_by_pet_profile; as colunas agregadas no nível ficam NULL
+CREATE TABLE IF NOT EXISTS ltv_rollup (
+    ltv_rollup_id SERIAL PRIMARY KEY,
+
+    level enum_ltv_rollup_level NOT NULL,
+    species enum_pet_species,
+    animal_type VARCHAR(50),
+    fur_type VARCHAR(50),
+
+    total_value NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    purchase_count INTEGER NOT NULL DEFAULT 0,
+    average_value NUMERIC(10, 2) NOT NULL DEFAULT 0,
+
+    -- Quantis aproximados (sketch KLL) do valor das compras
+    p50_value NUMERIC(10, 2),
+    p90_value NUMERIC(10, 2),
+    p99_value NUMERIC(10, 2),
+
+    -- Colunas de Auditoria
+    dcreated TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    dlastupdate TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    nenabled BOOLEAN NOT NULL DEFAULT TRUE
+);
+DROP TRIGGER IF EXISTS update_ltv_rollup_dlastupdate ON ltv_rollup;
+CREATE TRIGGER update_ltv_rollup_dlastupdate BEFORE UPDATE ON ltv_rollup FOR EACH ROW EXECUTE PROCEDURE update_last_modified_column();
+
+-- Uma linha por célula do rollup. O nível define quais colunas ficam NULL, então no
+-- índice elas viram um valor fixo (UNIQUE NULLS NOT DISTINCT exigiria o PostgreSQL 15+);
+-- o ON CONFLICT do bulk_loader.py usa as mesmas expressões
+ALTER TABLE ltv_rollup DROP CONSTRAINT IF EXISTS ltv_rollup_level_species_animal_type_fur_type_key;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ltv_rollup_cell
+    ON ltv_rollup (level, COALESCE(species, 'Cão'), COALESCE(animal_type, ''), COALESCE(fur_type, ''));
+
 CREATE TABLE IF NOT EXISTS execution_history (
     execution_id SERIAL PRIMARY KEY,
     target_table VARCHAR(255) NOT NULL,
@@ -323,11 +369,16 @@ CREATE TABLE IF NOT EXISTS execution_history (
     end_time TIMESTAMP WITH TIME ZONE,
     status enum_execution_history_status NOT NULL,
     error_message TEXT,
-    records_processed INTEGER
+    records_processed INTEGER,
+    stage_fingerprints JSONB, -- Impressão digital de cada etapa do pipeline (import, compute, load), usada pelo cache de etapas
+    stage_timings JSONB -- Duração, tentativas e status de cada etapa nas execuções pelo pipeline_orchestrator.py
     
     -- Colunas de Auditoria (dcreated/dlastupdate/nenabled) omitidas, pois start_time/end_time já servem para rastrear.
 );
 
+ALTER TABLE execution_history ADD COLUMN IF NOT EXISTS stage_fingerprints JSONB;
+ALTER TABLE execution_history ADD COLUMN IF NOT EXISTS stage_timings JSONB;
+
 
 -- =========== CRIAÇÃO DE ÍNDICES (CRUCIAL PARA PERFORMANCE) ===========
 -- Índices em Chaves Estrangeiras (FKs) e colunas de filtro (WHERE).
@@ -350,6 +401,11 @@ CREATE INDEX IF NOT EXISTS idx_booking_booking_date ON booking(booking_date); --
 
 CREATE INDEX IF NOT EXISTS idx_booking_recommendation_pet_id ON booking_recommendation(pet_id);
 
+-- Alterações desde a última execução (modo incremental do pipeline de recomendação de agendamentos)
+CREATE INDEX IF NOT EXISTS idx_pet_dlastupdate ON pet(dlastupdate);
+CREATE INDEX IF NOT EXISTS idx_booking_dlastupdate ON booking(dlastupdate);
+CREATE INDEX IF NOT EXISTS idx_execution_history_target_status ON execution_history(target_table, status, start_time);
+
 -- Índice na coluna de exclusão lógica para consultas rápidas de registros ativos
 CREATE INDEX IF NOT EXISTS idx_tutor_enabled ON tutor(nenabled);
 CREATE INDEX IF NOT EXISTS idx_pet_enabled ON pet(nenabled);
@@ -39,7 +39,10 @@ const startJobAsync = async (jobName) => {
     logger.info(`Executing command: ${command}`);
 
 
-    exec(command, (error, stdout, stderr) => {
+    // O pipeline compara as etapas com as da última execução concluída (cache de etapas)
+    const env = { ...process.env, PIPELINE_EXECUTION_ID: String(executionId) };
+
+    exec(command, { env }, (error, stdout, stderr) => {
         const endTime = new Date();
         if (error) {
             console.error(`Error executing job ${jobName}: ${error}`);